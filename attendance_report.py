@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Attendance reports over historical sessions
+Session files are parsed once into a columnar cache (one int/float array
+per column); later runs re-read only new or changed files. Attendance
+rates, late arrivals and per-session counts are array reductions
+"""
+
+import argparse
+import csv
+import json
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from attendance_sink import ATTENDANCE_HEADER, parse_session_file
+
+
+CACHE_NAME = ".report_cache.npz"
+CACHE_VERSION = 1
+SESSION_SUFFIXES = (".csv", ".jsonl")
+
+
+def iter_rows(path: Path) -> Iterator[List[str]]:
+    """Stream rows of a CSV or JSONL session file in ATTENDANCE_HEADER order."""
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        if path.suffix == ".jsonl":
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line of a live session
+                yield [record.get(column, "") for column in ATTENDANCE_HEADER]
+        else:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                if len(row) == len(ATTENDANCE_HEADER):
+                    yield row
+
+
+def _confidence(value: str) -> float:
+    try:
+        return float(value.rstrip('%'))
+    except ValueError:
+        return np.nan
+
+
+class _Parsed(dict):
+    """Memo of parse(string) for strings that repeat across rows."""
+    
+    def __init__(self, parse):
+        super().__init__()
+        self.parse = parse
+    
+    def __missing__(self, key):
+        value = self[key] = self.parse(key)
+        return value
+
+
+class _Session:
+    """Column chunk for one session file."""
+    
+    __slots__ = ('file', 'size', 'mtime', 'name', 'start', 'identity', 'arrival', 'confidence')
+    
+    def __init__(self, file, size, mtime, name, start, identity, arrival, confidence):
+        self.file = file
+        self.size = size
+        self.mtime = mtime
+        self.name = name
+        self.start = start  # POSIX seconds
+        self.identity = identity  # int32 index into AttendanceHistory.identities
+        self.arrival = arrival  # float32 seconds after start
+        self.confidence = confidence  # float32, NaN when unknown
+
+
+class AttendanceHistory:
+    """Columnar, incrementally refreshed view of attendance_records/.
+    
+    Students are identified by student ID, or by name when they have none,
+    the same key mark_attendance uses.
+    """
+    
+    def __init__(self, directory: Path = Path("attendance_records"),
+                 cache_file: Optional[Path] = None):
+        self.directory = Path(directory)
+        self.cache_file = Path(cache_file) if cache_file else self.directory / CACHE_NAME
+        self.identities: List[str] = []
+        self.names: List[str] = []  # latest display name per identity
+        self._identity_index: Dict[str, int] = {}
+        self._sessions: Dict[str, _Session] = {}
+        self._day_of = _Parsed(lambda s: date.fromisoformat(s).toordinal())
+        self._confidence_of = _Parsed(_confidence)
+        
+        # Counters
+        self.files_read = 0
+        self.rows_read = 0
+    
+    # Loading
+    
+    def _identity(self, key: str, name: str) -> int:
+        index = self._identity_index.get(key)
+        if index is None:
+            index = len(self.identities)
+            self._identity_index[key] = index
+            self.identities.append(key)
+            self.names.append(name)
+        else:
+            self.names[index] = name
+        return index
+    
+    def _read_session(self, path: Path, stat: os.stat_result) -> _Session:
+        parsed = parse_session_file(path)
+        start, name = parsed if parsed else (None, path.stem)
+        
+        # First row per student, as mark_attendance writes them
+        first: Dict[str, List[str]] = {}
+        for row in iter_rows(path):
+            first.setdefault(row[4] or row[3], row)
+        rows = list(first.values())
+        if rows:
+            name = rows[-1][0] or name
+        
+        identities = [self._identity(key, row[3]) for key, row in first.items()]
+        # Few distinct dates and confidences: parse each string once
+        days = np.array([self._day_of[row[1]] for row in rows], dtype=np.int64)
+        confidences = np.array([self._confidence_of[row[5]] for row in rows], dtype=np.float32)
+        # HH:MM:SS digits straight from the UTF-32 code points
+        digits = np.array([row[2] for row in rows], dtype='<U8').view(np.uint32).reshape(-1, 8).astype(np.int64) - 48
+        times = ((digits[:, 0] * 10 + digits[:, 1]) * 3600 + (digits[:, 3] * 10 + digits[:, 4]) * 60
+                 + digits[:, 6] * 10 + digits[:, 7])
+        
+        clock = np.column_stack([days, times])
+        if start is None and len(clock):
+            # No timestamp in the file name: the first arrival opens the session
+            day, seconds = min(map(tuple, clock))
+            start = datetime.fromordinal(int(day)) + timedelta(seconds=int(seconds))
+        elif start is None:
+            start = datetime.fromtimestamp(stat.st_mtime)
+        start_ordinal = start.toordinal()
+        start_seconds = start.hour * 3600 + start.minute * 60 + start.second
+        arrival = (clock[:, 0] - start_ordinal) * 86400 + clock[:, 1] - start_seconds
+        
+        self.files_read += 1
+        self.rows_read += len(identities)
+        return _Session(path.name, stat.st_size, stat.st_mtime_ns, name, start.timestamp(),
+                        np.array(identities, dtype=np.int32), arrival.astype(np.float32), confidences)
+    
+    def refresh(self) -> Tuple[int, int]:
+        """Read new or changed session files, drop deleted ones; returns (read, dropped)."""
+        if not self._sessions:
+            self.load_cache()
+        
+        files = {}
+        for path in self.directory.iterdir():
+            if path.suffix in SESSION_SUFFIXES and not path.name.startswith("."):
+                files[path.name] = path
+        
+        dropped = [name for name in self._sessions if name not in files]
+        for name in dropped:
+            del self._sessions[name]
+        
+        read = 0
+        for name, path in sorted(files.items()):
+            stat = path.stat()
+            session = self._sessions.get(name)
+            if session and session.size == stat.st_size and session.mtime == stat.st_mtime_ns:
+                continue
+            try:
+                self._sessions[name] = self._read_session(path, stat)
+                read += 1
+            except (OSError, ValueError) as e:
+                print(f"Skipping {path}: {e}")
+        
+        if read or dropped:
+            self.save_cache()
+        return read, len(dropped)
+    
+    # Cache
+    
+    def load_cache(self) -> bool:
+        """Load the columnar cache; False if missing or unreadable."""
+        try:
+            with np.load(self.cache_file, allow_pickle=False) as data:
+                meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+                if meta.get('version') != CACHE_VERSION:
+                    return False
+                identity = data['identity']
+                arrival = data['arrival']
+                confidence = data['confidence']
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Ignoring report cache: {e}")
+            return False
+        
+        self.identities = meta['identities']
+        self.names = meta['names']
+        self._identity_index = {key: i for i, key in enumerate(self.identities)}
+        offset = 0
+        for file, size, mtime, name, start, count in meta['sessions']:
+            end = offset + count
+            self._sessions[file] = _Session(file, size, mtime, name, start, identity[offset:end],
+                                            arrival[offset:end], confidence[offset:end])
+            offset = end
+        return True
+    
+    def save_cache(self):
+        """Write every session's columns to one .npz file."""
+        sessions = list(self._sessions.values())
+        meta = {
+            'version': CACHE_VERSION,
+            'identities': self.identities,
+            'names': self.names,
+            'sessions': [[s.file, s.size, s.mtime, s.name, s.start, len(s.identity)] for s in sessions]
+        }
+        tmp = self.cache_file.with_name(self.cache_file.name + ".tmp.npz")
+        try:
+            np.savez(
+                tmp,
+                meta=np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8),
+                identity=np.concatenate([s.identity for s in sessions] or [np.empty(0, np.int32)]),
+                arrival=np.concatenate([s.arrival for s in sessions] or [np.empty(0, np.float32)]),
+                confidence=np.concatenate([s.confidence for s in sessions] or [np.empty(0, np.float32)])
+            )
+            os.replace(tmp, self.cache_file)
+        except OSError as e:
+            print(f"Report cache save error: {e}")
+    
+    # Queries
+    
+    def sessions(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 name: Optional[str] = None) -> List[_Session]:
+        """Sessions in [since, until), optionally only those called name, oldest first."""
+        low = since.timestamp() if since else float("-inf")
+        high = until.timestamp() if until else float("inf")
+        selected = [s for s in self._sessions.values()
+                    if low <= s.start < high and (name is None or s.name == name)]
+        return sorted(selected, key=lambda s: s.start)
+    
+    def _gather(self, sessions: List[_Session]):
+        """Concatenated (session number, identity, arrival, confidence) columns."""
+        if not sessions:
+            empty = np.empty(0, dtype=np.int32)
+            return empty, empty, empty.astype(np.float32), empty.astype(np.float32)
+        counts = [len(s.identity) for s in sessions]
+        return (np.repeat(np.arange(len(sessions), dtype=np.int32), counts),
+                np.concatenate([s.identity for s in sessions]),
+                np.concatenate([s.arrival for s in sessions]),
+                np.concatenate([s.confidence for s in sessions]))
+    
+    def student_report(self, late_minutes: float = 10.0, **filters) -> List[Dict]:
+        """Per-student attendance rate, late arrivals and mean arrival time."""
+        sessions = self.sessions(**filters)
+        _, identity, arrival, confidence = self._gather(sessions)
+        n = len(self.identities)
+        late = arrival > late_minutes * 60
+        
+        attended = np.bincount(identity, minlength=n)
+        late_count = np.bincount(identity, weights=late, minlength=n)
+        arrival_sum = np.bincount(identity, weights=arrival, minlength=n)
+        known = ~np.isnan(confidence)
+        conf_sum = np.bincount(identity[known], weights=confidence[known], minlength=n)
+        conf_count = np.bincount(identity[known], minlength=n)
+        
+        total = len(sessions)
+        report = []
+        for i in np.flatnonzero(attended):
+            key = self.identities[i]
+            name = self.names[i]
+            report.append({
+                'name': name,
+                'student_id': key if key != name else "",
+                'attended': int(attended[i]),
+                'sessions': total,
+                'rate': round(float(attended[i]) / total, 4),
+                'late': int(late_count[i]),
+                'mean_arrival_min': round(float(arrival_sum[i] / attended[i]) / 60, 1),
+                'mean_confidence': round(float(conf_sum[i] / conf_count[i]), 1) if conf_count[i] else None
+            })
+        report.sort(key=lambda row: (-row['rate'], row['name']))
+        return report
+    
+    def session_report(self, late_minutes: float = 10.0, **filters) -> List[Dict]:
+        """Per-session present and late counts with the median arrival time."""
+        report = []
+        for session in self.sessions(**filters):
+            arrival = session.arrival
+            report.append({
+                'session': session.name,
+                'start': datetime.fromtimestamp(session.start).isoformat(timespec='minutes'),
+                'file': session.file,
+                'present': int(len(arrival)),
+                'late': int(np.count_nonzero(arrival > late_minutes * 60)),
+                'median_arrival_min': round(float(np.median(arrival)) / 60, 1) if len(arrival) else None
+            })
+        return report
+
+
+def write_csv(rows: List[Dict], path: Path):
+    """Write report rows as CSV with the dict keys as header."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if not rows:
+            return
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_json(rows: List[Dict], path: Path):
+    """Write report rows as a JSON array."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(rows, f, indent=2, ensure_ascii=False)
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Attendance reports over past sessions")
+    parser.add_argument("report", choices=["students", "sessions"], nargs="?", default="students")
+    parser.add_argument("--attendance-dir", type=Path, default=Path("attendance_records"))
+    parser.add_argument("--session", help="only sessions with this name (e.g. one course)")
+    parser.add_argument("--since", help="YYYY-MM-DD")
+    parser.add_argument("--until", help="YYYY-MM-DD (exclusive)")
+    parser.add_argument("--late-minutes", type=float, default=10.0,
+                        help="arrivals this long after the session start count as late")
+    parser.add_argument("--csv", type=Path, help="also write the report to this CSV file")
+    parser.add_argument("--json", type=Path, help="also write the report to this JSON file")
+    args = parser.parse_args()
+    
+    history = AttendanceHistory(args.attendance_dir)
+    read, dropped = history.refresh()
+    print(f"{len(history.sessions())} session(s) ({read} file(s) read, {dropped} dropped)")
+    
+    filters = {
+        'since': datetime.fromisoformat(args.since) if args.since else None,
+        'until': datetime.fromisoformat(args.until) if args.until else None,
+        'name': args.session
+    }
+    if args.report == "students":
+        rows = history.student_report(args.late_minutes, **filters)
+        for row in rows:
+            print(f"{row['name']:<25} {row['student_id'] or '-':<12} {row['attended']:>4}/{row['sessions']:<4} "
+                  f"{row['rate'] * 100:5.1f}%  late {row['late']}")
+    else:
+        rows = history.session_report(args.late_minutes, **filters)
+        for row in rows:
+            print(f"{row['start']}  {row['session']:<30} {row['present']:>4} present, {row['late']} late")
+    
+    if args.csv:
+        write_csv(rows, args.csv)
+    if args.json:
+        write_json(rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
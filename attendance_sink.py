@@ -0,0 +1,428 @@
+"""
+Attendance sinks and the background writer feeding them
+Rows are queued by the recognition side, written in batches on a writer
+thread and fsynced on an interval, at session end and on shutdown. A
+marker file names the open session so a crashed one can be resumed
+"""
+
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pipeline_metrics import METRICS
+
+
+# Columns of the per-session attendance CSV
+ATTENDANCE_HEADER = ['session_name', 'date', 'time', 'person', 'student_id', 'confidence']
+
+# Names the session that is open right now; removed on a clean end
+SESSION_MARKER = ".session.json"
+
+
+def session_file_path(directory: Path, session_name: str, start: datetime, suffix: str = ".csv") -> Path:
+    """attendance_records/YYYYMMDD_HHMM_SessionName.csv"""
+    timestamp = start.strftime("%Y%m%d_%H%M")
+    safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in session_name)
+    return Path(directory) / f"{timestamp}_{safe_name}{suffix}"
+
+
+def parse_session_file(path: Path) -> Optional[Tuple[datetime, str]]:
+    """(start, name) from a session_file_path() name, or None if it isn't one."""
+    stem = Path(path).stem
+    if stem[13:14] != "_":
+        return None
+    try:
+        return datetime.strptime(stem[:13], "%Y%m%d_%H%M"), stem[14:]
+    except ValueError:
+        return None
+
+
+def attendance_row(session_name: str, when: datetime, name: str, student_id: str,
+                   confidence: Optional[float]) -> List[str]:
+    """One CSV row in ATTENDANCE_HEADER order."""
+    conf_str = f"{confidence:.1f}%" if confidence else "-"
+    return [session_name, when.strftime("%Y-%m-%d"), when.strftime("%H:%M:%S"),
+            name, student_id or "", conf_str]
+
+
+def _fsync_file(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _repair_tail(path: Path):
+    """Cut a line torn by a crash so appends start on a clean line."""
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+            _fsync_file(f)
+
+
+class AttendanceSink:
+    """Destination for one session's rows; used from the writer thread only."""
+    
+    kind = "base"
+    suffix = ""
+    
+    def __init__(self, directory: Path, session_name: str, start: datetime):
+        self.directory = Path(directory)
+        self.session_name = session_name
+        self.start = start
+        self.path = session_file_path(directory, session_name, start, self.suffix)
+    
+    def open(self):
+        """Create the destination, or reopen it for appending."""
+        raise NotImplementedError
+    
+    def write(self, rows: Sequence[List[str]]):
+        """Append a batch of rows (not necessarily durable yet)."""
+        raise NotImplementedError
+    
+    def flush(self):
+        """Make everything written so far durable."""
+    
+    def close(self):
+        """Flush and release the destination."""
+        self.flush()
+    
+    def read(self) -> List[List[str]]:
+        """Rows already stored for this session, repairing a torn tail."""
+        raise NotImplementedError
+
+
+class CSVSink(AttendanceSink):
+    """The classic one-CSV-per-session file."""
+    
+    kind = "csv"
+    suffix = ".csv"
+    
+    def __init__(self, directory, session_name, start):
+        super().__init__(directory, session_name, start)
+        self._file = None
+        self._writer = None
+    
+    def open(self):
+        exists = self.path.exists() and self.path.stat().st_size > 0
+        if exists:
+            _repair_tail(self.path)
+        self._file = open(self.path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        if not exists:
+            self._writer.writerow(ATTENDANCE_HEADER)
+            _fsync_file(self._file)
+    
+    def write(self, rows):
+        self._writer.writerows(rows)
+    
+    def flush(self):
+        if self._file is not None:
+            _fsync_file(self._file)
+    
+    def close(self):
+        if self._file is not None:
+            _fsync_file(self._file)
+            self._file.close()
+            self._file = None
+    
+    def read(self):
+        if not self.path.exists():
+            return []
+        _repair_tail(self.path)
+        with open(self.path, 'r', newline='', encoding='utf-8') as f:
+            rows = list(csv.reader(f))
+        return [row for row in rows[1:] if len(row) == len(ATTENDANCE_HEADER)]
+
+
+class JSONLSink(AttendanceSink):
+    """One JSON object per line, keyed by the CSV column names."""
+    
+    kind = "jsonl"
+    suffix = ".jsonl"
+    
+    def __init__(self, directory, session_name, start):
+        super().__init__(directory, session_name, start)
+        self._file = None
+    
+    def open(self):
+        if self.path.exists():
+            _repair_tail(self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+    
+    def write(self, rows):
+        self._file.write("".join(
+            json.dumps(dict(zip(ATTENDANCE_HEADER, row)), ensure_ascii=False) + "\n" for row in rows
+        ))
+    
+    def flush(self):
+        if self._file is not None:
+            _fsync_file(self._file)
+    
+    def close(self):
+        if self._file is not None:
+            _fsync_file(self._file)
+            self._file.close()
+            self._file = None
+    
+    def read(self):
+        if not self.path.exists():
+            return []
+        _repair_tail(self.path)
+        rows = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                rows.append([record.get(column, "") for column in ATTENDANCE_HEADER])
+        return rows
+
+
+class SQLiteSink(AttendanceSink):
+    """Rows in the SQLite store (WAL, synchronous=FULL).
+    
+    All sessions share one database: attendance_records/attendance.db by
+    default, or the application's store file when one is passed in.
+    """
+    
+    kind = "sqlite"
+    suffix = ".db"
+    
+    def __init__(self, directory, session_name, start, path: Optional[Path] = None):
+        super().__init__(directory, session_name, start)
+        self.path = Path(path) if path else self.directory / "attendance.db"
+        self.session_start = start.isoformat(timespec='seconds')
+        self._store = None
+        self._session_id = None
+    
+    def open(self):
+        from sqlite_store import SQLiteStore
+        self._store = SQLiteStore(self.path)
+        self._session_id = self._store.session_id(self.session_name, self.session_start)
+    
+    def write(self, rows):
+        # One transaction per batch; committed rows are already durable
+        self._store.add_attendance(self._session_id, rows)
+    
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+    
+    def read(self):
+        if not self.path.exists():
+            return []
+        from sqlite_store import SQLiteStore
+        store = SQLiteStore(self.path)
+        try:
+            return store.session_rows(store.session_id(self.session_name, self.session_start))
+        finally:
+            store.close()
+
+
+SINKS = {
+    'csv': CSVSink,
+    'jsonl': JSONLSink,
+    'sqlite': SQLiteSink
+}
+
+
+def create_sink(kind: str, directory: Path, session_name: str, start: datetime,
+                path: Optional[Path] = None) -> AttendanceSink:
+    """Build a sink by name ('csv', 'jsonl' or 'sqlite').
+    
+    path overrides the sqlite sink's database file.
+    """
+    try:
+        sink_class = SINKS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown attendance sink: {kind} (choose from {', '.join(SINKS)})")
+    if path is not None and sink_class is SQLiteSink:
+        return sink_class(directory, session_name, start, path)
+    return sink_class(directory, session_name, start)
+
+
+def pending_session(directory: Path) -> Optional[AttendanceSink]:
+    """Sink of a session that never ended cleanly (e.g. after a crash), or None."""
+    marker = Path(directory) / SESSION_MARKER
+    try:
+        data = json.loads(marker.read_text(encoding='utf-8'))
+        return create_sink(data['sink'], directory, data['session_name'],
+                           datetime.fromisoformat(data['start']), data.get('path'))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ignoring unreadable session marker: {e}")
+        return None
+
+
+class AttendanceWriter(threading.Thread):
+    """Writes queued rows to a sink in batches on its own thread.
+    
+    submit() never touches the disk. Rows are written once batch_size
+    have queued up and fsynced at least every flush_interval seconds;
+    flush() and close() wait until everything queued so far is durable.
+    start() raises if the sink cannot be opened; error holds whatever
+    stopped the thread.
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, sink: AttendanceSink, max_queue: int = 10000,
+                 flush_interval: float = 1.0, batch_size: int = 256):
+        super().__init__(name=f"attendance-{sink.kind}", daemon=True)
+        self.sink = sink
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.marker = sink.directory / SESSION_MARKER
+        self._queue: queue.Queue = queue.Queue(max_queue)
+        self._opened = threading.Event()
+        self.error: Optional[Exception] = None
+        
+        # Counters
+        self.rows_written = 0
+        self.flushes = 0
+        self.errors = 0
+        self.stalls = 0
+    
+    def submit(self, row: List[str]):
+        """Queue one row; blocks only if the queue is full."""
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # Back-pressure rather than losing attendance
+            self.stalls += 1
+            self._queue.put(row)
+    
+    def start(self, timeout: Optional[float] = 5.0):
+        """Start the thread and wait for the sink to open; re-raises its error."""
+        super().start()
+        if not self._opened.wait(timeout):
+            raise RuntimeError(f"Timed out opening {self.sink.path}")
+        if self.error is not None:
+            raise self.error
+    
+    def flush(self, timeout: Optional[float] = 5.0) -> bool:
+        """Wait until every row queued so far is on disk."""
+        if not self.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+    
+    def close(self, timeout: Optional[float] = 5.0) -> bool:
+        """Write and fsync everything, close the sink and clear the marker.
+        
+        False if the thread is still writing after timeout, stopped on an
+        error or had to drop rows it could not write.
+        """
+        if self.is_alive():
+            self._queue.put(self._STOP)
+            self.join(timeout)
+        return not self.is_alive() and self.error is None
+    
+    def _write_marker(self):
+        data = {
+            'sink': self.sink.kind,
+            'session_name': self.sink.session_name,
+            'start': self.sink.start.isoformat(timespec='seconds'),
+            'path': str(self.sink.path)
+        }
+        tmp = self.marker.with_name(self.marker.name + ".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+            _fsync_file(f)
+        os.replace(tmp, self.marker)
+    
+    def _commit(self, rows: List[List[str]], sync: bool) -> List[List[str]]:
+        """Write (and optionally fsync) rows; returns rows still unwritten."""
+        start = time.perf_counter()
+        try:
+            if rows:
+                self.sink.write(rows)
+                self.rows_written += len(rows)
+            if sync:
+                self.sink.flush()
+                self.flushes += 1
+            METRICS.record('attendance_write', time.perf_counter() - start)
+        except Exception as e:
+            self.errors += 1
+            print(f"Attendance write error: {e}")
+            return rows
+        return []
+    
+    def run(self):
+        try:
+            self.sink.open()
+            self._write_marker()
+        except Exception as e:
+            self.error = e
+            print(f"Attendance open error: {e}")
+            return
+        finally:
+            self._opened.set()
+        
+        pending: List[List[str]] = []
+        dirty = False
+        last_flush = time.monotonic()
+        while True:
+            wait = max(0.0, last_flush + self.flush_interval - time.monotonic())
+            try:
+                item = self._queue.get(timeout=wait if dirty or pending else None)
+            except queue.Empty:
+                item = None
+            
+            if isinstance(item, list):
+                pending.append(item)
+                # Take whatever else is already queued in the same pass
+                while len(pending) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        item = None
+                        break
+                    if not isinstance(item, list):
+                        break
+                    pending.append(item)
+            
+            if len(pending) >= self.batch_size:
+                pending = self._commit(pending, sync=False)
+                dirty = True
+            
+            control = item is self._STOP or isinstance(item, threading.Event)
+            if control or time.monotonic() - last_flush >= self.flush_interval:
+                if pending or dirty:
+                    pending = self._commit(pending, sync=True)
+                    dirty = bool(pending)
+                last_flush = time.monotonic()
+            
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is self._STOP:
+                break
+        
+        try:
+            self.sink.close()
+        except Exception as e:
+            self.error = e
+            print(f"Attendance close error: {e}")
+            return
+        # Ended on purpose: never resumed, even when rows were lost
+        self.marker.unlink(missing_ok=True)
+        if pending:
+            self.error = IOError(f"{len(pending)} attendance row(s) could not be written to {self.sink.path}")
+            print(f"Attendance error: {self.error}")
+    
+    def stats(self) -> Dict[str, int]:
+        """Counters for the writer thread."""
+        return {
+            'queue': self._queue.qsize(),
+            'written': self.rows_written,
+            'flushes': self.flushes,
+            'errors': self.errors,
+            'stalls': self.stalls
+        }
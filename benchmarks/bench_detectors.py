@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Face detector benchmark
+Compares CPU latency of the HOG, CNN and SSD backends on the same images,
+one image at a time and through the batched path
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from encoding_cache import list_face_images
+from face_detectors import DETECTORS, create_detector
+
+
+def load_images(paths, width):
+    """RGB images resized to a common camera-like width."""
+    images = []
+    for path in paths:
+        bgr = cv2.imread(str(path))
+        if bgr is None:
+            continue
+        scale = width / bgr.shape[1]
+        bgr = cv2.resize(bgr, (width, int(round(bgr.shape[0] * scale))))
+        images.append(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+    
+    # Batching needs equal shapes
+    height = min(image.shape[0] for image in images)
+    return [image[:height] for image in images]
+
+
+def time_backend(detector, images, repeats, batch):
+    """Return (ms per image single, ms per image batched, faces found)."""
+    detector.detect(images[0])  # warm-up
+    
+    start = time.perf_counter()
+    faces = 0
+    for _ in range(repeats):
+        for image in images:
+            faces += len(detector.detect(image))
+    single = (time.perf_counter() - start) * 1000 / (repeats * len(images))
+    
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for i in range(0, len(images), batch):
+            detector.detect_batch(images[i:i + batch])
+    batched = (time.perf_counter() - start) * 1000 / (repeats * len(images))
+    
+    return single, batched, faces / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face detector backends")
+    parser.add_argument("images", nargs="*", type=Path, help="images (default: known_faces/)")
+    parser.add_argument("--backends", default=",".join(DETECTORS))
+    parser.add_argument("--width", type=int, default=640, help="resize images to this width")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=4)
+    args = parser.parse_args()
+    
+    paths = args.images or list_face_images(Path("known_faces"))
+    images = load_images(paths, args.width)
+    if not images:
+        parser.error("no readable images")
+    print(f"{len(images)} image(s) at {images[0].shape[1]}x{images[0].shape[0]}")
+    
+    print(f"{'backend':<8}{'ms/img':>10}{'batched':>10}{'faces':>8}")
+    for name in args.backends.split(","):
+        try:
+            detector = create_detector(name)
+        except Exception as e:
+            print(f"{name:<8}  unavailable: {e}")
+            continue
+        single, batched, faces = time_backend(detector, images, args.repeats, args.batch)
+        print(f"{name:<8}{single:>10.1f}{batched:>10.1f}{faces:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
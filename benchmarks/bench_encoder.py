@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Face encoder batching benchmark
+Measures dlib ResNet throughput per batch size, then runs BatchEncoder
+under several simulated streams to show throughput against latency for
+different max-batch / max-wait settings
+"""
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from encoding_cache import list_face_images
+from face_detectors import create_detector
+from face_encoder import BatchEncoder, FaceEncoder
+
+
+def load_faces(paths):
+    """(RGB image, face boxes) for every image with at least one face."""
+    import face_recognition
+    detector = create_detector("hog")
+    samples = []
+    for path in paths:
+        image = face_recognition.load_image_file(str(path))
+        locations = detector.detect(image)
+        if locations:
+            samples.append((image, locations))
+    return samples
+
+
+def bench_batch_sizes(encoder, chips, sizes, repeats):
+    """Faces per second when the network is fed batches of each size."""
+    print(f"{'batch':>6}{'faces/s':>10}{'ms/face':>10}")
+    for size in sizes:
+        batch = (chips * (size // len(chips) + 1))[:size]
+        encoder.encode_chips(batch)  # warm-up
+        start = time.perf_counter()
+        for _ in range(repeats):
+            encoder.encode_chips(batch)
+        per_face = (time.perf_counter() - start) / (repeats * size)
+        print(f"{size:>6}{1 / per_face:>10.1f}{per_face * 1000:>10.2f}")
+
+
+def bench_policy(encoder, samples, streams, frames, max_batch, max_wait_ms):
+    """Return (faces/s, p50 ms, p95 ms, mean batch) for one batching policy."""
+    batcher = BatchEncoder(encoder, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    batcher.start()
+    latencies = []
+    lock = threading.Lock()
+    
+    def stream(offset):
+        # Each stream encodes its frames back to back, like a recognition worker
+        for i in range(frames):
+            image, locations = samples[(offset + i) % len(samples)]
+            start = time.perf_counter()
+            batcher.encode(image, locations)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+    
+    threads = [threading.Thread(target=stream, args=(n,)) for n in range(streams)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    
+    stats = batcher.stats()
+    batcher.stop()
+    latencies = np.array(latencies) * 1000
+    return (stats['faces'] / elapsed, float(np.percentile(latencies, 50)),
+            float(np.percentile(latencies, 95)), stats['mean_batch'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched face encoding")
+    parser.add_argument("images", nargs="*", type=Path, help="images (default: known_faces/)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16,32,64")
+    parser.add_argument("--streams", type=int, default=4, help="concurrent callers for the policy test")
+    parser.add_argument("--frames", type=int, default=50, help="frames encoded per stream")
+    parser.add_argument("--max-batch", default="1,8,32")
+    parser.add_argument("--max-wait", default="0,2,5,10", help="max wait values in ms")
+    args = parser.parse_args()
+    
+    paths = args.images or list_face_images(Path("known_faces"))
+    samples = load_faces(paths)
+    if not samples:
+        parser.error("no faces found in the images")
+    
+    encoder = FaceEncoder()
+    chips = [chip for image, locations in samples for chip in encoder.chips(image, locations)]
+    print(f"{len(samples)} image(s), {len(chips)} face(s)\n")
+    
+    # Reference: face_recognition's per-frame call
+    import face_recognition
+    start = time.perf_counter()
+    for image, locations in samples:
+        face_recognition.face_encodings(image, locations)
+    per_face = (time.perf_counter() - start) / len(chips)
+    print(f"face_recognition.face_encodings: {per_face * 1000:.2f} ms/face (includes alignment)\n")
+    
+    bench_batch_sizes(encoder, chips, [int(s) for s in args.batch_sizes.split(",")], args.repeats)
+    
+    print(f"\n{args.streams} stream(s) x {args.frames} frame(s)")
+    print(f"{'max_batch':>10}{'max_wait':>10}{'faces/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'batch':>8}")
+    for max_batch in [int(s) for s in args.max_batch.split(",")]:
+        for max_wait in [float(s) for s in args.max_wait.split(",")]:
+            rate, p50, p95, mean_batch = bench_policy(
+                encoder, samples, args.streams, args.frames, max_batch, max_wait
+            )
+            print(f"{max_batch:>10}{max_wait:>10.0f}{rate:>10.1f}{p50:>10.1f}{p95:>10.1f}{mean_batch:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
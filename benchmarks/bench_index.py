@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Gallery index benchmark
+Measures recall@1 and per-probe latency of the approximate indexes against
+exact brute force on a synthetic gallery shaped like dlib encodings
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from face_gallery import FaceGallery
+from face_index import create_index
+
+
+def synthetic_gallery(people, photos, dim=128, seed=0):
+    """Clustered encodings: one centre per person plus per-photo noise."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(0.0, 0.09, (people, dim)).astype(np.float32)
+    encodings = np.repeat(centres, photos, axis=0)
+    encodings += rng.normal(0.0, 0.03, encodings.shape).astype(np.float32)
+    names = [f"person_{i}" for i in range(people) for _ in range(photos)]
+    probes = centres + rng.normal(0.0, 0.03, centres.shape).astype(np.float32)
+    return encodings, names, probes
+
+
+def run(kind, encodings, names, probes, batch):
+    """Return (build seconds, per-probe ms, top-1 rows)."""
+    start = time.perf_counter()
+    index = None if kind == "brute" else create_index(kind, len(encodings))
+    gallery = FaceGallery.from_encodings(encodings, names, index=index)
+    build = time.perf_counter() - start
+    
+    rows = []
+    start = time.perf_counter()
+    for i in range(0, len(probes), batch):
+        indices, _ = gallery.match(probes[i:i + batch], k=1)
+        rows.append(indices[:, 0])
+    elapsed = time.perf_counter() - start
+    return build, elapsed * 1000 / len(probes), np.concatenate(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gallery indexes")
+    parser.add_argument("--people", type=int, default=25000)
+    parser.add_argument("--photos", type=int, default=2)
+    parser.add_argument("--probes", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=4, help="faces per frame")
+    parser.add_argument("--kinds", default="brute,ivf,ivfpq")
+    args = parser.parse_args()
+    
+    encodings, names, probes = synthetic_gallery(args.people, args.photos)
+    probes = probes[:args.probes]
+    print(f"Gallery: {len(encodings)} encodings, {args.people} people, {len(probes)} probes")
+    
+    # Recall is always against exact brute-force search, whichever kinds are listed
+    kinds = args.kinds.split(",")
+    results = {kind: run(kind, encodings, names, probes, args.batch) for kind in kinds}
+    reference = results["brute"][2] if "brute" in results else run("brute", encodings, names, probes, args.batch)[2]
+    print(f"{'index':<8}{'build s':>10}{'ms/probe':>10}{'recall@1':>10}")
+    for kind in kinds:
+        build, latency, top = results[kind]
+        recall = float(np.mean(top == reference))
+        print(f"{kind:<8}{build:>10.2f}{latency:>10.3f}{recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+End-to-end pipeline benchmark
+Runs without a camera: frames come from video files or from composites
+built out of known_faces/*.jpg. Reports frames/s and per-stage latency
+percentiles of RecognitionEngine.process, matching cost against synthetic
+galleries of growing size, enrollment throughput and peak RSS, and saves
+everything as JSON so runs can be compared (--compare) for regressions
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from encoding_cache import list_face_images
+from face_gallery import FaceGallery
+from face_index import create_index
+from pipeline_metrics import METRICS, LatencyHistogram
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Metric name suffixes and which direction is better, for --compare
+LOWER_IS_BETTER = ('_ms', '_us', '_s', '_mb')
+HIGHER_IS_BETTER = ('_per_s',)
+
+
+def peak_rss_mb(who=None):
+    """Peak resident set size of this process (or its children), in MB."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return usage / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def environment():
+    """What the numbers depend on, stored with every result."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': commit,
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'cpus': os.cpu_count()
+    }
+
+
+# Workloads
+
+def video_frames(paths, count, width):
+    """Up to count frames from video files, resized to width (decoded up front)."""
+    frames = []
+    for path in paths:
+        capture = cv2.VideoCapture(str(path))
+        while len(frames) < count:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            if frame.shape[1] != width:
+                height = int(round(frame.shape[0] * width / frame.shape[1]))
+                frame = cv2.resize(frame, (width, height))
+            frames.append(frame)
+        capture.release()
+    return frames
+
+
+def composite_frames(face_files, count, width, height, faces, seed=0):
+    """Frames with faces from known_faces/ drifting across a textured background.
+    
+    Same seed, same frames, so runs on different commits see identical input.
+    """
+    rng = np.random.default_rng(seed)
+    tile_height = height // 2
+    tiles = []
+    for path in face_files:
+        image = cv2.imread(str(path))
+        if image is None:
+            continue
+        tile_width = int(round(image.shape[1] * tile_height / image.shape[0]))
+        tiles.append(cv2.resize(image, (min(tile_width, width // max(faces, 1)), tile_height)))
+    if not tiles:
+        sys.exit("No readable images for composite frames")
+    
+    background = np.linspace(40, 160, width, dtype=np.float32)[None, :, None].repeat(height, 0).repeat(3, 2)
+    background += rng.normal(0, 8, background.shape).astype(np.float32)
+    background = np.clip(background, 0, 255).astype(np.uint8)
+    
+    # Each face starts in its own column and moves a few pixels per frame
+    slot = width // max(faces, 1)
+    picks = [tiles[i % len(tiles)] for i in range(faces)]
+    starts = [(i * slot, int(rng.integers(0, height - tile_height + 1))) for i in range(faces)]
+    velocity = rng.uniform(-2, 2, (faces, 2))
+    
+    frames = []
+    for n in range(count):
+        frame = background.copy()
+        for tile, (x0, y0), (vx, vy) in zip(picks, starts, velocity):
+            x = int(np.clip(x0 + vx * n, 0, width - tile.shape[1]))
+            y = int(np.clip(y0 + vy * n, 0, height - tile.shape[0]))
+            frame[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+        frames.append(frame)
+    return frames
+
+
+def synthetic_encodings(count, people=None, dim=128, seed=0):
+    """dlib-like encodings: ~0.9 apart between people, ~0.35 within."""
+    rng = np.random.default_rng(seed)
+    people = people or max(count // 4, 1)
+    centers = rng.normal(0, 0.056, (people, dim)).astype(np.float32)
+    owners = np.arange(count) % people
+    encodings = centers[owners] + rng.normal(0, 0.02, (count, dim)).astype(np.float32)
+    return encodings, [f"synthetic_{i}" for i in owners]
+
+
+# Sections
+
+def bench_pipeline(frames, known_faces, args):
+    """Frames/s and stage latencies of RecognitionEngine.process on a temporary copy of known_faces/."""
+    if importlib.util.find_spec("face_recognition") is None:
+        return {'skipped': "face_recognition is not installed"}
+    from recognition_engine import RecognitionEngine
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        faces_dir = tmp / "known_faces"
+        faces_dir.mkdir()
+        for path in list_face_images(known_faces):
+            shutil.copy2(path, faces_dir / path.name)
+        
+        start = time.perf_counter()
+        engine = RecognitionEngine(faces_dir, tmp / "attendance_records", tmp / "students.csv",
+                                   gallery_index=args.index, detector_backend=args.detector,
+                                   match_strategy=args.match)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        engine.load_known_faces()
+        warm = time.perf_counter() - start
+        
+        if args.pipeline_gallery:
+            # Pad the real photos with synthetic people
+            encodings, names = synthetic_encodings(args.pipeline_gallery)
+            real = engine.gallery
+            engine.gallery = engine.build_gallery(np.vstack([real.encodings, encodings]),
+                                                  list(real.names) + names, list(real.keys) + [None] * len(names))
+            engine.matcher = engine.build_matcher()
+        
+        engine.start_session("Benchmark")
+        warmup = min(args.warmup, len(frames) // 2)
+        for frame in frames[:warmup]:
+            engine.process(frame)
+        METRICS.reset()
+        
+        faces = 0
+        start = time.perf_counter()
+        for frame in frames[warmup:]:
+            faces += len(engine.process(frame))
+        elapsed = time.perf_counter() - start
+        measured = len(frames) - warmup
+        stats = engine.stats()
+        engine.close()
+    
+    return {
+        'frames': measured,
+        'frames_per_s': measured / max(elapsed, 1e-9),
+        'faces_per_frame': faces / max(measured, 1),
+        'gallery': len(engine.gallery),
+        'load_cold_s': cold,
+        'load_warm_s': warm,
+        'stages': METRICS.snapshot(),
+        'encoder': stats['encoder'],
+        'tracking': stats['tracking'],
+        'quality': stats['quality'],
+        'match_cache': stats['match_cache'],
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def bench_matching(sizes, kinds, faces, calls, tolerance):
+    """Build time and per-call latency of best_matches for each gallery size and index."""
+    rows = []
+    for size in sizes:
+        encodings, names = synthetic_encodings(size)
+        probes = encodings[:: max(size // (faces * calls), 1)][:faces * calls]
+        probes = probes + np.random.default_rng(1).normal(0, 0.02, probes.shape).astype(np.float32)
+        for kind in kinds:
+            start = time.perf_counter()
+            gallery = FaceGallery.from_encodings(encodings, names, index=create_index(kind, size))
+            build = time.perf_counter() - start
+            
+            gallery.best_matches(probes[:faces], tolerance)  # warm-up
+            latency = LatencyHistogram()
+            for i in range(calls):
+                frame = probes[(i * faces) % len(probes):][:faces]
+                call_start = time.perf_counter()
+                gallery.best_matches(frame, tolerance)
+                latency.record(time.perf_counter() - call_start)
+            summary = latency.summary()
+            rows.append({
+                'label': f"{kind}@{size}",
+                'index': kind,
+                'gallery': size,
+                'build_s': build,
+                'us_per_face': latency.total * 1e6 / (calls * faces),
+                'p50_ms': summary['p50_ms'],
+                'p95_ms': summary['p95_ms'],
+                'p99_ms': summary['p99_ms']
+            })
+            del gallery
+    return rows
+
+
+def bench_enrollment(face_files, copies, workers):
+    """Photos/s of enroll.py over copies of known_faces/*.jpg."""
+    if importlib.util.find_spec("face_recognition") is None:
+        return {'skipped': "face_recognition is not installed"}
+    from enroll import enroll
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "photos"
+        source.mkdir()
+        for i in range(copies):
+            for path in face_files:
+                shutil.copy2(path, source / f"{path.stem}_{i}{path.suffix}")
+        summary = enroll(source, Path(tmp) / "known_faces", workers, chunksize=4)
+    
+    return {
+        'photos': summary['total'],
+        'enrolled': summary['ok'],
+        'workers': workers,
+        'elapsed_s': summary['seconds'],
+        'images_per_s': summary['total'] / max(summary['seconds'], 1e-9),
+        'workers_peak_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None
+    }
+
+
+# Reporting
+
+def flatten(value, prefix=""):
+    """(dotted name, number) for every numeric leaf; list items are keyed by 'label'."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from flatten(item, f"{prefix}{key}.")
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            label = item.get('label', i) if isinstance(item, dict) else i
+            yield from flatten(item, f"{prefix}{label}.")
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix[:-1], float(value)
+
+
+def compare(baseline, current, threshold):
+    """Print metrics that moved by more than threshold; returns the regressions."""
+    before = dict(flatten({k: baseline.get(k) for k in ('pipeline', 'matching', 'enrollment')}))
+    regressions = []
+    print(f"\nAgainst {baseline.get('environment', {}).get('commit')} (threshold {threshold:.0%}):")
+    for name, value in flatten({k: current.get(k) for k in ('pipeline', 'matching', 'enrollment')}):
+        old = before.get(name)
+        if not old:
+            continue
+        if name.endswith(HIGHER_IS_BETTER):
+            change = (value - old) / old
+        elif name.endswith(LOWER_IS_BETTER):
+            change = (old - value) / old
+        else:
+            continue
+        if abs(change) >= threshold:
+            verdict = "better" if change > 0 else "WORSE"
+            print(f"  {name:<44}{old:>12.3f} -> {value:<12.3f}{verdict} ({abs(change):.0%})")
+            if change < 0:
+                regressions.append(name)
+    if not regressions:
+        print("  no regressions")
+    return regressions
+
+
+def print_results(results):
+    pipeline = results['pipeline']
+    print("\nPipeline")
+    if 'skipped' in pipeline:
+        print(f"  skipped: {pipeline['skipped']}")
+    else:
+        print(f"  {pipeline['frames']} frames at {pipeline['frames_per_s']:.1f} frames/s, "
+              f"{pipeline['faces_per_frame']:.1f} faces/frame, gallery {pipeline['gallery']}, "
+              f"load {pipeline['load_cold_s']:.2f} s cold / {pipeline['load_warm_s']:.2f} s warm")
+        print(f"  {'stage':<18}{'count':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for stage, summary in pipeline['stages'].items():
+            print(f"  {stage:<18}{summary['count']:>8}{summary['p50_ms']:>9.2f}"
+                  f"{summary['p95_ms']:>9.2f}{summary['p99_ms']:>9.2f}")
+    
+    print("\nMatching (best_matches per frame)")
+    print(f"  {'index':<8}{'gallery':>9}{'build s':>9}{'us/face':>9}{'p50 ms':>9}{'p99 ms':>9}")
+    for row in results['matching']:
+        print(f"  {row['index']:<8}{row['gallery']:>9}{row['build_s']:>9.2f}{row['us_per_face']:>9.1f}"
+              f"{row['p50_ms']:>9.3f}{row['p99_ms']:>9.3f}")
+    
+    enrollment = results['enrollment']
+    print("\nEnrollment")
+    if 'skipped' in enrollment:
+        print(f"  skipped: {enrollment['skipped']}")
+    else:
+        print(f"  {enrollment['photos']} photos, {enrollment['images_per_s']:.1f} images/s "
+              f"with {enrollment['workers']} workers")
+    print(f"\nPeak RSS: {results['peak_rss_mb'] or 0:.0f} MB")
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark the recognition pipeline without a camera")
+    parser.add_argument("videos", nargs="*", type=Path, help="video files (default: composites of known_faces/)")
+    parser.add_argument("--known-faces", type=Path, default=ROOT / "known_faces")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=20, help="frames processed before measuring")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480, help="composite frame height")
+    parser.add_argument("--faces", type=int, default=2, help="faces per composite frame / probes per match call")
+    parser.add_argument("--detector", default="hog")
+    parser.add_argument("--index", default="auto", help="gallery index used by the pipeline")
+    parser.add_argument("--match", default="all", help="match strategy used by the pipeline")
+    parser.add_argument("--pipeline-gallery", type=int, default=0,
+                        help="synthetic encodings added to the pipeline's gallery")
+    parser.add_argument("--gallery-sizes", default="1000,10000,100000")
+    parser.add_argument("--indexes", default="brute,ivf", help="indexes compared in the matching section")
+    parser.add_argument("--match-calls", type=int, default=200)
+    parser.add_argument("--tolerance", type=float, default=0.6)
+    parser.add_argument("--enroll-copies", type=int, default=10, help="copies of each photo to enroll (0 = skip)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--skip", default="", help="sections to skip: pipeline,matching,enrollment")
+    parser.add_argument("--output", type=Path, help="results file (default: benchmarks/results/<time>.json)")
+    parser.add_argument("--compare", type=Path, help="earlier results file; exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change reported by --compare")
+    args = parser.parse_args()
+    skip = set(filter(None, args.skip.split(",")))
+    
+    face_files = list_face_images(args.known_faces)
+    if args.videos:
+        frames = video_frames(args.videos, args.frames, args.width)
+        workload = {'kind': 'video', 'sources': [str(path) for path in args.videos]}
+    else:
+        frames = composite_frames(face_files, args.frames, args.width, args.height, args.faces)
+        workload = {'kind': 'composite', 'sources': [path.name for path in face_files]}
+    if not frames:
+        sys.exit("No frames to process")
+    workload.update(frames=len(frames), shape=list(frames[0].shape))
+    
+    results = {'environment': environment(), 'args': {k: str(v) for k, v in vars(args).items()},
+               'workload': workload}
+    results['pipeline'] = {'skipped': "--skip"} if 'pipeline' in skip else bench_pipeline(frames, args.known_faces, args)
+    results['matching'] = [] if 'matching' in skip else bench_matching(
+        [int(s) for s in args.gallery_sizes.split(",") if s], args.indexes.split(","),
+        args.faces, args.match_calls, args.tolerance)
+    if 'enrollment' in skip or not args.enroll_copies:
+        results['enrollment'] = {'skipped': "--skip"}
+    else:
+        results['enrollment'] = bench_enrollment(face_files, args.enroll_copies, args.workers)
+    results['peak_rss_mb'] = peak_rss_mb()
+    print_results(results)
+    
+    output = args.output or ROOT / "benchmarks" / "results" / f"{time.strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding='utf-8')
+    print(f"Results: {output}")
+    
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding='utf-8'))
+        if compare(baseline, results, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
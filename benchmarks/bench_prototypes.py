@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Identity prototype benchmark
+Compares matching against every photo with per-person prototypes
+(centroid, k medoids, capped samples): accuracy on held-out photos,
+false accepts from people not enrolled, and match time per face
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from face_gallery import FaceGallery
+from face_prototypes import IdentityPrototypes
+
+
+def synthetic(people, photos, noise, seed=0):
+    """Clustered 128-d encodings at dlib-like distances (~0.9 between people).
+    
+    Each person's photos fall into two conditions (e.g. glasses / lighting)
+    plus per-photo noise, so a single mean is not always representative.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.056, (people, 128))
+    conditions = centers[:, None, :] + rng.normal(0, noise, (people, 2, 128))
+    picks = rng.integers(2, size=(people, photos))
+    encodings = np.take_along_axis(conditions, picks[:, :, None], axis=1).reshape(people * photos, 128)
+    encodings += rng.normal(0, noise, encodings.shape)
+    names = [f"person{i}" for i in range(people) for _ in range(photos)]
+    return encodings.astype(np.float32), names
+
+
+def stored(known_faces_dir):
+    """Encodings and names from the gallery store."""
+    from encoding_cache import EncodingCache, encoder_model_id
+    cache = EncodingCache(known_faces_dir / "encodings.fgal", encoder_model_id())
+    if not cache.load():
+        sys.exit(f"No encodings in {known_faces_dir}")
+    encodings, names, _ = cache.rows()
+    return np.array(encodings, dtype=np.float32), list(names)
+
+
+def split(encodings, names, unknown_share, seed=0):
+    """Hold out one photo per person (if they have 2+) and a share of people entirely."""
+    rng = np.random.default_rng(seed)
+    people = sorted(set(names))
+    unknown = set(rng.choice(people, int(len(people) * unknown_share), replace=False)) if unknown_share else set()
+    rows_by_name = {}
+    for row, name in enumerate(names):
+        rows_by_name.setdefault(name, []).append(row)
+    
+    train, probes, unknown_rows = [], [], []
+    for name, rows in rows_by_name.items():
+        if name in unknown:
+            unknown_rows.extend(rows)
+        elif len(rows) > 1:
+            held = rows[rng.integers(len(rows))]
+            probes.append(held)
+            train.extend(row for row in rows if row != held)
+        else:
+            train.extend(rows)
+    return np.array(train), np.array(probes), np.array(unknown_rows)
+
+
+def evaluate(matcher, encodings, names, probes, unknown, tolerance, repeats):
+    """(accuracy, false accept rate, us per face) for one matcher."""
+    correct = 0
+    if len(probes):
+        matches = matcher.best_matches(encodings[probes], tolerance)
+        correct = sum(1 for row, (name, _) in zip(probes, matches) if name == names[row])
+    false_accepts = 0
+    if len(unknown):
+        false_accepts = sum(1 for name, _ in matcher.best_matches(encodings[unknown], tolerance) if name)
+    
+    # Timing: frames of a few faces, as in the live loop
+    frame = encodings[probes[:8]] if len(probes) else encodings[:8]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        matcher.best_matches(frame, tolerance)
+    per_face = (time.perf_counter() - start) / (repeats * len(frame))
+    return correct / max(len(probes), 1), false_accepts / max(len(unknown), 1), per_face * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-identity prototypes against all samples")
+    parser.add_argument("--known-faces", type=Path, help="use the enrolled gallery instead of synthetic data")
+    parser.add_argument("--people", type=int, default=2000)
+    parser.add_argument("--photos", type=int, default=10, help="photos per synthetic person")
+    parser.add_argument("--noise", type=float, default=0.03, help="per-dimension spread of synthetic photos")
+    parser.add_argument("--unknown", type=float, default=0.1, help="share of people left out as impostors")
+    parser.add_argument("--tolerance", type=float, default=0.6)
+    parser.add_argument("--k", default="1,3,5", help="medoid counts to try")
+    parser.add_argument("--cap", default="5", help="max samples per person to try")
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+    
+    if args.known_faces:
+        encodings, names = stored(args.known_faces)
+    else:
+        encodings, names = synthetic(args.people, args.photos, args.noise)
+    train, probes, unknown = split(encodings, names, args.unknown)
+    sample_gallery = FaceGallery.from_encodings(encodings[train], [names[i] for i in train])
+    print(f"{len(set(sample_gallery.names))} people, {len(sample_gallery)} photos, "
+          f"{len(probes)} held-out probes, {len(unknown)} impostor photos\n")
+    
+    candidates = [("all", sample_gallery)]
+    for cap in [int(s) for s in args.cap.split(",") if s]:
+        candidates.append((f"all (cap {cap})", IdentityPrototypes("all", max_samples=cap)))
+    candidates.append(("centroid", IdentityPrototypes("centroid")))
+    for k in [int(s) for s in args.k.split(",") if s]:
+        candidates.append((f"medoids k={k}", IdentityPrototypes("medoids", k=k)))
+    
+    print(f"{'strategy':<16}{'rows':>8}{'build s':>9}{'accuracy':>10}{'FAR':>8}{'us/face':>9}")
+    for label, matcher in candidates:
+        start = time.perf_counter()
+        if matcher is not sample_gallery:
+            matcher.build(sample_gallery)
+        build = time.perf_counter() - start
+        accuracy, far, per_face = evaluate(matcher, encodings, names, probes, unknown,
+                                           args.tolerance, args.repeats)
+        print(f"{label:<16}{len(matcher):>8}{build:>9.2f}{accuracy * 100:>9.1f}%{far * 100:>7.1f}%{per_face:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
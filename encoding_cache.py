@@ -0,0 +1,300 @@
+"""
+Incremental face-encoding cache for known_faces/
+Each image is keyed by file name, size and mtime, so only new or changed
+photos are encoded and deleted photos simply drop out of the cache.
+Encodings are persisted in the memory-mapped gallery_store format; an old
+encodings.pkl is migrated the first time it is seen.
+load() only reads, so any number of processes can map the store; save() and
+compact() write it and belong to the one process that owns known_faces/
+"""
+
+import pickle
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from face_encoder import LANDMARK_MODEL, NUM_JITTERS
+from gallery_store import GalleryStore
+
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp']
+
+# Separates the person name from the photo number in Name__2.jpg, Name__3.jpg, ...
+PHOTO_NUMBER_SEPARATOR = "__"
+
+
+def list_face_images(directory: Path) -> List[Path]:
+    """All supported image files in directory, in a stable order."""
+    files = []
+    for ext in IMAGE_EXTENSIONS:
+        files.extend(directory.glob(f"*{ext}"))
+    return sorted(files)
+
+
+def person_name(image_file: Path) -> str:
+    """Person name for a photo (the file name without extension and photo number)."""
+    name, separator, number = image_file.stem.rpartition(PHOTO_NUMBER_SEPARATOR)
+    if separator and name and number.isdigit():
+        return name
+    return image_file.stem
+
+
+def unique_photo_path(directory: Path, name: str, ext: str = ".jpg") -> Path:
+    """First free Name.jpg, Name__2.jpg, Name__3.jpg, ... in directory.
+    
+    person_name() maps every one of them back to name.
+    """
+    counter = 1
+    while True:
+        suffix = '' if counter == 1 else f"{PHOTO_NUMBER_SEPARATOR}{counter}"
+        path = directory / f"{name}{suffix}{ext}"
+        if not path.exists():
+            return path
+        counter += 1
+
+
+def encoder_model_id() -> str:
+    """Identifies the encoder and its landmark model; cached encodings are only valid for it."""
+    import face_recognition
+    version = getattr(face_recognition, '__version__', 'unknown')
+    return f"dlib_resnet_v1/{LANDMARK_MODEL}_landmarks/face_recognition-{version}"
+
+
+def encode_image_file(image_file: Path) -> Optional[np.ndarray]:
+    """Encode the first face in an image file, or None."""
+    # Only needed for photos the cache hasn't seen, so not imported at startup
+    import face_recognition
+    image = face_recognition.load_image_file(str(image_file))
+    encodings = face_recognition.face_encodings(image, num_jitters=NUM_JITTERS, model=LANDMARK_MODEL)
+    return encodings[0] if encodings else None
+
+
+class EncodingCache:
+    """Maps image file -> (size, mtime, name, encoding) for one model version."""
+    
+    def __init__(self, store_file: Path, model_id: str, legacy_file: Optional[Path] = None):
+        self.store = GalleryStore(store_file, model_id)
+        self.legacy_file = Path(legacy_file) if legacy_file else None
+        self.model_id = model_id
+        self.matrix = np.empty((0, self.store.dim), dtype=np.float32)
+        self.entries: Dict[str, Dict] = {}
+        self._needs_rewrite = True
+        self._table_dirty = False
+    
+    def load(self) -> bool:
+        """Open the store (or read encodings.pkl for migration); False if nothing usable.
+        
+        Never writes: rows of deleted photos stay in the mapped matrix until
+        the owner calls compact() or save().
+        """
+        if self.store.exists():
+            data = self.store.read()
+            if data is not None:
+                self.matrix, table = data
+                self.entries = {
+                    key: {'row': row if row >= 0 else None, 'name': name,
+                          'size': size, 'mtime': mtime, 'encoding': None}
+                    for key, (row, name, size, mtime) in table['entries'].items()
+                }
+                self._needs_rewrite = self._live_rows() != len(self.matrix)
+                return True
+        
+        if self.legacy_file and self.legacy_file.exists():
+            return self._migrate_legacy()
+        return False
+    
+    def _migrate_legacy(self) -> bool:
+        """Import encodings.pkl (v1 lists or v2 per-file entries)."""
+        try:
+            with open(self.legacy_file, 'rb') as f:
+                data = pickle.load(f)
+        except Exception as e:
+            print(f"Cache error: {e}")
+            return False
+        if not isinstance(data, dict):
+            return False
+        
+        directory = self.legacy_file.parent
+        if data.get('version') == 2:
+            if data.get('model') != self.model_id:
+                return False
+            for key, entry in data['entries'].items():
+                self.entries[key] = dict(entry, row=None)
+        else:
+            # v1 only stored names, which were file stems; pair them with that photo
+            files = {f.stem: f for f in list_face_images(directory)}
+            for encoding, stem in zip(data['encodings'], data['names']):
+                image_file = files.get(stem)
+                if image_file is None:
+                    continue
+                stat = image_file.stat()
+                self.entries[image_file.name] = {
+                    'row': None, 'name': person_name(image_file), 'size': stat.st_size,
+                    'mtime': stat.st_mtime_ns,
+                    'encoding': np.asarray(encoding, dtype=np.float32)
+                }
+        
+        print(f"Migrating {len(self.entries)} cached encoding(s) from {self.legacy_file.name}")
+        # Written to the store by the owner's next save()
+        self._needs_rewrite = True
+        self._table_dirty = True
+        return True
+    
+    def _live_rows(self) -> int:
+        return sum(1 for entry in self.entries.values() if entry['row'] is not None)
+    
+    def _table(self) -> Dict:
+        return {
+            key: [-1 if entry['row'] is None else entry['row'],
+                  entry['name'], entry['size'], entry['mtime']]
+            for key, entry in self.entries.items()
+        }
+    
+    def save(self):
+        """Persist changes: append new rows, or compact the store if needed."""
+        pending = [
+            key for key, entry in self.entries.items()
+            if entry['row'] is None and entry['encoding'] is not None
+        ]
+        
+        try:
+            if self._needs_rewrite or not self.store.exists():
+                keys = [key for key, entry in self.entries.items()
+                        if entry['row'] is not None or entry['encoding'] is not None]
+                matrix = np.array([self.encoding(key) for key in keys], dtype=np.float32).reshape(-1, self.store.dim)
+                for row, key in enumerate(keys):
+                    self.entries[key]['row'] = row
+                    self.entries[key]['encoding'] = None
+                
+                # Release the old mapping before the file is replaced
+                self.matrix = matrix
+                self.store.write(matrix, self._table())
+            elif pending:
+                start = self.store.count
+                rows = np.array([self.entries[key]['encoding'] for key in pending], dtype=np.float32)
+                for offset, key in enumerate(pending):
+                    self.entries[key]['row'] = start + offset
+                self.store.append(rows, self._table())
+            elif self._table_dirty:
+                self.store.write_table(self._table())
+            else:
+                return
+        except Exception as e:
+            print(f"Cache save error: {e}")
+            return
+        
+        self._needs_rewrite = False
+        self._table_dirty = False
+    
+    def compact(self):
+        """Save, rewriting the store without rows of deleted or changed photos.
+        
+        save() on its own appends while the app runs; this is for startup,
+        before the matrix is handed out.
+        """
+        if self._live_rows() != self.store.count:
+            self._needs_rewrite = True
+        self.save()
+    
+    def put(self, image_file: Path, encoding: Optional[np.ndarray], name: Optional[str] = None):
+        """Record an encoding computed elsewhere (e.g. by bulk enrollment)."""
+        stat = image_file.stat()
+        self.entries[image_file.name] = {
+            'row': None,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'name': name or person_name(image_file),
+            'encoding': None if encoding is None else np.asarray(encoding, dtype=np.float32)
+        }
+        self._table_dirty = True
+    
+    def encoding(self, key: str) -> Optional[np.ndarray]:
+        """Encoding for key, from the mapped store or a pending new entry."""
+        entry = self.entries[key]
+        if entry['encoding'] is not None:
+            return entry['encoding']
+        if entry['row'] is not None and entry['row'] < len(self.matrix):
+            return self.matrix[entry['row']]
+        return None
+    
+    def sync(self, image_files: List[Path],
+             encode_fn: Callable[[Path], Optional[np.ndarray]]) -> Tuple[List[str], List[str]]:
+        """Bring entries in line with image_files.
+        
+        Only files whose size or mtime changed are passed to encode_fn.
+        Returns (added, removed) keys; a changed file appears in both.
+        """
+        added = []
+        removed = []
+        seen = set()
+        
+        for image_file in image_files:
+            key = image_file.name
+            seen.add(key)
+            try:
+                stat = image_file.stat()
+            except OSError as e:
+                print(f"Error reading {image_file}: {e}")
+                continue
+            
+            entry = self.entries.get(key)
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+                continue
+            
+            if entry:
+                removed.append(key)
+            
+            try:
+                encoding = encode_fn(image_file)
+            except Exception as e:
+                print(f"Error loading {image_file}: {e}")
+                encoding = None
+            
+            # Files without a face are cached too, so they aren't retried every start
+            self.entries[key] = {
+                'row': None,
+                'size': stat.st_size,
+                'mtime': stat.st_mtime_ns,
+                'name': person_name(image_file),
+                'encoding': None if encoding is None else np.asarray(encoding, dtype=np.float32)
+            }
+            added.append(key)
+        
+        for key in list(self.entries):
+            if key not in seen:
+                del self.entries[key]
+                removed.append(key)
+        
+        if added or removed:
+            self._table_dirty = True
+        return added, removed
+    
+    def rows(self, keys: Optional[List[str]] = None):
+        """Return (encodings, names, keys) for entries that have a face.
+        
+        With no keys and a freshly loaded store, encodings is the mapped
+        matrix itself, so building the gallery copies nothing.
+        """
+        if keys is None and not self._table_dirty:
+            by_row = sorted(
+                (entry['row'], key) for key, entry in self.entries.items()
+                if entry['row'] is not None
+            )
+            if len(by_row) == len(self.matrix):
+                row_keys = [key for _, key in by_row]
+                names = [self.entries[key]['name'] for key in row_keys]
+                return self.matrix, names, row_keys
+        
+        encodings = []
+        names = []
+        row_keys = []
+        for key in (self.entries if keys is None else keys):
+            if key not in self.entries:
+                continue
+            encoding = self.encoding(key)
+            if encoding is not None:
+                encodings.append(encoding)
+                names.append(self.entries[key]['name'])
+                row_keys.append(key)
+        return encodings, names, row_keys
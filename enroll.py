@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Headless bulk enrollment
+Walks a photo directory, encodes every face across a process pool and
+streams the results into known_faces/ and its gallery store
+"""
+
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from encoding_cache import IMAGE_EXTENSIONS, EncodingCache, encoder_model_id, person_name, unique_photo_path
+from face_encoder import LANDMARK_MODEL, NUM_JITTERS
+
+
+# How often (in enrolled photos) the store is committed while streaming
+SAVE_EVERY = 200
+
+
+def find_images(root: Path) -> List[Path]:
+    """All supported images under root, recursively."""
+    return sorted(
+        path for path in root.rglob("*")
+        if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS
+    )
+
+
+def enrollment_name(image_file: Path, root: Path, name_from: str) -> str:
+    """Person name from the file stem or from the person's folder."""
+    if name_from == "dir" and image_file.parent != root:
+        return image_file.parent.name
+    return person_name(image_file)
+
+
+def encode_image(args: Tuple[str, str, int]) -> Tuple[str, str, Optional[list], str]:
+    """Worker: decode, detect and encode one photo.
+    
+    Returns (path, status, encoding, error) where status is one of
+    'ok', 'no_face', 'multiple_faces' or 'error'.
+    """
+    path, model, upsample = args
+    try:
+        import face_recognition
+        image = face_recognition.load_image_file(path)
+        locations = face_recognition.face_locations(image, number_of_times_to_upsample=upsample, model=model)
+        if not locations:
+            return path, 'no_face', None, ""
+        if len(locations) > 1:
+            return path, 'multiple_faces', None, f"{len(locations)} faces"
+        encoding = face_recognition.face_encodings(image, locations, num_jitters=NUM_JITTERS, model=LANDMARK_MODEL)[0]
+        return path, 'ok', encoding.tolist(), ""
+    except Exception as e:
+        return path, 'error', None, str(e)
+
+
+def enroll(source: Path, known_faces_dir: Path, workers: int, chunksize: int,
+           name_from: str = "file", model: str = "hog", upsample: int = 1) -> dict:
+    """Enroll every photo under source; returns a summary dict."""
+    images = find_images(source)
+    known_faces_dir.mkdir(exist_ok=True)
+    
+    cache = EncodingCache(
+        known_faces_dir / "encodings.fgal",
+        encoder_model_id(),
+        legacy_file=known_faces_dir / "encodings.pkl"
+    )
+    cache.load()
+    
+    summary = {'total': len(images), 'ok': 0, 'no_face': [], 'multiple_faces': [], 'error': []}
+    start = time.perf_counter()
+    jobs = [(str(path), model, upsample) for path in images]
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for done, (path, status, encoding, error) in enumerate(
+                executor.map(encode_image, jobs, chunksize=chunksize), 1):
+            image_file = Path(path)
+            if status != 'ok':
+                summary[status].append((path, error))
+            else:
+                # Copy into known_faces/ so the app's cache sync keeps the entry
+                name = enrollment_name(image_file, source, name_from)
+                target = unique_photo_path(known_faces_dir, name, image_file.suffix.lower())
+                shutil.copy2(image_file, target)
+                cache.put(target, encoding, name)
+                summary['ok'] += 1
+                if summary['ok'] % SAVE_EVERY == 0:
+                    cache.save()
+            
+            if done % 50 == 0 or done == len(jobs):
+                rate = done / max(time.perf_counter() - start, 1e-6)
+                print(f"  {done}/{len(jobs)} images ({rate:.1f}/s)", flush=True)
+    
+    cache.save()
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+def print_summary(summary: dict):
+    """Human-readable enrollment report."""
+    seconds = summary['seconds']
+    rate = summary['total'] / seconds if seconds > 0 else 0.0
+    print()
+    print(f"Processed {summary['total']} image(s) in {seconds:.1f}s ({rate:.1f} images/s)")
+    print(f"  Enrolled:        {summary['ok']}")
+    print(f"  No face:         {len(summary['no_face'])}")
+    print(f"  Multiple faces:  {len(summary['multiple_faces'])}")
+    print(f"  Errors:          {len(summary['error'])}")
+    
+    for status, label in [('no_face', "No face"), ('multiple_faces', "Multiple faces"), ('error', "Error")]:
+        for path, error in summary[status]:
+            detail = f" ({error})" if error else ""
+            print(f"  {label}: {path}{detail}")
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Bulk-enroll faces from a photo directory")
+    parser.add_argument("source", type=Path, help="directory of photos (searched recursively)")
+    parser.add_argument("--known-faces", type=Path, default=Path("known_faces"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunksize", type=int, default=8, help="images per task sent to a worker")
+    parser.add_argument("--name-from", choices=["file", "dir"], default="file",
+                        help="take the person name from the file name or its folder")
+    parser.add_argument("--model", choices=["hog", "cnn"], default="hog")
+    parser.add_argument("--upsample", type=int, default=1)
+    args = parser.parse_args()
+    
+    if not args.source.is_dir():
+        parser.error(f"{args.source} is not a directory")
+    
+    summary = enroll(args.source, args.known_faces, args.workers, args.chunksize,
+                     args.name_from, args.model, args.upsample)
+    print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
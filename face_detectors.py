@@ -0,0 +1,160 @@
+"""
+Pluggable face detectors
+HOG and CNN (dlib) and the OpenCV res10 SSD shipped in models/, all
+returning face_recognition-style (top, right, bottom, left) boxes
+"""
+
+import threading
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+
+Location = Tuple[int, int, int, int]
+
+MODELS_DIR = Path(__file__).resolve().parent / "models"
+SSD_PROTOTXT = MODELS_DIR / "deploy.prototxt"
+SSD_WEIGHTS = MODELS_DIR / "res10_300x300_ssd_iter_140000.caffemodel"
+
+
+def _clip_box(top: int, right: int, bottom: int, left: int, shape) -> Location:
+    """Clamp a box to the image, like face_recognition does."""
+    height, width = shape[:2]
+    return max(top, 0), min(right, width), min(bottom, height), max(left, 0)
+
+
+class FaceDetector:
+    """Base class: subclasses implement _detect_batch on RGB images."""
+    
+    name = "base"
+    
+    def __init__(self, confidence: float = 0.0):
+        self.confidence = confidence
+        self._lock = threading.Lock()
+    
+    def detect(self, rgb_image: np.ndarray) -> List[Location]:
+        """Face boxes in one RGB image."""
+        return self.detect_batch([rgb_image])[0]
+    
+    def detect_batch(self, rgb_images: Sequence[np.ndarray]) -> List[List[Location]]:
+        """Face boxes for several RGB images in one call."""
+        if not len(rgb_images):
+            return []
+        # Detector objects are shared by the worker and the UI thread
+        with self._lock:
+            return self._detect_batch(rgb_images)
+    
+    def _detect_batch(self, rgb_images: Sequence[np.ndarray]) -> List[List[Location]]:
+        raise NotImplementedError
+
+
+class HOGDetector(FaceDetector):
+    """dlib's HOG + linear SVM frontal face detector (face_recognition's default)."""
+    
+    name = "hog"
+    
+    def __init__(self, confidence: float = 0.0, upsample: int = 1):
+        super().__init__(confidence)
+        import dlib
+        self.upsample = upsample
+        self._detector = dlib.get_frontal_face_detector()
+    
+    def _detect_batch(self, rgb_images):
+        results = []
+        for image in rgb_images:
+            # run() exposes the SVM score, which is what the threshold applies to
+            rects, scores, _ = self._detector.run(image, self.upsample, self.confidence)
+            results.append([
+                _clip_box(r.top(), r.right(), r.bottom(), r.left(), image.shape)
+                for r, score in zip(rects, scores) if score >= self.confidence
+            ])
+        return results
+
+
+class CNNDetector(FaceDetector):
+    """dlib's MMOD CNN detector; accurate, slow without a GPU."""
+    
+    name = "cnn"
+    
+    def __init__(self, confidence: float = 0.5, upsample: int = 1, batch_size: int = 16):
+        super().__init__(confidence)
+        import dlib
+        import face_recognition_models
+        self.upsample = upsample
+        self.batch_size = batch_size
+        self._detector = dlib.cnn_face_detection_model_v1(
+            face_recognition_models.cnn_face_detector_model_location()
+        )
+    
+    def _detect_batch(self, rgb_images):
+        images = list(rgb_images)
+        # dlib only batches images of identical size
+        if len({image.shape for image in images}) == 1:
+            batches = self._detector(images, self.upsample, batch_size=self.batch_size)
+        else:
+            batches = [self._detector(image, self.upsample) for image in images]
+        
+        results = []
+        for image, detections in zip(images, batches):
+            results.append([
+                _clip_box(d.rect.top(), d.rect.right(), d.rect.bottom(), d.rect.left(), image.shape)
+                for d in detections if d.confidence >= self.confidence
+            ])
+        return results
+
+
+class SSDDetector(FaceDetector):
+    """OpenCV res10 300x300 SSD (models/deploy.prototxt) through cv2.dnn."""
+    
+    name = "ssd"
+    
+    def __init__(self, confidence: float = 0.5, prototxt: Path = SSD_PROTOTXT,
+                 weights: Path = SSD_WEIGHTS, input_size: int = 300):
+        super().__init__(confidence)
+        import cv2
+        if not Path(weights).exists():
+            raise FileNotFoundError(
+                f"SSD weights not found: {weights}. Download "
+                "res10_300x300_ssd_iter_140000.caffemodel into models/."
+            )
+        self._cv2 = cv2
+        self.input_size = input_size
+        self._net = cv2.dnn.readNetFromCaffe(str(prototxt), str(weights))
+    
+    def _detect_batch(self, rgb_images):
+        cv2 = self._cv2
+        # The model was trained on BGR with these channel means
+        blob = cv2.dnn.blobFromImages(
+            list(rgb_images), 1.0, (self.input_size, self.input_size),
+            (104.0, 177.0, 123.0), swapRB=True, crop=False
+        )
+        self._net.setInput(blob)
+        detections = self._net.forward()[0, 0]
+        
+        results = [[] for _ in rgb_images]
+        for image_id, _, score, x1, y1, x2, y2 in detections:
+            if score < self.confidence:
+                continue
+            image = rgb_images[int(image_id)]
+            height, width = image.shape[:2]
+            box = _clip_box(int(y1 * height), int(x2 * width), int(y2 * height), int(x1 * width), image.shape)
+            if box[2] > box[0] and box[1] > box[3]:
+                results[int(image_id)].append(box)
+        return results
+
+
+DETECTORS = {
+    'hog': HOGDetector,
+    'cnn': CNNDetector,
+    'ssd': SSDDetector
+}
+
+
+def create_detector(name: str = "hog", **kwargs) -> FaceDetector:
+    """Build a detector backend by name ('hog', 'cnn' or 'ssd')."""
+    try:
+        detector_class = DETECTORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown detector: {name} (choose from {', '.join(DETECTORS)})")
+    return detector_class(**kwargs)
@@ -0,0 +1,201 @@
+"""
+Batched face encoding
+FaceEncoder turns face boxes into aligned 150x150 chips and runs dlib's
+ResNet on many chips per call. BatchEncoder gathers requests from several
+frames/streams within a short window so the network sees real batches
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+
+Location = Tuple[int, int, int, int]
+
+# Landmark model and jitters for every encoding, live probes and enrolled
+# photos alike; these are face_recognition.face_encodings' defaults
+LANDMARK_MODEL = "small"
+NUM_JITTERS = 1
+
+
+class FaceEncoder:
+    """dlib ResNet encoder with the same alignment face_recognition uses."""
+    
+    # face_recognition.face_encodings aligns to 150px chips with 25% padding
+    CHIP_SIZE = 150
+    CHIP_PADDING = 0.25
+    
+    def __init__(self, model: str = LANDMARK_MODEL, num_jitters: int = NUM_JITTERS):
+        import dlib
+        import face_recognition_models
+        if model == "small":
+            predictor = face_recognition_models.pose_predictor_five_point_model_location()
+        else:
+            predictor = face_recognition_models.pose_predictor_model_location()
+        self._dlib = dlib
+        self._predictor = dlib.shape_predictor(predictor)
+        self._encoder = dlib.face_recognition_model_v1(
+            face_recognition_models.face_recognition_model_location()
+        )
+        self.num_jitters = num_jitters
+    
+    def chips(self, rgb_image: np.ndarray, locations: Sequence[Location]) -> List[np.ndarray]:
+        """Aligned face chips for (top, right, bottom, left) boxes."""
+        if not len(locations):
+            return []
+        dlib = self._dlib
+        shapes = dlib.full_object_detections()
+        for top, right, bottom, left in locations:
+            shapes.append(self._predictor(rgb_image, dlib.rectangle(left, top, right, bottom)))
+        return list(dlib.get_face_chips(rgb_image, shapes, size=self.CHIP_SIZE, padding=self.CHIP_PADDING))
+    
+    def encode_chips(self, chips: Sequence[np.ndarray]) -> np.ndarray:
+        """(N, 128) encodings for aligned chips, one network call."""
+        if not len(chips):
+            return np.empty((0, 128), dtype=np.float64)
+        descriptors = self._encoder.compute_face_descriptor(list(chips), self.num_jitters)
+        return np.array(descriptors, dtype=np.float64)
+    
+    def encode(self, rgb_image: np.ndarray, locations: Sequence[Location]) -> np.ndarray:
+        """Drop-in for face_recognition.face_encodings(image, locations, num_jitters, model)."""
+        return self.encode_chips(self.chips(rgb_image, locations))
+
+
+class _Request:
+    __slots__ = ('image', 'locations', 'future', 'enqueued')
+    
+    def __init__(self, image, locations):
+        self.image = image
+        self.locations = list(locations)
+        self.future: Future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class BatchEncoder(threading.Thread):
+    """Encodes faces from many callers in shared batches.
+    
+    A batch is flushed once it holds max_batch faces or its oldest request
+    has waited max_wait_ms, whichever comes first; max_wait_ms=0 encodes
+    whatever is queued immediately. All dlib calls happen on this thread.
+    """
+    
+    def __init__(self, encoder: FaceEncoder, max_batch: int = 32, max_wait_ms: float = 5.0,
+                 name: str = "encoder"):
+        super().__init__(name=name, daemon=True)
+        self.encoder = encoder
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._pending: List[_Request] = []
+        self._pending_faces = 0
+        
+        # Counters
+        self.requests = 0
+        self.batches = 0
+        self.faces = 0
+        self.wait_time = 0.0
+        self.encode_time = 0.0
+    
+    def submit(self, rgb_image: np.ndarray, locations: Sequence[Location]) -> Future:
+        """Queue faces for encoding; the future resolves to an (N, 128) array."""
+        request = _Request(rgb_image, locations)
+        if not request.locations:
+            request.future.set_result(np.empty((0, 128), dtype=np.float64))
+            return request.future
+        with self._cond:
+            self._pending.append(request)
+            self._pending_faces += len(request.locations)
+            self._cond.notify()
+        return request.future
+    
+    def encode(self, rgb_image: np.ndarray, locations: Sequence[Location]) -> np.ndarray:
+        """Blocking submit(); same result as face_recognition.face_encodings."""
+        return self.submit(rgb_image, locations).result()
+    
+    def _take_batch(self) -> List[_Request]:
+        """Wait for a full batch or the oldest request's deadline."""
+        with self._cond:
+            while not self._pending and not self._stop_event.is_set():
+                self._cond.wait(0.1)
+            if not self._pending:
+                return []
+            
+            deadline = self._pending[0].enqueued + self.max_wait_ms / 1000
+            while self._pending_faces < self.max_batch and not self._stop_event.is_set():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            
+            # Whole requests only, so every caller is answered by one batch
+            batch = []
+            faces = 0
+            while self._pending and (not batch or faces + len(self._pending[0].locations) <= self.max_batch):
+                request = self._pending.pop(0)
+                batch.append(request)
+                faces += len(request.locations)
+            self._pending_faces -= faces
+            return batch
+    
+    def run(self):
+        while not self._stop_event.is_set():
+            batch = self._take_batch()
+            if not batch:
+                continue
+            
+            start = time.perf_counter()
+            try:
+                chips = []
+                for request in batch:
+                    chips.extend(self.encoder.chips(request.image, request.locations))
+                encodings = self.encoder.encode_chips(chips)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            done = time.perf_counter()
+            
+            # Scatter rows back to the frames they came from
+            offset = 0
+            for request in batch:
+                count = len(request.locations)
+                request.future.set_result(encodings[offset:offset + count])
+                offset += count
+                self.wait_time += start - request.enqueued
+            
+            self.requests += len(batch)
+            self.batches += 1
+            self.faces += len(chips)
+            self.encode_time += done - start
+    
+    def stop(self, timeout: float = 1.0):
+        """Finish the thread; requests still queued fail with RuntimeError."""
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self.is_alive():
+            self.join(timeout)
+        with self._cond:
+            pending, self._pending = self._pending, []
+            self._pending_faces = 0
+        for request in pending:
+            request.future.set_exception(RuntimeError("Encoder stopped"))
+    
+    def stats(self) -> dict:
+        """Batching counters: batch size, queueing delay and per-face cost."""
+        batches = max(self.batches, 1)
+        requests = max(self.requests, 1)
+        with self._cond:
+            queued = self._pending_faces
+        return {
+            'batches': self.batches,
+            'faces': self.faces,
+            'queue': queued,
+            'mean_batch': self.faces / batches,
+            'wait_ms': self.wait_time * 1000 / requests,
+            'encode_ms_per_face': self.encode_time * 1000 / max(self.faces, 1)
+        }
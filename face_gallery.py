@@ -0,0 +1,254 @@
+"""
+Known-face gallery for the attendance system
+Keeps every enrolled encoding in one contiguous float32 matrix so all faces
+in a frame are matched with a single batched matrix product, or through an
+approximate index from face_index for very large galleries
+"""
+
+import threading
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+ENCODING_DIM = 128
+
+
+class FaceGallery:
+    """Contiguous (N, 128) float32 gallery with precomputed squared norms."""
+    
+    def __init__(self, dim: int = ENCODING_DIM, capacity: int = 64):
+        self.dim = dim
+        self.names: List[str] = []
+        self.keys: List[Optional[str]] = []
+        self.index = None
+        self.rerank = 8
+        self.version = 0  # bumped on every change, so result caches know when to drop entries
+        self._lock = threading.RLock()
+        self._count = 0
+        self._encodings = np.empty((capacity, dim), dtype=np.float32)
+        self._sq_norms = np.empty(capacity, dtype=np.float32)
+        
+        # Scratch space for match(), grown on demand and reused between calls
+        self._scores = np.empty(0, dtype=np.float32)
+        self._probes = np.empty((0, dim), dtype=np.float32)
+        self._probe_sq = np.empty(0, dtype=np.float32)
+    
+    @classmethod
+    def from_encodings(cls, encodings: Iterable[np.ndarray], names: Iterable[str],
+                       keys: Optional[Iterable[str]] = None, index=None) -> "FaceGallery":
+        """Build a gallery from parallel encoding/name(/key) sequences.
+        
+        A C-contiguous float32 matrix (e.g. a memory-mapped store) is used
+        as the backing array directly instead of being copied.
+        """
+        names = list(names)
+        keys = [None] * len(names) if keys is None else list(keys)
+        if (isinstance(encodings, np.ndarray) and encodings.ndim == 2
+                and encodings.dtype == np.float32 and encodings.flags.c_contiguous):
+            gallery = cls(dim=encodings.shape[1], capacity=0)
+            gallery._adopt(encodings, names, keys)
+        else:
+            encodings = list(encodings)
+            gallery = cls(capacity=max(len(encodings), 64))
+            gallery.add_many(encodings, names, keys)
+        gallery.set_index(index)
+        return gallery
+    
+    def __len__(self) -> int:
+        return self._count
+    
+    @property
+    def encodings(self) -> np.ndarray:
+        """Read-only view of the active rows."""
+        view = self._encodings[:self._count]
+        view.flags.writeable = False
+        return view
+    
+    def _adopt(self, matrix: np.ndarray, names: List[str], keys: List[Optional[str]]):
+        """Use matrix as the backing array; it is only copied once it must grow."""
+        if not (len(matrix) == len(names) == len(keys)):
+            raise ValueError("encodings, names and keys must have the same length")
+        self._encodings = matrix
+        self._sq_norms = np.einsum('ij,ij->i', matrix, matrix).astype(np.float32)
+        self.names = names
+        self.keys = keys
+        self._count = len(matrix)
+        self.version += 1
+    
+    def _reserve(self, needed: int):
+        """Grow the backing arrays (doubling) to hold needed rows."""
+        capacity = self._encodings.shape[0]
+        if needed <= capacity:
+            return
+        
+        capacity = max(capacity, 64)
+        while capacity < needed:
+            capacity *= 2
+        
+        encodings = np.empty((capacity, self.dim), dtype=np.float32)
+        encodings[:self._count] = self._encodings[:self._count]
+        sq_norms = np.empty(capacity, dtype=np.float32)
+        sq_norms[:self._count] = self._sq_norms[:self._count]
+        self._encodings = encodings
+        self._sq_norms = sq_norms
+    
+    def set_index(self, index):
+        """Search through an approximate index instead of scanning every row.
+        
+        Exact indexes are ignored since the gallery matrix already is one.
+        """
+        if index is not None and index.exact:
+            index = None
+        
+        with self._lock:
+            if index is not None and self._count:
+                rows = self._encodings[:self._count]
+                if not index.is_trained:
+                    index.train(rows)
+                index.add(np.arange(self._count), rows)
+            self.index = index
+    
+    def add(self, encoding: np.ndarray, name: str, key: Optional[str] = None) -> int:
+        """Append one encoding and return its row index."""
+        return self.add_many([encoding], [name], [key])[0]
+    
+    def add_many(self, encodings: List[np.ndarray], names: List[str],
+                 keys: Optional[List[Optional[str]]] = None) -> List[int]:
+        """Append several encodings and return their row indices.
+        
+        keys optionally tags each row with its source (e.g. image file name)
+        so it can later be removed with remove_key().
+        """
+        if keys is None:
+            keys = [None] * len(names)
+        if not (len(encodings) == len(names) == len(keys)):
+            raise ValueError("encodings, names and keys must have the same length")
+        if not encodings:
+            return []
+        
+        block = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            start = self._count
+            end = start + block.shape[0]
+            self._reserve(end)
+            self._encodings[start:end] = block
+            np.einsum('ij,ij->i', block, block, out=self._sq_norms[start:end])
+            self.names.extend(names)
+            self.keys.extend(keys)
+            self._count = end
+            self.version += 1
+            
+            if self.index is not None:
+                if not self.index.is_trained:
+                    self.index.train(self._encodings[:end])
+                    self.index.add(np.arange(end), self._encodings[:end])
+                else:
+                    self.index.add(np.arange(start, end), block)
+        return list(range(start, end))
+    
+    def remove(self, rows: Iterable[int]):
+        """Delete rows; the last row moves into each freed slot."""
+        with self._lock:
+            for row in sorted(set(rows), reverse=True):
+                if row < 0 or row >= self._count:
+                    continue
+                last = self._count - 1
+                if self.index is not None:
+                    self.index.remove([row, last])
+                if row != last:
+                    self._encodings[row] = self._encodings[last]
+                    self._sq_norms[row] = self._sq_norms[last]
+                    self.names[row] = self.names[last]
+                    self.keys[row] = self.keys[last]
+                    if self.index is not None:
+                        self.index.add([row], self._encodings[row:row + 1])
+                self.names.pop()
+                self.keys.pop()
+                self._count = last
+                self.version += 1
+    
+    def remove_name(self, name: str):
+        """Delete every encoding enrolled under name."""
+        self.remove([i for i, n in enumerate(self.names) if n == name])
+    
+    def remove_key(self, key: str):
+        """Delete every encoding tagged with key."""
+        self.remove([i for i, k in enumerate(self.keys) if k == key])
+    
+    def _scratch(self, faces: int, rows: int):
+        """Return reusable (faces, rows) score and probe buffers."""
+        if self._scores.size < faces * rows:
+            self._scores = np.empty(max(faces * rows, 2 * self._scores.size), dtype=np.float32)
+        if self._probes.shape[0] < faces:
+            self._probes = np.empty((max(faces, 8), self.dim), dtype=np.float32)
+            self._probe_sq = np.empty(max(faces, 8), dtype=np.float32)
+        scores = self._scores[:faces * rows].reshape(faces, rows)
+        return scores, self._probes[:faces], self._probe_sq[:faces]
+    
+    def match(self, probes, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (indices, distances) of the k nearest rows for each probe.
+        
+        Both arrays have shape (faces, k) and are sorted by ascending
+        euclidean distance, the same metric face_recognition.face_distance uses.
+        """
+        faces = len(probes)
+        with self._lock:
+            rows = self._count
+            k = min(k, rows)
+            if faces == 0 or k == 0:
+                return np.empty((faces, 0), dtype=np.intp), np.empty((faces, 0), dtype=np.float32)
+            
+            scores, probe_block, probe_sq = self._scratch(faces, rows)
+            for i, probe in enumerate(probes):
+                probe_block[i] = probe
+            np.einsum('ij,ij->i', probe_block, probe_block, out=probe_sq)
+            
+            if self.index is not None:
+                return self._match_indexed(probe_block, k)
+            
+            # ||p - g||^2 = ||p||^2 + ||g||^2 - 2 p.g, one GEMM for the whole frame
+            np.dot(probe_block, self._encodings[:rows].T, out=scores)
+            scores *= -2.0
+            scores += self._sq_norms[:rows]
+            scores += probe_sq[:, None]
+            np.maximum(scores, 0.0, out=scores)
+            
+            if k == 1:
+                indices = scores.argmin(axis=1)[:, None]
+            else:
+                indices = np.argpartition(scores, k - 1, axis=1)[:, :k]
+                order = np.take_along_axis(scores, indices, axis=1).argsort(axis=1)
+                indices = np.take_along_axis(indices, order, axis=1)
+            distances = np.sqrt(np.take_along_axis(scores, indices, axis=1))
+        return indices, distances
+    
+    def _match_indexed(self, probe_block: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Fetch candidates from the index and re-rank them exactly."""
+        candidates, _ = self.index.search(probe_block, max(k, self.rerank))
+        valid = candidates >= 0
+        rows = np.where(valid, candidates, 0)
+        
+        diff = self._encodings[rows] - probe_block[:, None, :]
+        scores = np.einsum('fcd,fcd->fc', diff, diff)
+        scores[~valid] = np.inf
+        
+        order = scores.argsort(axis=1)[:, :k]
+        indices = np.take_along_axis(rows, order, axis=1)
+        distances = np.sqrt(np.take_along_axis(scores, order, axis=1))
+        return indices, distances
+    
+    def best_matches(self, probes, tolerance: float) -> List[Tuple[Optional[str], float]]:
+        """Return (name, distance) per probe; name is None above tolerance."""
+        results = []
+        with self._lock:
+            indices, distances = self.match(probes, k=1)
+            for row in range(len(probes)):
+                if indices.shape[1] == 0:
+                    results.append((None, 1.0))
+                    continue
+                idx = int(indices[row, 0])
+                distance = float(distances[row, 0])
+                name = self.names[idx] if distance <= tolerance else None
+                results.append((name, distance))
+        return results
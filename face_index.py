@@ -0,0 +1,315 @@
+"""
+Nearest-neighbour indexes behind the face gallery
+Exact brute force for normal classes, and a pure-NumPy IVF index (k-means
+coarse quantizer with inverted lists, optionally product-quantized) for
+campus-wide galleries
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+def _sq_distances(probes: np.ndarray, vectors: np.ndarray, vector_sq: Optional[np.ndarray] = None) -> np.ndarray:
+    """Squared euclidean distances (probes x vectors) via one GEMM."""
+    if vector_sq is None:
+        vector_sq = np.einsum('ij,ij->i', vectors, vectors)
+    probe_sq = np.einsum('ij,ij->i', probes, probes)
+    dist = probes @ vectors.T
+    dist *= -2.0
+    dist += vector_sq
+    dist += probe_sq[:, None]
+    np.maximum(dist, 0.0, out=dist)
+    return dist
+
+
+def _top_k(dist: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Pick the k smallest distances per row, padding with id -1 / inf."""
+    faces, count = dist.shape
+    out_ids = np.full((faces, k), -1, dtype=np.int64)
+    out_dist = np.full((faces, k), np.inf, dtype=np.float32)
+    take = min(k, count)
+    if take == 0:
+        return out_ids, out_dist
+    
+    if take < count:
+        part = np.argpartition(dist, take - 1, axis=1)[:, :take]
+    else:
+        part = np.broadcast_to(np.arange(count), (faces, count))
+    part_dist = np.take_along_axis(dist, part, axis=1)
+    order = part_dist.argsort(axis=1)
+    part = np.take_along_axis(part, order, axis=1)
+    out_ids[:, :take] = ids[part]
+    out_dist[:, :take] = np.take_along_axis(part_dist, order, axis=1)
+    return out_ids, out_dist
+
+
+def kmeans(vectors: np.ndarray, clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Plain Lloyd's k-means with k-means++ seeding; returns the centroids."""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    count = vectors.shape[0]
+    clusters = min(clusters, count)
+    
+    # k-means++ seeding
+    centroids = np.empty((clusters, vectors.shape[1]), dtype=np.float32)
+    centroids[0] = vectors[rng.integers(count)]
+    closest = _sq_distances(vectors, centroids[:1])[:, 0]
+    for c in range(1, clusters):
+        total = closest.sum()
+        if total <= 0:
+            centroids[c:] = vectors[rng.integers(count, size=clusters - c)]
+            break
+        centroids[c] = vectors[rng.choice(count, p=closest / total)]
+        np.minimum(closest, _sq_distances(vectors, centroids[c:c + 1])[:, 0], out=closest)
+    
+    for _ in range(iterations):
+        assign = _sq_distances(vectors, centroids).argmin(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=clusters)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        
+        # Re-seed empty clusters from random points
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = vectors[rng.integers(count, size=len(empty))]
+    
+    return centroids
+
+
+class BruteForceIndex:
+    """Exact index: scans every vector for every probe."""
+    
+    exact = True
+    
+    def __init__(self, dim: int = 128):
+        self.dim = dim
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._sq_norms = np.empty(0, dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._rows: Dict[int, int] = {}
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+    
+    @property
+    def is_trained(self) -> bool:
+        return True
+    
+    def train(self, vectors: np.ndarray):
+        """Nothing to learn for brute force."""
+    
+    def add(self, ids, vectors: np.ndarray):
+        """Add vectors under the given integer ids."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        ids = np.asarray(ids, dtype=np.int64)
+        start = len(self._ids)
+        self._vectors = np.concatenate([self._vectors, vectors])
+        self._sq_norms = np.concatenate([self._sq_norms, np.einsum('ij,ij->i', vectors, vectors)])
+        self._ids = np.concatenate([self._ids, ids])
+        for offset, vector_id in enumerate(ids):
+            self._rows[int(vector_id)] = start + offset
+    
+    def remove(self, ids):
+        """Remove vectors by id (unknown ids are ignored)."""
+        for vector_id in ids:
+            row = self._rows.pop(int(vector_id), None)
+            if row is None:
+                continue
+            last = len(self._ids) - 1
+            if row != last:
+                self._vectors[row] = self._vectors[last]
+                self._sq_norms[row] = self._sq_norms[last]
+                self._ids[row] = self._ids[last]
+                self._rows[int(self._ids[row])] = row
+            self._vectors = self._vectors[:last]
+            self._sq_norms = self._sq_norms[:last]
+            self._ids = self._ids[:last]
+    
+    def search(self, probes: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (ids, squared distances), each (faces, k), nearest first."""
+        probes = np.asarray(probes, dtype=np.float32).reshape(-1, self.dim)
+        dist = _sq_distances(probes, self._vectors, self._sq_norms)
+        return _top_k(dist, self._ids, k)
+
+
+class ProductQuantizer:
+    """Splits vectors into m sub-vectors, each coded with a 256-entry codebook."""
+    
+    def __init__(self, dim: int = 128, subvectors: int = 16, bits: int = 8):
+        if dim % subvectors:
+            raise ValueError("dim must be divisible by subvectors")
+        self.dim = dim
+        self.subvectors = subvectors
+        self.sub_dim = dim // subvectors
+        self.centroids_per_sub = 2 ** bits
+        self.codebooks: Optional[np.ndarray] = None
+    
+    def train(self, vectors: np.ndarray, iterations: int = 10):
+        """Learn one codebook per sub-space."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        books = []
+        for m in range(self.subvectors):
+            part = vectors[:, m * self.sub_dim:(m + 1) * self.sub_dim]
+            book = kmeans(part, self.centroids_per_sub, iterations=iterations, seed=m)
+            if book.shape[0] < self.centroids_per_sub:
+                pad = np.repeat(book[-1:], self.centroids_per_sub - book.shape[0], axis=0)
+                book = np.concatenate([book, pad])
+            books.append(book)
+        self.codebooks = np.stack(books)
+    
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Return uint8 codes of shape (count, subvectors)."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        codes = np.empty((vectors.shape[0], self.subvectors), dtype=np.uint8)
+        for m in range(self.subvectors):
+            part = vectors[:, m * self.sub_dim:(m + 1) * self.sub_dim]
+            codes[:, m] = _sq_distances(part, self.codebooks[m]).argmin(axis=1)
+        return codes
+    
+    def distance_table(self, query: np.ndarray) -> np.ndarray:
+        """(subvectors, 256) table of squared distances for one query."""
+        parts = query.reshape(self.subvectors, 1, self.sub_dim)
+        diff = self.codebooks - parts
+        return np.einsum('mkd,mkd->mk', diff, diff)
+    
+    def asymmetric_distances(self, table: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Approximate squared distances from a lookup table to coded vectors."""
+        return table[np.arange(self.subvectors), codes].sum(axis=1)
+
+
+class IVFIndex:
+    """Inverted-file index: probe only the nprobe closest k-means cells.
+    
+    With a ProductQuantizer the lists store compact codes and distances are
+    approximate (one lookup table per probe); the gallery re-ranks the
+    candidates exactly.
+    """
+    
+    exact = False
+    
+    def __init__(self, dim: int = 128, nlist: int = 256, nprobe: int = 8,
+                 pq: Optional[ProductQuantizer] = None):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq = pq
+        self.centroids: Optional[np.ndarray] = None
+        self._list_ids = []
+        self._list_data = []
+        self._where: Dict[int, Tuple[int, int]] = {}
+    
+    def __len__(self) -> int:
+        return len(self._where)
+    
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+    
+    def train(self, vectors: np.ndarray, max_train: int = 64 * 256, seed: int = 0):
+        """Fit the coarse quantizer (and PQ codebooks) on a sample."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(vectors) > max_train:
+            rng = np.random.default_rng(seed)
+            vectors = vectors[rng.choice(len(vectors), max_train, replace=False)]
+        
+        self.centroids = kmeans(vectors, self.nlist, seed=seed)
+        self.nlist = self.centroids.shape[0]
+        if self.pq is not None:
+            self.pq.train(vectors)
+        
+        width = self.pq.subvectors if self.pq is not None else self.dim
+        dtype = np.uint8 if self.pq is not None else np.float32
+        self._list_ids = [np.empty(0, dtype=np.int64) for _ in range(self.nlist)]
+        self._list_data = [np.empty((0, width), dtype=dtype) for _ in range(self.nlist)]
+        self._where = {}
+    
+    def add(self, ids, vectors: np.ndarray):
+        """Assign vectors to their nearest cell and append them."""
+        if not self.is_trained:
+            raise RuntimeError("IVFIndex must be trained before adding vectors")
+        
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return
+        assign = _sq_distances(vectors, self.centroids).argmin(axis=1)
+        if self.pq is not None:
+            data = self.pq.encode(vectors)
+        else:
+            data = vectors
+        
+        for cell in np.unique(assign):
+            members = np.flatnonzero(assign == cell)
+            start = len(self._list_ids[cell])
+            self._list_ids[cell] = np.concatenate([self._list_ids[cell], ids[members]])
+            self._list_data[cell] = np.concatenate([self._list_data[cell], data[members]])
+            for offset, vector_id in enumerate(ids[members]):
+                self._where[int(vector_id)] = (int(cell), start + offset)
+    
+    def remove(self, ids):
+        """Remove vectors by id (unknown ids are ignored)."""
+        for vector_id in ids:
+            where = self._where.pop(int(vector_id), None)
+            if where is None:
+                continue
+            cell, row = where
+            list_ids = self._list_ids[cell]
+            list_data = self._list_data[cell]
+            last = len(list_ids) - 1
+            if row != last:
+                list_ids[row] = list_ids[last]
+                list_data[row] = list_data[last]
+                self._where[int(list_ids[row])] = (cell, row)
+            self._list_ids[cell] = list_ids[:last]
+            self._list_data[cell] = list_data[:last]
+    
+    def search(self, probes: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (ids, squared distances), each (faces, k), nearest first."""
+        probes = np.asarray(probes, dtype=np.float32).reshape(-1, self.dim)
+        out_ids = np.full((len(probes), k), -1, dtype=np.int64)
+        out_dist = np.full((len(probes), k), np.inf, dtype=np.float32)
+        if not self.is_trained or len(probes) == 0:
+            return out_ids, out_dist
+        
+        nprobe = min(self.nprobe, self.nlist)
+        coarse = _sq_distances(probes, self.centroids)
+        cells = np.argpartition(coarse, nprobe - 1, axis=1)[:, :nprobe]
+        
+        for i, probe in enumerate(probes):
+            probed = [cell for cell in cells[i] if len(self._list_ids[cell])]
+            if not probed:
+                continue
+            
+            ids = np.concatenate([self._list_ids[cell] for cell in probed])
+            data = np.concatenate([self._list_data[cell] for cell in probed])
+            if self.pq is not None:
+                dist = self.pq.asymmetric_distances(self.pq.distance_table(probe), data)
+            else:
+                dist = _sq_distances(probe[None], data)[0]
+            
+            top_ids, top_dist = _top_k(dist[None], ids, k)
+            out_ids[i] = top_ids[0]
+            out_dist[i] = top_dist[0]
+        
+        return out_ids, out_dist
+
+
+def create_index(kind: str = "auto", count: int = 0, dim: int = 128):
+    """Build an index by name: 'brute', 'ivf', 'ivfpq' or 'auto' (by gallery size)."""
+    if kind == "auto":
+        kind = "ivf" if count >= 20000 else "brute"
+    
+    if kind == "brute":
+        return BruteForceIndex(dim)
+    
+    # ~4*sqrt(N) cells is the usual IVF rule of thumb
+    nlist = int(min(max(4 * np.sqrt(max(count, 1)), 16), 4096))
+    if kind == "ivf":
+        return IVFIndex(dim, nlist=nlist, nprobe=max(8, nlist // 32))
+    if kind == "ivfpq":
+        return IVFIndex(dim, nlist=nlist, nprobe=max(8, nlist // 32), pq=ProductQuantizer(dim))
+    
+    raise ValueError(f"Unknown index type: {kind}")
@@ -0,0 +1,147 @@
+"""
+Per-identity prototypes for matching
+Collapses each person's enrolled photos into a few representative vectors
+(a centroid, k medoids, or a capped set of samples) so matching cost grows
+with the number of people rather than the number of photos
+"""
+
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from face_gallery import FaceGallery
+
+
+STRATEGIES = ['all', 'centroid', 'medoids']
+
+
+def _pairwise(samples: np.ndarray) -> np.ndarray:
+    """Euclidean distance matrix between samples."""
+    sq = np.einsum('ij,ij->i', samples, samples)
+    dist = sq[:, None] + sq[None, :] - 2.0 * (samples @ samples.T)
+    np.maximum(dist, 0.0, out=dist)
+    return np.sqrt(dist)
+
+
+def spread_subset(samples: np.ndarray, count: int) -> np.ndarray:
+    """Row indices of count samples that cover the set (farthest-point order).
+    
+    Starts from the medoid, then keeps adding the sample farthest from
+    those already chosen.
+    """
+    dist = _pairwise(samples)
+    chosen = [int(dist.sum(axis=1).argmin())]
+    closest = dist[chosen[0]].copy()
+    while len(chosen) < min(count, len(samples)):
+        pick = int(closest.argmax())
+        chosen.append(pick)
+        np.minimum(closest, dist[pick], out=closest)
+    return np.array(chosen)
+
+
+def medoids(samples: np.ndarray, k: int, iterations: int = 10) -> np.ndarray:
+    """Row indices of k medoids (alternating k-medoids, spread-out start)."""
+    if len(samples) <= k:
+        return np.arange(len(samples))
+    
+    dist = _pairwise(samples)
+    chosen = spread_subset(samples, k)
+    for _ in range(iterations):
+        assign = dist[:, chosen].argmin(axis=1)
+        updated = chosen.copy()
+        for cluster in range(k):
+            members = np.flatnonzero(assign == cluster)
+            if len(members):
+                # Member with the smallest total distance to its cluster
+                updated[cluster] = members[dist[np.ix_(members, members)].sum(axis=1).argmin()]
+        if np.array_equal(updated, chosen):
+            break
+        chosen = updated
+    return chosen
+
+
+class IdentityPrototypes:
+    """Identity-level matcher built from a sample gallery.
+    
+    strategy is 'all' (every sample, capped at max_samples per person),
+    'centroid' (one mean vector per person) or 'medoids' (up to k real
+    samples per person). Rows of the inner gallery are keyed by name, so
+    one person's prototypes can be rebuilt without touching the rest.
+    """
+    
+    def __init__(self, strategy: str = "medoids", k: int = 3,
+                 max_samples: Optional[int] = 10, index=None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown prototype strategy: {strategy} (choose from {', '.join(STRATEGIES)})")
+        self.strategy = strategy
+        self.k = k
+        self.max_samples = max_samples
+        self.gallery = FaceGallery()
+        self.gallery.set_index(index)
+        self.samples: Counter = Counter()
+    
+    def prototypes(self, samples: np.ndarray) -> np.ndarray:
+        """Representative vectors for one person's samples."""
+        if self.strategy == "centroid":
+            return samples.mean(axis=0, keepdims=True)
+        if self.strategy == "medoids":
+            return samples[medoids(samples, self.k)]
+        if self.max_samples and len(samples) > self.max_samples:
+            return samples[spread_subset(samples, self.max_samples)]
+        return samples
+    
+    def _rows_by_name(self, source: FaceGallery, names: Optional[set] = None) -> Dict[str, List[int]]:
+        rows: Dict[str, List[int]] = {}
+        for row, name in enumerate(source.names):
+            if names is None or name in names:
+                rows.setdefault(name, []).append(row)
+        return rows
+    
+    def build(self, source: FaceGallery):
+        """Rebuild every identity from the sample gallery."""
+        self.samples.clear()
+        self.gallery.remove(range(len(self.gallery)))
+        self._add(source, self._rows_by_name(source))
+    
+    def update(self, source: FaceGallery, names: Iterable[str]):
+        """Rebuild only the given identities (e.g. after a registration)."""
+        names = set(names)
+        for name in names:
+            self.gallery.remove_key(name)
+            self.samples.pop(name, None)
+        self._add(source, self._rows_by_name(source, names))
+    
+    def _add(self, source: FaceGallery, rows_by_name: Dict[str, List[int]]):
+        encodings = source.encodings
+        vectors = []
+        names = []
+        for name, rows in rows_by_name.items():
+            block = self.prototypes(np.asarray(encodings[rows], dtype=np.float32))
+            vectors.extend(block)
+            names.extend([name] * len(block))
+            self.samples[name] = len(rows)
+        self.gallery.add_many(vectors, names, names)
+    
+    def __len__(self) -> int:
+        return len(self.gallery)
+    
+    @property
+    def version(self) -> int:
+        """Changes whenever any prototype is added or removed."""
+        return self.gallery.version
+    
+    def best_matches(self, probes, tolerance: float) -> List[Tuple[Optional[str], float]]:
+        """Return (name, distance) per probe; name is None above tolerance."""
+        return self.gallery.best_matches(probes, tolerance)
+    
+    def stats(self) -> Dict:
+        """Identity and prototype counts."""
+        people = len(self.samples)
+        return {
+            'strategy': self.strategy,
+            'identities': people,
+            'samples': sum(self.samples.values()),
+            'prototypes': len(self.gallery),
+            'per_identity': len(self.gallery) / max(people, 1)
+        }
@@ -0,0 +1,184 @@
+"""
+Face quality gate
+Cheap checks on a detected box (size, Laplacian-variance sharpness,
+brightness and contrast, yaw/roll from five landmarks) that run before the
+ResNet encoder, so crops that could never match are not encoded and
+registration keeps the best face it has seen
+"""
+
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+Location = Tuple[int, int, int, int]
+
+# Reasons a face is rejected, in the order they are checked
+REASONS = ['small', 'dark', 'bright', 'flat', 'blurry', 'pose']
+
+# Side of the grayscale patch sharpness is measured on, so the score does not depend on face size
+PATCH_SIZE = 64
+
+
+class PoseEstimator:
+    """Yaw and roll from dlib's 5-point landmarks (eye corners and nose)."""
+    
+    def __init__(self):
+        import dlib
+        import face_recognition_models
+        self._dlib = dlib
+        self._predictor = dlib.shape_predictor(face_recognition_models.pose_predictor_five_point_model_location())
+    
+    def estimate(self, rgb_image: np.ndarray, box: Location) -> Tuple[float, float]:
+        """(yaw, roll) of the face in box.
+        
+        yaw is the nose's offset from the eye midpoint in eye distances
+        (0 = frontal, ~0.5 = half profile); roll is the eye line's angle in degrees.
+        """
+        top, right, bottom, left = box
+        shape = self._predictor(rgb_image, self._dlib.rectangle(left, top, right, bottom))
+        points = np.array([(p.x, p.y) for p in shape.parts()], dtype=np.float64)
+        right_eye = points[0:2].mean(axis=0)
+        left_eye = points[2:4].mean(axis=0)
+        nose = points[4]
+        
+        eye_line = left_eye - right_eye
+        eye_distance = max(np.hypot(*eye_line), 1.0)
+        # Project the nose on the eye line: frontal faces have it halfway between the eyes
+        along = np.dot(nose - right_eye, eye_line) / eye_distance
+        yaw = along / eye_distance - 0.5
+        roll = np.degrees(np.arctan2(eye_line[1], eye_line[0]))
+        return float(yaw), float(roll)
+
+
+class FaceQuality:
+    """Measurements for one box; reason is None when the face passed."""
+    
+    __slots__ = ('size', 'sharpness', 'brightness', 'contrast', 'yaw', 'roll', 'reason', 'score')
+    
+    def __init__(self, size, sharpness, brightness, contrast, yaw=None, roll=None):
+        self.size = size
+        self.sharpness = sharpness
+        self.brightness = brightness
+        self.contrast = contrast
+        self.yaw = yaw
+        self.roll = roll
+        self.reason: Optional[str] = None
+        self.score = 0.0
+    
+    @property
+    def ok(self) -> bool:
+        return self.reason is None
+
+
+class QualityGate:
+    """Rejects faces too small, dark, bright, flat, blurry or turned to encode.
+    
+    Sizes are in full-resolution pixels, so callers that detect on a
+    downscaled frame pass the original frame and boxes (bgr=True for a
+    camera frame). Pose needs dlib and is skipped without it (or with
+    pose=False). score ranks faces that passed, for picking the best one
+    during registration.
+    """
+    
+    def __init__(self, min_size: int = 40, min_sharpness: float = 20.0,
+                 min_brightness: float = 35.0, max_brightness: float = 220.0,
+                 min_contrast: float = 15.0, max_yaw: float = 0.3, max_roll: float = 30.0,
+                 pose: bool = True):
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_contrast = min_contrast
+        self.max_yaw = max_yaw
+        self.max_roll = max_roll
+        self.pose: Optional[PoseEstimator] = None
+        if pose:
+            try:
+                self.pose = PoseEstimator()
+            except ImportError:
+                pass
+        
+        # Counters
+        self._lock = threading.Lock()
+        self.assessed = 0
+        self.rejected: Counter = Counter()
+    
+    def measure(self, rgb_image: np.ndarray, box: Location, bgr: bool = False) -> FaceQuality:
+        """Size, sharpness, brightness and contrast of the box (no pose, no verdict)."""
+        height, width = rgb_image.shape[:2]
+        top, right, bottom, left = box
+        top, left = max(top, 0), max(left, 0)
+        bottom, right = min(bottom, height), min(right, width)
+        size = min(right - left, bottom - top)
+        if size <= 0:
+            return FaceQuality(0, 0.0, 0.0, 0.0)
+        
+        gray = cv2.cvtColor(rgb_image[top:bottom, left:right], cv2.COLOR_BGR2GRAY if bgr else cv2.COLOR_RGB2GRAY)
+        patch = cv2.resize(gray, (PATCH_SIZE, PATCH_SIZE), interpolation=cv2.INTER_AREA)
+        mean, std = cv2.meanStdDev(patch)
+        sharpness = cv2.Laplacian(patch, cv2.CV_64F).var()
+        return FaceQuality(size, float(sharpness), float(mean[0, 0]), float(std[0, 0]))
+    
+    def assess(self, rgb_image: np.ndarray, box: Location, bgr: bool = False) -> FaceQuality:
+        """Measure a box and decide; the landmark pose check only runs on faces that passed the rest."""
+        quality = self.measure(rgb_image, box, bgr)
+        if quality.size < self.min_size:
+            quality.reason = 'small'
+        elif quality.brightness < self.min_brightness:
+            quality.reason = 'dark'
+        elif quality.brightness > self.max_brightness:
+            quality.reason = 'bright'
+        elif quality.contrast < self.min_contrast:
+            quality.reason = 'flat'
+        elif quality.sharpness < self.min_sharpness:
+            quality.reason = 'blurry'
+        elif self.pose is not None:
+            # dlib's landmarks work on intensity, so channel order does not matter
+            quality.yaw, quality.roll = self.pose.estimate(rgb_image, box)
+            if abs(quality.yaw) > self.max_yaw or abs(quality.roll) > self.max_roll:
+                quality.reason = 'pose'
+        
+        if quality.ok:
+            # Bigger, sharper and more frontal is better; each factor saturates at 1
+            quality.score = (min(quality.size / (2.0 * self.min_size), 1.0)
+                             * min(quality.sharpness / (5.0 * self.min_sharpness), 1.0))
+            if quality.yaw is not None:
+                quality.score *= 1.0 - abs(quality.yaw) / (2.0 * self.max_yaw)
+        
+        with self._lock:
+            self.assessed += 1
+            if quality.reason:
+                self.rejected[quality.reason] += 1
+        return quality
+    
+    def filter(self, rgb_image: np.ndarray, boxes: Sequence[Location], bgr: bool = False) -> List[int]:
+        """Indices of the boxes worth encoding."""
+        return [i for i, box in enumerate(boxes) if self.assess(rgb_image, box, bgr).ok]
+    
+    def best(self, rgb_image: np.ndarray, boxes: Sequence[Location]) -> Tuple[Optional[int], List[FaceQuality]]:
+        """Index of the best passing box (None if none passed) and every box's quality."""
+        qualities = [self.assess(rgb_image, box) for box in boxes]
+        passed = [i for i, quality in enumerate(qualities) if quality.ok]
+        best = max(passed, key=lambda i: qualities[i].score) if passed else None
+        return best, qualities
+    
+    def stats(self) -> Dict:
+        """How many faces were checked and the share that skipped encoding.
+        
+        Callers assess a face only where they would otherwise encode it,
+        so encodings_saved is relative to the encodes that would have run.
+        """
+        with self._lock:
+            rejected = dict(self.rejected)
+            assessed = self.assessed
+        skipped = sum(rejected.values())
+        return {
+            'assessed': assessed,
+            'skipped': skipped,
+            'encodings_saved': skipped / assessed if assessed else 0.0,
+            'reasons': {reason: rejected.get(reason, 0) for reason in REASONS}
+        }
@@ -4,24 +4,47 @@ Modern Face Recognition Attendance System
 A redesigned, clean UI for face registration and attendance tracking
 """
 
-import csv
+import time
+
+# Startup times (window, first frame, models) are measured from here
+STARTED = time.perf_counter()
+
+import queue
+import threading
 import cv2
-import face_recognition
 import numpy as np
 import tkinter as tk
 from tkinter import ttk, messagebox
 from pathlib import Path
-import pickle
 from PIL import Image, ImageTk
 from typing import Optional, List, Dict
 from datetime import datetime
 
+from pipeline_metrics import METRICS, Profiling
+from face_registration import BurstRegistration
+from video_pipeline import CaptureThread, FramePool, RecognitionWorker
+
 try:
     import winsound
 except ImportError:
     winsound = None
 
 
+# SPACE records this many frames and keeps the best, most varied encodings
+BURST_FRAMES = 15
+BURST_KEEP = 5
+
+# What to tell the person when the registration gate rejects their face
+QUALITY_HINTS = {
+    'small': "Move closer to the camera",
+    'dark': "Too dark - add some light",
+    'bright': "Too bright - avoid direct light",
+    'flat': "Low contrast - face the light",
+    'blurry': "Blurry - hold still",
+    'pose': "Look straight at the camera"
+}
+
+
 class ModernFaceRecognitionUI:
     """Modern GUI for face recognition and attendance tracking."""
     
@@ -37,48 +60,137 @@ class ModernFaceRecognitionUI:
         except:
             pass
         
-        # Paths
-        self.known_faces_dir = Path("known_faces")
-        self.known_faces_dir.mkdir(exist_ok=True)
-        self.attendance_dir = Path("attendance_records")
-        self.attendance_dir.mkdir(exist_ok=True)
-        self.student_info_file = Path("students.csv")
-        
-        # Data
-        self.known_face_encodings: List[np.ndarray] = []
-        self.known_face_names: List[str] = []
-        self.student_info: Dict[str, Dict[str, str]] = {}
-        self.present_students: Dict[str, Dict] = {}
+        # Gallery, recognition and attendance; this class only displays them.
+        # Loaded in the background (see load_engine), None until then
+        self.engine = None
+        self.startup_events: queue.Queue = queue.Queue()  # (kind, value) from the startup threads
+        self.startup_pending = {'camera', 'engine'}
+        self.startup: Dict[str, float] = {}  # seconds from STARTED to window, first_frame, engine
         self.recognition_history: List[dict] = []
         
         # State
         self.video_capture: Optional[cv2.VideoCapture] = None
+        self.capture_thread: Optional[CaptureThread] = None
+        self.recognition_worker: Optional[RecognitionWorker] = None
         self.current_frame = None
+        self.frame_pool = FramePool()  # camera frames and drawing copies
+        self.display_size = (800, 600)
+        self.display_bgr = None
+        self.display_rgb = None
+        self.display_photo = None
+        self.last_frame_id = 0
+        self.last_result_id = 0
+        self.last_pipeline_stats = None
         self.is_running = False
         self.mode = "idle"  # idle, register, recognize
         self.captured_face = None
         self.captured_location = None
+        self.captured_shots: List[Dict] = []  # encodings kept from the burst, best first
+        self.burst: Optional[BurstRegistration] = None
         
-        # Session
-        self.session_active = False
-        self.session_name = ""
-        self.session_file: Optional[Path] = None
-        self.session_start: Optional[datetime] = None
+        # F8 writes the stage histograms to JSON, F9 starts/stops the profiler
+        self.profiling = Profiling()
         
-        # Settings
-        self.tolerance = 0.6
+        # Throttles
+        self.shown_present = 0
         self.last_recognition = {}
         self.last_welcome = {}
         
-        # Load data
-        self.load_known_faces()
-        self.load_student_info()
-        
         # Setup UI
         self.setup_modern_ui()
+        for button in (self.btn_register, self.btn_recognize, self.btn_start_session):
+            button.config(state=tk.DISABLED)
+        
+        self.root.bind('<F8>', lambda e: self.dump_metrics())
+        self.root.bind('<F9>', lambda e: self.toggle_profiler())
         
-        # Start camera
-        self.start_camera()
+        # The window appears now; camera and models come up in the background
+        self.root.after_idle(self.window_shown)
+        threading.Thread(target=self.open_camera, name="camera-open", daemon=True).start()
+        threading.Thread(target=self.load_engine, name="startup", daemon=True).start()
+        self.poll_startup()
+    
+    # Startup
+    
+    def window_shown(self):
+        self.startup['window'] = time.perf_counter() - STARTED
+        METRICS.record('startup_window', self.startup['window'])
+    
+    def set_startup_step(self, step: str):
+        """Called from the startup thread; poll_startup shows it."""
+        self.startup_events.put(('step', step))
+    
+    def open_camera(self):
+        """Background: open the camera (can take a second on some drivers)."""
+        capture = cv2.VideoCapture(0)
+        if capture.isOpened():
+            self.startup_events.put(('camera', capture))
+        else:
+            capture.release()
+            self.startup_events.put(('camera_error', "Could not open camera."))
+    
+    def load_engine(self):
+        """Background: import the engine, load models, gallery and students, warm up the detector."""
+        try:
+            # dlib and the face models are only imported here
+            from recognition_engine import RecognitionEngine
+            engine = RecognitionEngine(
+                known_faces_dir=Path("known_faces"),
+                attendance_dir=Path("attendance_records"),
+                student_info_file=Path("students.csv"),
+                progress=self.set_startup_step
+            )
+            self.set_startup_step("Warming up detector")
+            engine.warm_up()
+        except Exception as e:
+            self.startup_events.put(('engine_error', str(e)))
+            return
+        self.startup['engine'] = time.perf_counter() - STARTED
+        METRICS.record('startup_engine', self.startup['engine'])
+        self.startup_events.put(('engine', engine))
+    
+    def poll_startup(self):
+        """Apply what the startup threads finished; all Tk calls stay on this thread."""
+        while True:
+            try:
+                kind, value = self.startup_events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'step':
+                self.status_label.config(text=value)
+            elif kind == 'camera':
+                self.video_capture = value
+                self.start_camera()
+            elif kind == 'camera_error':
+                messagebox.showerror("Camera Error", value)
+            elif kind == 'engine':
+                self.engine = value
+                self.engine_ready()
+            elif kind == 'engine_error':
+                self.status_label.config(text="Face recognition unavailable")
+                messagebox.showerror("Startup Error", f"Could not load face recognition:\n{value}")
+            self.startup_pending.discard(kind.split('_')[0])
+        
+        if self.startup_pending:
+            self.root.after(50, self.poll_startup)
+    
+    def engine_ready(self):
+        """Enable everything that needs the engine."""
+        self.update_people_list()
+        for button in (self.btn_register, self.btn_recognize, self.btn_start_session):
+            button.config(state=tk.NORMAL)
+        
+        times = ", ".join(f"{name.replace('_', ' ')} {seconds:.1f}s" for name, seconds in self.startup.items())
+        self.status_label.config(text=f"Ready ({times})")
+        print(f"Startup: {times}")
+        
+        # A session left open by a crash was resumed by the engine
+        if self.engine.session_active:
+            self.update_attendance_list()
+            self.btn_start_session.config(state=tk.DISABLED)
+            self.btn_end_session.config(state=tk.NORMAL)
+            self.stat_session.config(text="Active", fg=self.colors['success'])
+            self.status_label.config(text=f"Resumed session '{self.engine.session_name}'")
     
     def setup_modern_ui(self):
         """Create modern, clean UI layout."""
@@ -433,6 +545,28 @@ class ModernFaceRecognitionUI:
             justify=tk.LEFT
         )
         self.status_label.pack(fill=tk.X)
+        
+        self.pipeline_label = tk.Label(
+            parent,
+            text="",
+            font=("Segoe UI", 8),
+            bg=self.colors['card'],
+            fg=self.colors['text_dim'],
+            wraplength=300,
+            justify=tk.LEFT
+        )
+        self.pipeline_label.pack(fill=tk.X, pady=(8, 0))
+        
+        self.latency_label = tk.Label(
+            parent,
+            text="",
+            font=("Consolas", 8),
+            bg=self.colors['card'],
+            fg=self.colors['text_dim'],
+            justify=tk.LEFT,
+            anchor=tk.W
+        )
+        self.latency_label.pack(fill=tk.X, pady=(8, 0))
     
     def create_data_panel(self, parent):
         """Create data display panel."""
@@ -523,80 +657,15 @@ class ModernFaceRecognitionUI:
     
     # Data Management
     
-    def load_known_faces(self, force_rebuild=False):
-        """Load face encodings from cache or rebuild."""
-        pickle_file = self.known_faces_dir / "encodings.pkl"
-        
-        if not force_rebuild and pickle_file.exists():
-            try:
-                with open(pickle_file, 'rb') as f:
-                    data = pickle.load(f)
-                    self.known_face_encodings = data['encodings']
-                    self.known_face_names = data['names']
-                return
-            except Exception as e:
-                print(f"Cache error: {e}")
-        
-        # Rebuild from images
-        self.known_face_encodings = []
-        self.known_face_names = []
-        
-        for ext in ['.jpg', '.jpeg', '.png', '.bmp']:
-            for img_file in self.known_faces_dir.glob(f"*{ext}"):
-                try:
-                    name = img_file.stem
-                    image = face_recognition.load_image_file(str(img_file))
-                    encodings = face_recognition.face_encodings(image)
-                    
-                    if encodings:
-                        self.known_face_encodings.append(encodings[0])
-                        self.known_face_names.append(name)
-                except Exception as e:
-                    print(f"Error loading {img_file}: {e}")
-        
-        # Save cache
-        if self.known_face_encodings:
-            try:
-                with open(pickle_file, 'wb') as f:
-                    pickle.dump({
-                        'encodings': self.known_face_encodings,
-                        'names': self.known_face_names
-                    }, f)
-            except Exception as e:
-                print(f"Cache save error: {e}")
-    
-    def load_student_info(self):
-        """Load student information from CSV."""
-        if not self.student_info_file.exists():
-            return
-        
-        try:
-            with open(self.student_info_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    name = row.get('name', '').strip()
-                    student_id = row.get('student_id', '').strip()
-                    if name:
-                        self.student_info[name] = {'student_id': student_id}
-        except Exception as e:
-            print(f"Error loading student info: {e}")
-    
-    def save_student_info(self):
-        """Save student information to CSV."""
-        try:
-            with open(self.student_info_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['name', 'student_id'])
-                for name, data in sorted(self.student_info.items()):
-                    writer.writerow([name, data.get('student_id', '')])
-        except Exception as e:
-            print(f"Error saving student info: {e}")
-    
     def update_people_list(self):
         """Update registered people list."""
         self.people_list.delete(0, tk.END)
+        if self.engine is None:
+            self.people_list.insert(0, "Loading...")
+            return
         
-        unique_names = sorted(set(self.known_face_names))
+        counts = self.engine.photo_counts()
+        unique_names = sorted(counts)
         
         if not unique_names:
             self.people_list.insert(0, "No registered people")
@@ -604,8 +673,8 @@ class ModernFaceRecognitionUI:
             return
         
         for name in unique_names:
-            count = self.known_face_names.count(name)
-            student_id = self.student_info.get(name, {}).get('student_id', 'N/A')
+            count = counts[name]
+            student_id = self.engine.student_info.get(name, {}).get('student_id', 'N/A')
             self.people_list.insert(tk.END, f"{name} (ID: {student_id}) - {count} photo(s)")
         
         self.stat_registered.config(text=str(len(unique_names)))
@@ -614,12 +683,14 @@ class ModernFaceRecognitionUI:
         """Update present students list."""
         self.attendance_list.delete(0, tk.END)
         
-        if not self.present_students:
+        present = self.engine.present()
+        self.shown_present = len(present)
+        if not present:
             self.attendance_list.insert(0, "No students present")
             self.stat_present.config(text="0")
             return
         
-        for info in sorted(self.present_students.values(), key=lambda x: x['name']):
+        for info in present:
             student_id = info.get('student_id', 'N/A')
             time_str = info.get('time', '')
             self.attendance_list.insert(
@@ -627,7 +698,7 @@ class ModernFaceRecognitionUI:
                 f"{info['name']} (ID: {student_id}) - {time_str}"
             )
         
-        self.stat_present.config(text=str(len(self.present_students)))
+        self.stat_present.config(text=str(len(present)))
     
     def add_to_history(self, name, student_id, confidence):
         """Add recognition event to history."""
@@ -658,7 +729,7 @@ class ModernFaceRecognitionUI:
     
     def start_session(self):
         """Start attendance session."""
-        if self.session_active:
+        if self.engine.session_active:
             messagebox.showinfo("Session Active", "A session is already running.")
             return
         
@@ -667,21 +738,11 @@ class ModernFaceRecognitionUI:
             messagebox.showwarning("Missing Name", "Please enter a session name.")
             return
         
-        self.session_active = True
-        self.session_name = session_name
-        self.session_start = datetime.now()
-        
-        # Create CSV file
-        timestamp = self.session_start.strftime("%Y%m%d_%H%M")
-        safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in session_name)
-        self.session_file = self.attendance_dir / f"{timestamp}_{safe_name}.csv"
-        
-        # Write header
-        with open(self.session_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(['session_name', 'date', 'time', 'person', 'student_id', 'confidence'])
-        
-        self.present_students.clear()
+        try:
+            self.engine.start_session(session_name)
+        except Exception as e:
+            messagebox.showerror("Session Error", f"Could not start session: {e}")
+            return
         self.update_attendance_list()
         
         self.btn_start_session.config(state=tk.DISABLED)
@@ -693,54 +754,22 @@ class ModernFaceRecognitionUI:
     
     def end_session(self):
         """End attendance session."""
-        if not self.session_active:
+        if not self.engine.session_active:
             return
         
-        count = len(self.present_students)
-        session_name = self.session_name
-        
-        self.session_active = False
-        self.session_name = ""
-        self.session_file = None
-        self.session_start = None
+        session_name = self.engine.session_name
+        count = self.engine.end_session()
         
         self.btn_start_session.config(state=tk.NORMAL)
         self.btn_end_session.config(state=tk.DISABLED)
         self.stat_session.config(text="Inactive", fg=self.colors['text_dim'])
         
         self.status_label.config(text=f"Session ended: {count} student(s) present")
-        messagebox.showinfo("Session Ended", f"Session '{session_name}' ended.\n{count} student(s) were present.")
-    
-    def mark_attendance(self, name, student_id, confidence):
-        """Mark student as present."""
-        if not self.session_active or name == "Unknown":
-            return
-        
-        key = student_id or name
-        if key in self.present_students:
+        if self.engine.session_error:
+            messagebox.showerror("Attendance Error", f"Session '{session_name}' ended, but its attendance "
+                                 f"may be incomplete:\n{self.engine.session_error}")
             return
-        
-        now = datetime.now()
-        date_str = now.strftime("%Y-%m-%d")
-        time_str = now.strftime("%H:%M:%S")
-        
-        self.present_students[key] = {
-            'name': name,
-            'student_id': student_id,
-            'date': date_str,
-            'time': time_str,
-            'confidence': confidence
-        }
-        
-        # Write to CSV
-        if self.session_file:
-            with open(self.session_file, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                conf_str = f"{confidence:.1f}%" if confidence else "-"
-                writer.writerow([self.session_name, date_str, time_str, name, student_id or "", conf_str])
-        
-        self.update_attendance_list()
-        self.show_welcome(name, confidence)
+        messagebox.showinfo("Session Ended", f"Session '{session_name}' ended.\n{count} student(s) were present.")
     
     def show_welcome(self, name, confidence):
         """Show welcome message."""
@@ -773,44 +802,173 @@ class ModernFaceRecognitionUI:
     # Camera and Video Processing
     
     def start_camera(self):
-        """Initialize camera."""
-        self.video_capture = cv2.VideoCapture(0)
-        if not self.video_capture.isOpened():
-            messagebox.showerror("Camera Error", "Could not open camera.")
-            return
+        """Start the background pipeline on the camera open_camera opened."""
+        # Capture and recognition run on their own threads; Tk only displays
+        self.capture_thread = CaptureThread(self.video_capture, pool=self.frame_pool)
+        self.capture_thread.start()
+        self.recognition_worker = RecognitionWorker(self.process_frame_async, pool=self.frame_pool)
+        self.recognition_worker.start()
         
         self.is_running = True
         self.update_frame()
+        self.update_pipeline_status()
     
     def update_frame(self):
-        """Update video frame."""
+        """Display the newest camera frame with the latest results."""
         if not self.is_running:
             return
         
-        ret, frame = self.video_capture.read()
-        if not ret:
-            self.root.after(30, self.update_frame)
+        frame_id, frame = self.capture_thread.latest()
+        if frame is None or frame_id == self.last_frame_id:
+            self.capture_thread.release(frame)
+            self.root.after(10, self.update_frame)
             return
+        self.last_frame_id = frame_id
         
-        # Process based on mode
-        if self.mode == "register":
-            frame = self.process_register_frame(frame)
-        elif self.mode == "recognize":
-            frame = self.process_recognize_frame(frame)
-        else:
-            frame = self.process_idle_frame(frame)
+        # A registration burst gets every frame until it is full
+        if self.burst is not None and not self.burst.full:
+            self.burst.submit(frame)
+        
+        # Hand the frame to the worker; a frame it hasn't started yet is dropped
+        if self.mode != "idle" and self.burst is None:
+            self.recognition_worker.submit(frame_id, frame, self.mode)
         
-        # Display
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frame_rgb = cv2.resize(frame_rgb, (800, 600))
+        # Draw on a copy, the worker may still be reading the original
+        canvas = self.frame_pool.acquire(frame.shape)
+        np.copyto(canvas, frame)
+        self.capture_thread.release(frame)
+        faces = self.collect_results()
+        
+        # Process based on mode
+        with METRICS.time('draw'):
+            if self.mode == "register":
+                frame = self.process_register_frame(canvas, faces)
+            elif self.mode == "recognize":
+                frame = self.process_recognize_frame(canvas, faces)
+            else:
+                frame = self.process_idle_frame(canvas)
+        
+        with METRICS.time('render'):
+            self.show_frame(frame)
+        self.frame_pool.release(canvas)
+        if 'first_frame' not in self.startup:
+            self.startup['first_frame'] = time.perf_counter() - STARTED
+            METRICS.record('startup_first_frame', self.startup['first_frame'])
+        self.root.after(10, self.update_frame)
+    
+    def show_frame(self, frame):
+        """Resize, convert and paste into the one PhotoImage the label shows."""
+        width, height = self.display_size
+        if self.display_photo is None:
+            self.display_bgr = np.empty((height, width, 3), dtype=np.uint8)
+            self.display_rgb = np.empty((height, width, 3), dtype=np.uint8)
+            self.display_photo = ImageTk.PhotoImage("RGB", (width, height))
+            self.video_label.configure(image=self.display_photo, text="")
+            self.video_label.image = self.display_photo
+        
+        cv2.resize(frame, (width, height), dst=self.display_bgr)
+        cv2.cvtColor(self.display_bgr, cv2.COLOR_BGR2RGB, dst=self.display_rgb)
+        # frombuffer wraps the array without copying; paste() copies into Tk's image
+        self.display_photo.paste(Image.frombuffer("RGB", (width, height), self.display_rgb, "raw", "RGB", 0, 1))
+    
+    def collect_results(self):
+        """Fetch the worker's latest faces for the current mode."""
+        result = self.recognition_worker.latest_results()
+        if result is None or result['mode'] != self.mode:
+            return []
+        
+        # Side effects only once per processed frame, overlays on every frame
+        if result['frame_id'] != self.last_result_id:
+            self.last_result_id = result['frame_id']
+            if self.mode == "recognize":
+                self.handle_recognition_results(result['faces'])
+        
+        return result['faces']
+    
+    def update_pipeline_status(self):
+        """Show per-stage rates, queue depth and dropped frames."""
+        if not self.is_running:
+            return
         
-        img = Image.fromarray(frame_rgb)
-        photo = ImageTk.PhotoImage(image=img)
+        if self.engine is None:
+            # Models still loading; only the camera runs
+            self.root.after(1000, self.update_pipeline_status)
+            return
         
-        self.video_label.configure(image=photo, text="")
-        self.video_label.image = photo
+        now = datetime.now()
+        capture = self.capture_thread.stats()
+        worker = self.recognition_worker.stats()
+        engine = self.engine.stats()
+        tracking = engine['tracking']
+        schedule = engine['schedule']
+        # Frame buffers allocated so far (camera, drawing and recognition scratch)
+        allocations = capture['allocations'] + engine['buffers']['allocations']
+        quality = engine['quality']
+        quality_text = f", quality gate {quality['encodings_saved']:.0%}" if quality.get('assessed') else ""
+        cache = engine['match_cache']
+        if tracking:
+            tracking_text = (f"Tracks: {tracking['tracks']} ({tracking['voting']} voting), "
+                             f"encodings saved {tracking['encodings_saved']:.0%}{quality_text}\n"
+                             f"Schedule: {schedule['scale']:.2f}x, detect every {schedule['detect_interval']}, "
+                             f"upsample {schedule['upsample']}, "
+                             f"{schedule['amortized_ms']:.0f}/{schedule['target_ms']:.0f} ms ({schedule['reason']})\n")
+        else:
+            # No frame recognized yet
+            tracking_text = "Tracks: -\nSchedule: -\n"
+        
+        if self.last_pipeline_stats:
+            then, prev_capture, prev_worker, prev_allocations = self.last_pipeline_stats
+            elapsed = max((now - then).total_seconds(), 1e-6)
+            capture_fps = (capture['frames'] - prev_capture['frames']) / elapsed
+            worker_fps = (worker['frames'] - prev_worker['frames']) / elapsed
+            allocation_rate = (allocations - prev_allocations) / elapsed
+            self.pipeline_label.config(
+                text=(
+                    f"Camera: {capture_fps:.1f} fps, queue {capture['queue']}, "
+                    f"dropped {capture['dropped']}\n"
+                    f"Recognition: {worker_fps:.1f} fps, {worker['latency_ms']:.0f} ms, "
+                    f"queue {worker['queue']}, dropped {worker['dropped']}\n"
+                    f"{tracking_text}"
+                    f"Frame buffers: {allocation_rate:.1f} new/s ({allocations} total)\n"
+                    f"Match cache: {cache.get('hit_rate', 0.0):.0%} hits, "
+                    f"{cache.get('saved_ms', 0.0):.0f} ms saved"
+                )
+            )
         
-        self.root.after(30, self.update_frame)
+        self.last_pipeline_stats = (now, capture, worker, allocations)
+        self.update_latency_status()
+        self.root.after(1000, self.update_pipeline_status)
+    
+    def update_latency_status(self):
+        """p50/p95/p99 per pipeline stage."""
+        lines = [f"{'stage':<17}{'p50':>6}{'p95':>6}{'p99':>6} ms"]
+        for stage, summary in METRICS.snapshot().items():
+            lines.append(f"{stage:<17}{summary['p50_ms']:>6.1f}{summary['p95_ms']:>6.1f}{summary['p99_ms']:>6.1f}")
+        profiler = "on" if self.profiling.active else "off"
+        lines.append(f"F8: save metrics  F9: profiler ({profiler})")
+        self.latency_label.config(text="\n".join(lines))
+    
+    def dump_metrics(self):
+        """Write the stage histograms to metrics_YYYYmmdd_HHMMSS.json."""
+        path = METRICS.dump(Path(f"metrics_{datetime.now():%Y%m%d_%H%M%S}.json"))
+        self.status_label.config(text=f"Metrics saved to {path}")
+    
+    def toggle_profiler(self):
+        """Start or stop sampling all threads; stopping writes a report file."""
+        report = self.profiling.toggle()
+        if report is None:
+            self.status_label.config(text="Profiler running - press F9 again to stop")
+        else:
+            self.status_label.config(text=f"Profile saved to {report}")
+        self.update_latency_status()
+    
+    def process_frame_async(self, frame, mode):
+        """Detect/recognize faces on the worker thread (no Tk calls here)."""
+        if mode == "register":
+            return self.engine.rate_faces(frame)
+        if mode == "recognize":
+            return self.engine.process(frame)
+        return []
     
     def process_idle_frame(self, frame):
         """Process frame in idle mode."""
@@ -825,11 +983,8 @@ class ModernFaceRecognitionUI:
         )
         return frame
     
-    def process_register_frame(self, frame):
+    def process_register_frame(self, frame, faces):
         """Process frame in registration mode."""
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        face_locations = face_recognition.face_locations(rgb_frame)
-        
         if self.captured_face is not None:
             # Show captured face
             if self.captured_location:
@@ -845,17 +1000,32 @@ class ModernFaceRecognitionUI:
                 (0, 255, 255),
                 2
             )
+        elif self.burst is not None:
+            cv2.putText(
+                frame,
+                f"Hold still... {self.burst.submitted}/{self.burst.frames}",
+                (20, 40),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.7,
+                (0, 255, 255),
+                2
+            )
         else:
-            # Show detected faces
-            for (top, right, bottom, left) in face_locations:
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+            # Show detected faces; orange ones would not make a good photo yet
+            for face in faces:
+                top, right, bottom, left = face['location']
+                if 'face' in face:
+                    color, hint = (0, 255, 0), "Press SPACE to capture"
+                else:
+                    color, hint = (0, 165, 255), QUALITY_HINTS[face['quality'].reason]
+                cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
                 cv2.putText(
                     frame,
-                    "Press SPACE to capture",
+                    hint,
                     (left, top - 10),
                     cv2.FONT_HERSHEY_SIMPLEX,
                     0.6,
-                    (0, 255, 0),
+                    color,
                     2
                 )
             
@@ -871,44 +1041,26 @@ class ModernFaceRecognitionUI:
         
         return frame
     
-    def process_recognize_frame(self, frame):
+    def handle_recognition_results(self, faces):
+        """Log recognized faces and greet students the engine just marked present."""
+        for face in faces:
+            if face['name'] != "Unknown":
+                self.add_to_history(face['name'], face['student_id'], face['confidence'])
+            if face.get('marked'):
+                self.show_welcome(face['name'], face['confidence'])
+        
+        # Also catches students marked on frames the display skipped
+        if len(self.engine.present_students) != self.shown_present:
+            self.update_attendance_list()
+    
+    def process_recognize_frame(self, frame, faces):
         """Process frame in recognition mode."""
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        small_frame = cv2.resize(rgb_frame, (0, 0), fx=0.25, fy=0.25)
-        
-        face_locations = face_recognition.face_locations(small_frame)
-        face_encodings = face_recognition.face_encodings(small_frame, face_locations)
-        
-        for face_encoding, (top, right, bottom, left) in zip(face_encodings, face_locations):
-            # Scale back up
-            top *= 4
-            right *= 4
-            bottom *= 4
-            left *= 4
-            
-            name = "Unknown"
-            confidence = None
-            student_id = ""
-            color = (0, 0, 255)
-            
-            if self.known_face_encodings:
-                matches = face_recognition.compare_faces(
-                    self.known_face_encodings,
-                    face_encoding,
-                    tolerance=self.tolerance
-                )
-                face_distances = face_recognition.face_distance(
-                    self.known_face_encodings,
-                    face_encoding
-                )
-                
-                if len(face_distances) > 0:
-                    best_idx = np.argmin(face_distances)
-                    if matches[best_idx]:
-                        name = self.known_face_names[best_idx]
-                        confidence = (1 - face_distances[best_idx]) * 100
-                        student_id = self.student_info.get(name, {}).get('student_id', '')
-                        color = (0, 255, 0)
+        for face in faces:
+            top, right, bottom, left = face['location']
+            name = face['name']
+            student_id = face['student_id']
+            confidence = face['confidence']
+            color = (0, 255, 0) if name != "Unknown" else (0, 0, 255)
             
             # Draw box
             cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
@@ -930,11 +1082,6 @@ class ModernFaceRecognitionUI:
                 (255, 255, 255),
                 1
             )
-            
-            # Log and mark attendance
-            if name != "Unknown":
-                self.add_to_history(name, student_id, confidence)
-                self.mark_attendance(name, student_id, confidence)
         
         cv2.putText(
             frame,
@@ -952,28 +1099,26 @@ class ModernFaceRecognitionUI:
     
     def start_registration(self):
         """Start registration mode."""
-        print("DEBUG: Starting registration mode")
-        
         self.mode = "register"
+        self.clear_results()
         self.captured_face = None
         self.captured_location = None
+        self.captured_shots = []
+        self.cancel_burst()
         self.name_entry.delete(0, tk.END)
         self.student_id_entry.delete(0, tk.END)
         
         # Show the registration card RIGHT AFTER Actions card
         try:
             self.register_card.pack(fill=tk.X, pady=(0, 15), after=self.actions_card)
-            print("DEBUG: Registration card packed successfully after Actions")
         except Exception as e:
-            print(f"DEBUG: Error packing card: {e}")
+            print(f"Error packing registration card: {e}")
             # Alternative: pack it at the beginning
             self.register_card.pack(fill=tk.X, pady=(0, 15), before=self.session_card)
         
         # Make sure fields are enabled and visible
         self.name_entry.config(state=tk.NORMAL)
         self.student_id_entry.config(state=tk.NORMAL)
-        print(f"DEBUG: Name entry state: {self.name_entry['state']}")
-        print(f"DEBUG: Student ID entry state: {self.student_id_entry['state']}")
         
         self.btn_register.config(state=tk.DISABLED)
         self.btn_recognize.config(state=tk.DISABLED)
@@ -982,31 +1127,34 @@ class ModernFaceRecognitionUI:
         self.status_label.config(text="Registration mode: Position face and press SPACE")
         
         self.root.bind('<space>', lambda e: self.capture_face())
-        print("DEBUG: Registration mode active, SPACE key bound")
         
         # Force update
         self.root.update_idletasks()
     
     def start_recognition(self):
         """Start recognition mode."""
-        if not self.known_face_encodings:
+        if not len(self.engine.gallery):
             messagebox.showwarning("No Faces", "Please register at least one person first.")
             return
         
         self.mode = "recognize"
+        self.clear_results()
         
         self.btn_register.config(state=tk.DISABLED)
         self.btn_recognize.config(state=tk.DISABLED)
         self.btn_stop.config(state=tk.NORMAL)
         
-        count = len(set(self.known_face_names))
+        count = len(self.engine.registered_people())
         self.status_label.config(text=f"Recognition mode: Detecting {count} registered person(s)")
     
     def stop_mode(self):
         """Stop current mode."""
         self.mode = "idle"
+        self.clear_results()
         self.captured_face = None
         self.captured_location = None
+        self.captured_shots = []
+        self.cancel_burst()
         
         self.register_card.pack_forget()
         
@@ -1018,44 +1166,52 @@ class ModernFaceRecognitionUI:
         
         self.root.unbind('<space>')
     
+    def clear_results(self):
+        """Drop pending frames and results from the previous mode."""
+        if self.recognition_worker:
+            self.recognition_worker.clear()
+        self.last_result_id = 0
+        self.engine.reset()
+    
     def capture_face(self):
-        """Capture face for registration."""
-        print("DEBUG: capture_face called")
-        
-        if not self.video_capture:
-            print("DEBUG: No video capture")
+        """Record a short burst; the best frames are encoded in the background."""
+        if not self.capture_thread:
             messagebox.showerror("Camera Error", "Camera is not available.")
             return
-        
-        ret, frame = self.video_capture.read()
-        if not ret:
-            print("DEBUG: Could not read frame")
-            messagebox.showerror("Camera Error", "Could not read from camera.")
+        if self.burst is not None:
             return
         
-        print(f"DEBUG: Frame captured, shape: {frame.shape}")
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        print("DEBUG: Detecting faces...")
-        face_locations = face_recognition.face_locations(rgb_frame)
-        print(f"DEBUG: Found {len(face_locations)} face(s)")
-        
-        if not face_locations:
-            messagebox.showwarning("No Face", "No face detected. Please position your face clearly in the camera.")
+        self.captured_face = None
+        self.captured_location = None
+        self.captured_shots = []
+        self.burst = BurstRegistration(self.engine, BURST_FRAMES, BURST_KEEP)
+        self.burst.start()
+        self.status_label.config(text="Capturing - hold still and look at the camera")
+        self.root.after(50, self.finish_burst)
+    
+    def finish_burst(self):
+        """Once the burst is encoded, keep its best shots for save_face."""
+        burst = self.burst
+        if burst is None:
+            return
+        if not burst.done:
+            self.root.after(20, self.finish_burst)
             return
         
-        # Capture first face
-        top, right, bottom, left = face_locations[0]
-        self.captured_location = (top, right, bottom, left)
-        
-        padding = 20
-        self.captured_face = rgb_frame[
-            max(0, top-padding):min(rgb_frame.shape[0], bottom+padding),
-            max(0, left-padding):min(rgb_frame.shape[1], right+padding)
-        ].copy()
+        self.burst = None
+        shots = burst.finish()
+        if not shots:
+            if burst.rejected:
+                reason = max(set(burst.rejected), key=burst.rejected.count)
+                messagebox.showwarning("Poor Photo", f"{QUALITY_HINTS[reason]} and press SPACE again.")
+            else:
+                messagebox.showwarning("No Face", "No face detected. Please position your face clearly in the camera.")
+            self.status_label.config(text="Registration mode: Position face and press SPACE")
+            return
         
-        print(f"DEBUG: Face captured successfully at location: {self.captured_location}")
-        print(f"DEBUG: Captured face shape: {self.captured_face.shape}")
+        self.captured_shots = shots
+        self.captured_face = shots[0]['face']
+        self.captured_location = shots[0]['location']
         
         # Make sure fields are enabled
         self.name_entry.config(state=tk.NORMAL)
@@ -1065,9 +1221,17 @@ class ModernFaceRecognitionUI:
         self.name_entry.focus_set()
         self.name_entry.icursor(tk.END)
         
-        self.status_label.config(text="Face captured! Enter name and student ID, then save")
+        self.status_label.config(
+            text=f"Face captured ({len(shots)} samples in {burst.seconds:.1f}s)! Enter name and student ID, then save"
+        )
         messagebox.showinfo("Success", "Face captured! Now enter the name and student ID in the form below.")
     
+    def cancel_burst(self):
+        """Drop a burst still in progress (mode change or close)."""
+        if self.burst is not None:
+            self.burst.close()
+            self.burst = None
+    
     def save_face(self):
         """Save captured face."""
         if self.captured_face is None:
@@ -1084,29 +1248,14 @@ class ModernFaceRecognitionUI:
             messagebox.showwarning("Missing ID", "Please enter a student ID.")
             return
         
-        # Find unique filename
-        counter = 1
-        while True:
-            filename = self.known_faces_dir / f"{name}{'' if counter == 1 else counter}.jpg"
-            if not filename.exists():
-                break
-            counter += 1
-        
-        # Save image
-        face_bgr = cv2.cvtColor(self.captured_face, cv2.COLOR_RGB2BGR)
-        cv2.imwrite(str(filename), face_bgr)
-        
-        # Save student info
-        self.student_info[name] = {'student_id': student_id}
-        self.save_student_info()
-        
-        # Reload faces
-        self.load_known_faces(force_rebuild=True)
+        # The burst's encodings go straight into the gallery, nothing is re-encoded
+        self.engine.register_encodings(self.captured_shots, name, student_id)
         self.update_people_list()
         
         # Reset
         self.captured_face = None
         self.captured_location = None
+        self.captured_shots = []
         self.name_entry.delete(0, tk.END)
         self.student_id_entry.delete(0, tk.END)
         
@@ -1116,8 +1265,16 @@ class ModernFaceRecognitionUI:
     def on_closing(self):
         """Handle window close."""
         self.is_running = False
+        self.cancel_burst()
+        if self.capture_thread:
+            self.capture_thread.stop()
+        if self.recognition_worker:
+            self.recognition_worker.stop()
         if self.video_capture:
             self.video_capture.release()
+        self.profiling.stop()
+        if self.engine is not None:
+            self.engine.close()
         self.root.destroy()
 
 
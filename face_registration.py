@@ -0,0 +1,110 @@
+"""
+Burst registration
+Records a short burst of camera frames, rates and encodes the best face of
+each on a background thread, and keeps the top-K encodings that are both
+good and different from each other (expression, slight head turns), so a
+person is enrolled with several samples straight from the original frames
+"""
+
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def select_shots(shots: List[Dict], keep: int, diversity: float = 0.15,
+                 tolerance: float = 0.6) -> List[Dict]:
+    """Top shots by quality, skipping near-duplicates and other people.
+    
+    Shots farther than tolerance from the burst's medoid are dropped (someone
+    else walked into the frame). Each further pick maximizes quality times
+    its distance to the shots already kept, saturating at diversity.
+    """
+    if not shots:
+        return []
+    encodings = np.array([shot['encoding'] for shot in shots], dtype=np.float64)
+    scores = np.array([shot['quality'].score for shot in shots])
+    
+    dist = np.linalg.norm(encodings[:, None, :] - encodings[None, :, :], axis=2)
+    medoid = int(dist.sum(axis=1).argmin())
+    scores[dist[medoid] > tolerance] = 0.0
+    
+    chosen = [int(scores.argmax())]
+    closest = dist[chosen[0]].copy()
+    while len(chosen) < min(keep, len(shots)):
+        gain = scores * np.minimum(closest / diversity, 1.0)
+        gain[chosen] = 0.0
+        pick = int(gain.argmax())
+        if gain[pick] <= 0.0:
+            break
+        chosen.append(pick)
+        np.minimum(closest, dist[pick], out=closest)
+    return [shots[i] for i in chosen]
+
+
+class BurstRegistration(threading.Thread):
+    """Rates and encodes up to `frames` submitted frames, then picks `keep` shots.
+    
+    submit() copies each BGR frame and returns False once the burst is full;
+    finish() waits for the thread and returns the selected shots (each a
+    rate_faces dict with face, encoding and quality), best first.
+    """
+    
+    def __init__(self, engine, frames: int = 15, keep: int = 5, diversity: float = 0.15):
+        super().__init__(name="registration", daemon=True)
+        self.engine = engine
+        self.frames = frames
+        self.keep = keep
+        self.diversity = diversity
+        self._queue: "queue.Queue[Optional[np.ndarray]]" = queue.Queue()
+        self._shots: List[Dict] = []
+        self.rejected: List[str] = []  # registration gate reasons for frames without a usable face
+        
+        # Counters
+        self.submitted = 0
+        self.started_at = time.perf_counter()
+        self.seconds = 0.0
+    
+    @property
+    def full(self) -> bool:
+        return self.submitted >= self.frames
+    
+    def submit(self, frame: np.ndarray) -> bool:
+        """Queue a copy of frame; False once the burst has all its frames."""
+        if self.full:
+            return False
+        self.submitted += 1
+        self._queue.put(frame.copy())
+        if self.full:
+            self._queue.put(None)
+        return True
+    
+    def run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+            faces = self.engine.rate_faces(frame, encode=True)
+            if faces and 'encoding' in faces[0]:
+                self._shots.append(faces[0])
+            elif faces:
+                self.rejected.append(faces[0]['quality'].reason)
+        self.seconds = time.perf_counter() - self.started_at
+    
+    @property
+    def done(self) -> bool:
+        return self.full and not self.is_alive()
+    
+    def close(self):
+        """Stop accepting frames; the thread exits after the queued ones."""
+        if not self.full:
+            self.submitted = self.frames
+            self._queue.put(None)
+    
+    def finish(self) -> List[Dict]:
+        """Stop accepting frames, wait for the rest, and select the shots."""
+        self.close()
+        self.join()
+        return select_shots(self._shots, self.keep, self.diversity, self.engine.tolerance)
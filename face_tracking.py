@@ -0,0 +1,317 @@
+"""
+Track-then-recognize layer between face detection and encoding
+Faces are associated across frames by IoU (falling back to centroid
+distance), detection runs every N frames, and a track is only re-encoded
+when it is new, has drifted, or its identity has gone stale. Identities
+are voted over a track's recent encodings before they are committed
+"""
+
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+Location = Tuple[int, int, int, int]
+
+
+def box_iou(a: Location, b: Location) -> float:
+    """Intersection over union of two (top, right, bottom, left) boxes."""
+    top = max(a[0], b[0])
+    right = min(a[1], b[1])
+    bottom = min(a[2], b[2])
+    left = max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    if inter == 0:
+        return 0.0
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    return inter / float(area_a + area_b - inter)
+
+
+def box_center(box: Location) -> Tuple[float, float]:
+    return (box[1] + box[3]) / 2.0, (box[0] + box[2]) / 2.0
+
+
+def box_size(box: Location) -> float:
+    return max(box[1] - box[3], box[2] - box[0], 1)
+
+
+def _visual_tracker_factory(kind: Optional[str]):
+    """OpenCV KCF/CSRT constructor if this cv2 build has it, else None."""
+    if not kind:
+        return None
+    import cv2
+    name = f"Tracker{kind.upper()}_create"
+    for module in (cv2, getattr(cv2, 'legacy', None)):
+        factory = getattr(module, name, None) if module is not None else None
+        if factory is not None:
+            return factory
+    print(f"OpenCV tracker '{kind}' not available (needs opencv-contrib-python), using IoU only")
+    return None
+
+
+class IdentityVotes:
+    """Sliding-window vote over one track's per-frame match results.
+    
+    An identity (a name, or None for unknown) is committed once it holds
+    min_votes of the last window results; ties go to the higher mean
+    confidence. A committed identity only changes when another one
+    reaches min_votes, so one noisy frame cannot switch it.
+    """
+    
+    def __init__(self, min_votes: int = 1, window: Optional[int] = None):
+        self.min_votes = min_votes
+        # Default window makes min_votes a strict majority
+        self.results = deque(maxlen=window or 2 * min_votes - 1)
+        self.committed = False
+        self.name: Optional[str] = None
+        self.student_id = ""
+        self.confidence: Optional[float] = None
+    
+    @property
+    def settled(self) -> bool:
+        """Committed, and the latest result agrees with it."""
+        return self.committed and self.results[-1][0] == self.name
+    
+    def add(self, name: Optional[str], student_id: str, confidence: Optional[float]) -> bool:
+        """Count one result; True if the committed identity changed."""
+        self.results.append((name, student_id, confidence))
+        tally: Dict[Optional[str], List] = {}
+        for result in self.results:
+            tally.setdefault(result[0], []).append(result)
+        
+        leader, votes = max(
+            tally.items(),
+            key=lambda item: (len(item[1]), sum(r[2] or 0.0 for r in item[1]) / len(item[1]))
+        )
+        if len(votes) < self.min_votes:
+            return False
+        
+        changed = not self.committed or leader != self.name
+        self.committed = True
+        self.name = leader
+        self.student_id = votes[-1][1]
+        confidences = [r[2] for r in votes if r[2] is not None]
+        self.confidence = sum(confidences) / len(confidences) if confidences else None
+        return changed
+
+
+class Track:
+    """One face followed across frames, with the identity last decided for it."""
+    
+    def __init__(self, track_id: int, box: Location, min_votes: int = 1):
+        self.track_id = track_id
+        self.box = box
+        self.hits = 1
+        self.misses = 0
+        
+        # Identity, carried along until the track needs re-encoding
+        self.votes = IdentityVotes(min_votes)
+        self.encoded_box: Optional[Location] = None
+        self.encoded_at = 0.0
+        
+        # Where and when the face last failed the quality gate
+        self.rejected_box: Optional[Location] = None
+        self.rejected_at = 0.0
+        
+        self.visual_tracker = None
+    
+    @property
+    def name(self) -> Optional[str]:
+        return self.votes.name
+    
+    @property
+    def student_id(self) -> str:
+        return self.votes.student_id
+    
+    @property
+    def confidence(self) -> Optional[float]:
+        return self.votes.confidence
+    
+    @property
+    def has_identity(self) -> bool:
+        """An identity (possibly unknown) has been committed by the vote."""
+        return self.votes.committed
+
+
+class FaceTracker:
+    """Associates detections with tracks and decides what needs encoding."""
+    
+    def __init__(self, detect_interval: int = 5, iou_threshold: float = 0.3,
+                 max_misses: int = 2, drift_iou: float = 0.5,
+                 reencode_after: float = 10.0, unknown_retry: float = 1.0,
+                 visual_tracker: Optional[str] = None, min_votes: int = 1,
+                 rejected_retry: float = 1.0):
+        self.detect_interval = detect_interval
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.drift_iou = drift_iou
+        self.reencode_after = reencode_after
+        self.unknown_retry = unknown_retry
+        self.min_votes = min_votes  # consistent encodings before an identity is committed
+        self.rejected_retry = rejected_retry  # seconds before a rejected face that hasn't moved is re-checked
+        self._visual_factory = _visual_tracker_factory(visual_tracker)
+        
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.tracks: List[Track] = []
+        self.frame_index = 0
+        
+        # Counters
+        self.frames = 0
+        self.detections_run = 0
+        self.faces_seen = 0
+        self.encodings_run = 0
+        self.rejections = 0
+        self.identity_changes = 0
+    
+    def reset(self):
+        """Forget all tracks (e.g. when recognition mode restarts)."""
+        with self._lock:
+            self.tracks = []
+            self.frame_index = 0
+    
+    def should_detect(self) -> bool:
+        """True on the frames where the detector has to run."""
+        return self.frame_index % self.detect_interval == 0 or not self.tracks
+    
+    def step(self, frame: Optional[np.ndarray], detect_fn) -> List[Track]:
+        """Advance one frame: detect (every N frames) or follow existing tracks.
+        
+        detect_fn() returns full-frame boxes and is only called when needed.
+        """
+        with self._lock:
+            self.frames += 1
+            if self.should_detect():
+                self.detections_run += 1
+                self._associate(detect_fn())
+            elif self._visual_factory is not None and frame is not None:
+                self._follow(frame)
+            self.frame_index += 1
+            self.faces_seen += len(self.tracks)
+            return list(self.tracks)
+    
+    def _associate(self, boxes: List[Location]):
+        """Greedy IoU matching, then centroid distance for the leftovers."""
+        pairs = []
+        for t, track in enumerate(self.tracks):
+            for d, box in enumerate(boxes):
+                iou = box_iou(track.box, box)
+                if iou >= self.iou_threshold:
+                    pairs.append((iou, t, d))
+        pairs.sort(reverse=True)
+        
+        matched_tracks = set()
+        matched_boxes = set()
+        for _, t, d in pairs:
+            if t in matched_tracks or d in matched_boxes:
+                continue
+            matched_tracks.add(t)
+            matched_boxes.add(d)
+            self._update_track(self.tracks[t], boxes[d])
+        
+        # Fast movers can lose all overlap; accept a close centroid instead
+        for t, track in enumerate(self.tracks):
+            if t in matched_tracks:
+                continue
+            cx, cy = box_center(track.box)
+            best = None
+            for d, box in enumerate(boxes):
+                if d in matched_boxes:
+                    continue
+                bx, by = box_center(box)
+                distance = np.hypot(bx - cx, by - cy) / box_size(track.box)
+                if distance < 0.5 and (best is None or distance < best[0]):
+                    best = (distance, d)
+            if best is not None:
+                matched_tracks.add(t)
+                matched_boxes.add(best[1])
+                self._update_track(track, boxes[best[1]])
+        
+        survivors = []
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            survivors.append(track)
+        
+        for d, box in enumerate(boxes):
+            if d not in matched_boxes:
+                survivors.append(Track(next(self._ids), box, self.min_votes))
+        self.tracks = survivors
+    
+    def _update_track(self, track: Track, box: Location):
+        track.box = box
+        track.hits += 1
+        track.misses = 0
+        track.visual_tracker = None
+    
+    def _follow(self, frame: np.ndarray):
+        """Move boxes with the optional OpenCV tracker between detections."""
+        for track in self.tracks:
+            top, right, bottom, left = track.box
+            if track.visual_tracker is None:
+                track.visual_tracker = self._visual_factory()
+                track.visual_tracker.init(frame, (left, top, right - left, bottom - top))
+                continue
+            ok, (x, y, w, h) = track.visual_tracker.update(frame)
+            if ok:
+                track.box = (int(y), int(x + w), int(y + h), int(x))
+    
+    def needs_encoding(self, track: Track, now: Optional[float] = None) -> bool:
+        """New, still voting, drifted, or identity older than the re-encode interval.
+        
+        A face the quality gate rejected waits until it moves or
+        rejected_retry has passed.
+        """
+        now = time.monotonic() if now is None else now
+        if (track.rejected_box is not None and now - track.rejected_at < self.rejected_retry
+                and box_iou(track.box, track.rejected_box) >= self.drift_iou):
+            return False
+        if not track.votes.settled:
+            return True
+        if box_iou(track.box, track.encoded_box) < self.drift_iou:
+            return True
+        max_age = self.unknown_retry if track.name is None else self.reencode_after
+        return now - track.encoded_at > max_age
+    
+    def set_identity(self, track: Track, name: Optional[str], student_id: str,
+                     confidence: Optional[float], now: Optional[float] = None) -> bool:
+        """Vote with the identity just computed for a track; True if its committed identity changed."""
+        with self._lock:
+            was_committed = track.votes.committed
+            changed = track.votes.add(name, student_id, confidence)
+            if changed and was_committed:
+                self.identity_changes += 1
+            track.encoded_box = track.box
+            track.encoded_at = time.monotonic() if now is None else now
+            track.rejected_box = None
+            self.encodings_run += 1
+            return changed
+    
+    def set_rejected(self, track: Track, now: Optional[float] = None):
+        """Record that the quality gate turned a track's face down instead of encoding it."""
+        with self._lock:
+            track.rejected_box = track.box
+            track.rejected_at = time.monotonic() if now is None else now
+            self.rejections += 1
+    
+    def stats(self) -> Dict[str, float]:
+        """Counters showing how much encoding work tracking saved."""
+        saved = 1.0 - self.encodings_run / self.faces_seen if self.faces_seen else 0.0
+        return {
+            'tracks': len(self.tracks),
+            'voting': sum(1 for track in self.tracks if not track.has_identity),
+            'identity_changes': self.identity_changes,
+            'frames': self.frames,
+            'detections': self.detections_run,
+            'encodings': self.encodings_run,
+            'rejections': self.rejections,
+            'faces_seen': self.faces_seen,
+            'encodings_saved': saved
+        }
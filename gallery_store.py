@@ -0,0 +1,141 @@
+"""
+Memory-mapped, versioned on-disk gallery format
+encodings.fgal holds a fixed header and one contiguous float32 block that is
+opened with np.memmap; encodings.fgal.json is the compact names/files table
+"""
+
+import json
+import os
+import secrets
+import struct
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+MAGIC = b"FGAL"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sIIIQQ32s")  # magic, version, dim, reserved, count, generation, model id
+HEADER_SIZE = 64
+COUNT_OFFSET = 16
+
+
+def _fsync_write(path: Path, data: bytes):
+    """Write data to path atomically (temp file, fsync, rename)."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class GalleryStore:
+    """Reads and writes the binary gallery plus its names table.
+    
+    Rows in the data block are append-only while the app runs: appends write
+    past the committed count and then bump the count in the header, so a
+    crash never exposes a half-written row. Deleted rows are dropped from the
+    table only, until the process that owns the store compacts the block
+    with a full write().
+    """
+    
+    def __init__(self, path: Path, model_id: str, dim: int = 128):
+        self.path = Path(path)
+        self.table_path = self.path.with_name(self.path.name + ".json")
+        self.model_id = model_id
+        self.dim = dim
+        self.count = 0
+        self.generation = 0
+    
+    def exists(self) -> bool:
+        return self.path.exists() and self.table_path.exists()
+    
+    def _model_bytes(self) -> bytes:
+        return self.model_id.encode('utf-8')[:32]
+    
+    def read(self) -> Optional[Tuple[np.ndarray, Dict]]:
+        """Map the data block and load the table, or None if unusable."""
+        try:
+            with open(self.path, 'rb') as f:
+                header = f.read(HEADER_SIZE)
+            with open(self.table_path, 'r', encoding='utf-8') as f:
+                table = json.load(f)
+        except Exception as e:
+            print(f"Gallery store error: {e}")
+            return None
+        
+        if len(header) < HEADER_SIZE:
+            print("Gallery store header is truncated")
+            return None
+        magic, version, dim, _, count, generation, model = HEADER.unpack_from(header)
+        if magic != MAGIC or version != FORMAT_VERSION or dim != self.dim:
+            print("Gallery store format changed, rebuilding")
+            return None
+        if model.rstrip(b"\0") != self._model_bytes():
+            print("Face model changed, rebuilding gallery store")
+            return None
+        if table.get('generation') != generation:
+            print("Gallery store and table are out of sync, rebuilding")
+            return None
+        
+        # Rows a crashed append wrote to the table but never committed
+        table['entries'] = {
+            key: entry for key, entry in table['entries'].items()
+            if entry[0] < count
+        }
+        
+        self.count = count
+        self.generation = generation
+        if count == 0:
+            return np.empty((0, self.dim), dtype=np.float32), table
+        
+        # Copy-on-write: the gallery may edit rows in memory, never the file
+        matrix = np.memmap(self.path, dtype=np.float32, mode='c',
+                           offset=HEADER_SIZE, shape=(count, self.dim))
+        return matrix, table
+    
+    def write(self, matrix: np.ndarray, entries: Dict):
+        """Replace both files with a fresh generation."""
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32).reshape(-1, self.dim)
+        generation = secrets.randbits(63)
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, self.dim, 0, len(matrix),
+                             generation, self._model_bytes())
+        header += b"\0" * (HEADER_SIZE - len(header))
+        
+        _fsync_write(self.path, header + matrix.tobytes())
+        self._write_table(entries, generation)
+        self.count = len(matrix)
+        self.generation = generation
+    
+    def append(self, rows: np.ndarray, entries: Dict):
+        """Append rows at self.count.. and commit them with the new table."""
+        rows = np.ascontiguousarray(rows, dtype=np.float32).reshape(-1, self.dim)
+        new_count = self.count + len(rows)
+        
+        with open(self.path, 'r+b') as f:
+            # 1. rows beyond the committed count are invisible to readers
+            f.seek(HEADER_SIZE + self.count * self.dim * 4)
+            f.write(rows.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+            
+            # 2. table that references them
+            self._write_table(entries, self.generation)
+            
+            # 3. commit by bumping the count
+            f.seek(COUNT_OFFSET)
+            f.write(struct.pack("<Q", new_count))
+            f.flush()
+            os.fsync(f.fileno())
+        
+        self.count = new_count
+    
+    def write_table(self, entries: Dict):
+        """Rewrite only the table (e.g. after deletions)."""
+        self._write_table(entries, self.generation)
+    
+    def _write_table(self, entries: Dict, generation: int):
+        table = {'generation': generation, 'entries': entries}
+        _fsync_write(self.table_path, json.dumps(table, separators=(',', ':')).encode('utf-8'))
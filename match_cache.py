@@ -0,0 +1,146 @@
+"""
+Recognition result cache
+The same student's embedding arrives frame after frame with nearly the
+same values; a probe that lands within a small radius of a recent one
+reuses that decision instead of matching the whole gallery again. Probes
+are bucketed by random-hyperplane LSH, entries expire after a TTL and are
+evicted least-recently-used, and everything is dropped when the gallery
+changes
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+Match = Tuple[Optional[str], float]
+
+
+class MatchCache:
+    """LRU/TTL cache of best_matches decisions in front of any matcher.
+    
+    Only decisions at least radius away from the tolerance are stored, so
+    a probe within radius of a cached one gets the same accept/reject
+    verdict. Which person it names is not guarded: with two enrolled
+    people within 2 * radius of each other a hit can return the one that
+    is now second best, until the entry expires. A cached hit returns the
+    earlier (name, distance).
+    """
+    
+    def __init__(self, radius: float = 0.08, ttl: float = 5.0, max_entries: int = 512,
+                 bits: int = 10, dim: int = 128, seed: int = 0):
+        self.radius = radius
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._planes = np.random.default_rng(seed).normal(size=(dim, bits)).astype(np.float32)
+        self._powers = 1 << np.arange(bits)
+        self._lock = threading.Lock()
+        # bucket -> [(probe, match, stored_at)], most recently used bucket last
+        self._buckets: "OrderedDict[int, list]" = OrderedDict()
+        self._entries = 0
+        self._matcher = None
+        self._source: Optional[Tuple[int, float]] = None  # (matcher version, tolerance)
+        
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.match_time = 0.0  # seconds spent matching the misses
+    
+    def _buckets_of(self, probes: np.ndarray) -> np.ndarray:
+        return ((probes @ self._planes) > 0) @ self._powers
+    
+    def _check_source(self, matcher, tolerance: float):
+        """Drop everything if the matcher, its contents or the tolerance changed."""
+        source = (getattr(matcher, 'version', 0), tolerance)
+        if matcher is not self._matcher or source != self._source:
+            if self._entries:
+                self.invalidations += 1
+            self._buckets.clear()
+            self._entries = 0
+            self._matcher = matcher
+            self._source = source
+    
+    def _lookup(self, bucket: int, probe: np.ndarray, now: float) -> Optional[Match]:
+        entries = self._buckets.get(bucket)
+        if not entries:
+            return None
+        live = [entry for entry in entries if now - entry[2] <= self.ttl]
+        self._entries -= len(entries) - len(live)
+        if not live:
+            del self._buckets[bucket]
+            return None
+        self._buckets[bucket] = live
+        self._buckets.move_to_end(bucket)
+        
+        cached = np.array([entry[0] for entry in live])
+        distances = np.sqrt(((cached - probe) ** 2).sum(axis=1))
+        nearest = int(distances.argmin())
+        return live[nearest][1] if distances[nearest] <= self.radius else None
+    
+    def _store(self, bucket: int, probe: np.ndarray, match: Match, now: float):
+        self._buckets.setdefault(bucket, []).append((probe, match, now))
+        self._buckets.move_to_end(bucket)
+        self._entries += 1
+        while self._entries > self.max_entries:
+            _, evicted = self._buckets.popitem(last=False)
+            self._entries -= len(evicted)
+    
+    def best_matches(self, matcher, probes, tolerance: float) -> List[Match]:
+        """matcher.best_matches(probes, tolerance), answering repeated probes from the cache."""
+        probes = np.asarray(probes, dtype=np.float32).reshape(-1, self._planes.shape[0])
+        if not len(probes):
+            return []
+        now = time.monotonic()
+        buckets = self._buckets_of(probes)
+        
+        results: List[Optional[Match]] = [None] * len(probes)
+        with self._lock:
+            self._check_source(matcher, tolerance)
+            source = self._source
+            for i, (bucket, probe) in enumerate(zip(buckets, probes)):
+                results[i] = self._lookup(int(bucket), probe, now)
+        
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            start = time.perf_counter()
+            matches = matcher.best_matches(probes[missing], tolerance)
+            elapsed = time.perf_counter() - start
+        
+        with self._lock:
+            self.hits += len(probes) - len(missing)
+            self.misses += len(missing)
+            if missing:
+                self.match_time += elapsed
+                # Matched against a gallery that changed meanwhile: answer, but don't keep
+                current = (matcher is self._matcher and self._source == source
+                           and getattr(matcher, 'version', 0) == source[0])
+                for i, match in zip(missing, matches):
+                    results[i] = match
+                    # A decision this close to the tolerance could flip for a nearby probe
+                    if current and abs(match[1] - tolerance) > self.radius:
+                        self._store(int(buckets[i]), probes[i], match, now)
+        return results
+    
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._entries = 0
+    
+    def stats(self) -> Dict:
+        """Hit rate and the matching time the hits saved (at the misses' mean cost)."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            per_probe = self.match_time / self.misses if self.misses else 0.0
+            return {
+                'entries': self._entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'match_ms_per_probe': per_probe * 1000,
+                'saved_ms': self.hits * per_probe * 1000
+            }
@@ -0,0 +1,263 @@
+"""
+Per-stage latency metrics for the video pipeline
+Fixed log-spaced histograms (constant memory, O(1) record) for capture,
+conversion, detection, encoding, matching, drawing, rendering and
+attendance writes, a JSON dump / local HTTP endpoint, and a sampling
+profiler that can be switched on while the app runs
+"""
+
+import collections
+import json
+import math
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class LatencyHistogram:
+    """Durations in log-spaced buckets from 10 us to 100 s (~5% wide)."""
+    
+    MIN_SECONDS = 1e-5
+    BUCKETS_PER_DECADE = 48
+    DECADES = 7
+    
+    def __init__(self):
+        self._counts = [0] * (self.BUCKETS_PER_DECADE * self.DECADES + 2)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def _bucket(self, seconds: float) -> int:
+        if seconds < self.MIN_SECONDS:
+            return 0
+        bucket = int(math.log10(seconds / self.MIN_SECONDS) * self.BUCKETS_PER_DECADE) + 1
+        return min(bucket, len(self._counts) - 1)
+    
+    def record(self, seconds: float):
+        bucket = self._bucket(seconds)
+        with self._lock:
+            self._counts[bucket] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+    
+    def percentiles(self, quantiles=(0.5, 0.95, 0.99)) -> List[float]:
+        """Upper bucket edge (seconds) at each quantile."""
+        with self._lock:
+            counts = list(self._counts)
+            count = self.count
+        if not count:
+            return [0.0] * len(quantiles)
+        cumulative = np.cumsum(counts)
+        buckets = np.searchsorted(cumulative, [q * count for q in quantiles])
+        return [self.MIN_SECONDS * 10 ** (int(b) / self.BUCKETS_PER_DECADE) for b in buckets]
+    
+    def summary(self) -> Dict[str, float]:
+        """Count, mean and p50/p95/p99/max in milliseconds."""
+        p50, p95, p99 = self.percentiles()
+        return {
+            'count': self.count,
+            'mean_ms': self.total * 1000 / max(self.count, 1),
+            'p50_ms': p50 * 1000,
+            'p95_ms': p95 * 1000,
+            'p99_ms': p99 * 1000,
+            'max_ms': self.max * 1000
+        }
+
+
+class PipelineMetrics:
+    """Named latency histograms, created on first use."""
+    
+    # Display order; other stages follow alphabetically
+    STAGES = ['capture', 'convert', 'resize', 'detect', 'quality', 'encode', 'match', 'process',
+              'draw', 'render', 'attendance_write']
+    
+    def __init__(self):
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+    
+    def histogram(self, stage: str) -> LatencyHistogram:
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, LatencyHistogram())
+        return histogram
+    
+    def record(self, stage: str, seconds: float):
+        """Add one duration for stage."""
+        self.histogram(stage).record(seconds)
+    
+    @contextmanager
+    def time(self, stage: str):
+        """with metrics.time('detect'): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+    
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self.started = time.time()
+    
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Summary per stage, in pipeline order."""
+        # A copy, so stages added or a reset() meanwhile don't change it under us
+        with self._lock:
+            histograms = dict(self._histograms)
+        order = {stage: i for i, stage in enumerate(self.STAGES)}
+        stages = sorted(histograms, key=lambda s: (order.get(s, len(order)), s))
+        return {stage: histograms[stage].summary() for stage in stages}
+    
+    def to_json(self) -> str:
+        return json.dumps({
+            'since': self.started,
+            'seconds': time.time() - self.started,
+            'stages': self.snapshot()
+        }, indent=2)
+    
+    def dump(self, path: Path) -> Path:
+        """Write the snapshot as JSON."""
+        path = Path(path)
+        path.write_text(self.to_json(), encoding='utf-8')
+        return path
+
+
+# Shared by every stage of the process
+METRICS = PipelineMetrics()
+
+
+class SamplingProfiler(threading.Thread):
+    """Samples every thread's stack every interval seconds.
+    
+    Unlike cProfile it sees all threads (capture, workers, encoder, writer)
+    and costs the same whether or not the sampled code is hot.
+    """
+    
+    def __init__(self, interval: float = 0.005):
+        super().__init__(name="profiler", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self.samples = 0
+        self.leaf = collections.Counter()  # time spent in the function itself
+        self.inclusive = collections.Counter()  # time with the function on the stack
+    
+    def run(self):
+        me = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = traceback.extract_stack(frame)
+                if not stack:
+                    continue
+                names = [f"{Path(f.filename).name}:{f.lineno} {f.name}" for f in stack]
+                self.leaf[names[-1]] += 1
+                for name in set(f"{Path(f.filename).name} {f.name}" for f in stack):
+                    self.inclusive[name] += 1
+            self.samples += 1
+    
+    def stop(self) -> str:
+        """Stop sampling and return the report."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        return self.report()
+    
+    def report(self, top: int = 25) -> str:
+        samples = max(self.samples, 1)
+        lines = [f"{self.samples} samples every {self.interval * 1000:.0f} ms", "", "Self (line):"]
+        lines += [f"{count / samples:7.1%}  {name}" for name, count in self.leaf.most_common(top)]
+        lines += ["", "Inclusive (function):"]
+        lines += [f"{count / samples:7.1%}  {name}" for name, count in self.inclusive.most_common(top)]
+        return "\n".join(lines)
+
+
+class Profiling:
+    """Runtime on/off switch around SamplingProfiler; reports go to files."""
+    
+    def __init__(self, directory: Path = Path(".")):
+        self.directory = Path(directory)
+        self._profiler: Optional[SamplingProfiler] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def active(self) -> bool:
+        return self._profiler is not None
+    
+    def start(self):
+        with self._lock:
+            if self._profiler is None:
+                self._profiler = SamplingProfiler()
+                self._profiler.start()
+    
+    def stop(self) -> Optional[Path]:
+        """Stop and write profile_YYYYmmdd_HHMMSS.txt; returns its path."""
+        with self._lock:
+            profiler, self._profiler = self._profiler, None
+        if profiler is None:
+            return None
+        path = self.directory / f"profile_{time.strftime('%Y%m%d_%H%M%S')}.txt"
+        path.write_text(profiler.stop(), encoding='utf-8')
+        return path
+    
+    def toggle(self) -> Optional[Path]:
+        """Start if stopped; stop (returning the report path) if running."""
+        if self.active:
+            return self.stop()
+        self.start()
+        return None
+
+
+class MetricsServer(threading.Thread):
+    """Local HTTP endpoint: GET /metrics (JSON), /profile/start, /profile/stop."""
+    
+    def __init__(self, port: int, metrics: PipelineMetrics = METRICS,
+                 profiling: Optional[Profiling] = None, host: str = "127.0.0.1"):
+        super().__init__(name="metrics", daemon=True)
+        profiling = profiling or Profiling()
+        self.profiling = profiling
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = metrics.to_json()
+                elif self.path == "/profile/start":
+                    profiling.start()
+                    body = json.dumps({'profiling': True})
+                elif self.path == "/profile/stop":
+                    path = profiling.stop()
+                    body = json.dumps({'profiling': False, 'report': str(path) if path else None})
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+    
+    def run(self):
+        self.server.serve_forever()
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Offline attendance from recorded video
+Splits each video into segments, decodes every Nth frame of a segment in
+a worker process, and writes the first sighting of each student to the
+same session CSV the live app produces
+"""
+
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from attendance_sink import ATTENDANCE_HEADER, attendance_row, session_file_path
+from encoding_cache import EncodingCache, encode_image_file, encoder_model_id, list_face_images
+
+
+VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mkv', '.mov', '.webm', '.m4v']
+
+# Per-process state set up once by init_worker
+_worker: Dict = {}
+
+
+def find_videos(sources: List[Path]) -> List[Path]:
+    """Video files given directly or found (recursively) in directories."""
+    videos = []
+    for source in sources:
+        if source.is_dir():
+            videos.extend(sorted(
+                path for path in source.rglob("*")
+                if path.is_file() and path.suffix.lower() in VIDEO_EXTENSIONS
+            ))
+        else:
+            videos.append(source)
+    return videos
+
+
+def video_info(path: Path) -> Tuple[int, float]:
+    """(frame count, fps) from the container; the count is 0 if unknown."""
+    import cv2
+    capture = cv2.VideoCapture(str(path))
+    if not capture.isOpened():
+        raise RuntimeError(f"Could not open video: {path}")
+    try:
+        count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        return max(count, 0), fps
+    finally:
+        capture.release()
+
+
+def iter_frames(path: Path, stride: int = 1, start: int = 0,
+                end: Optional[int] = None) -> Iterator[Tuple[int, float, object]]:
+    """Yield (frame_index, seconds, frame) for every stride-th frame in [start, end).
+    
+    Skipped frames are only grabbed, not decoded into images.
+    """
+    import cv2
+    capture = cv2.VideoCapture(str(path))
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    if start:
+        capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+    
+    index = start
+    try:
+        while end is None or index < end:
+            if (index - start) % stride:
+                if not capture.grab():
+                    break
+            else:
+                ret, frame = capture.read()
+                if not ret:
+                    break
+                yield index, index / fps, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def sync_gallery(known_faces_dir: Path) -> int:
+    """Encode new or changed photos into the stored gallery; returns its face count.
+    
+    Runs once in the parent before the workers map the store. No
+    RecognitionEngine: it would start threads before the fork and resume
+    a pending live session.
+    """
+    cache = EncodingCache(known_faces_dir / "encodings.fgal", encoder_model_id(),
+                          legacy_file=known_faces_dir / "encodings.pkl")
+    cache.load()
+    cache.sync(list_face_images(known_faces_dir), encode_image_file)
+    # Rows of deleted or changed photos are dropped here, so the workers
+    # only ever read the store
+    cache.compact()
+    return len(cache.rows()[1])
+
+
+def load_student_ids(students_file: Path) -> Dict[str, str]:
+    """name -> student ID from students.csv."""
+    if not students_file.exists():
+        return {}
+    with open(students_file, 'r', encoding='utf-8') as f:
+        rows = [(row.get('name', '').strip(), row.get('student_id', '').strip())
+                for row in csv.DictReader(f)]
+    return {name: student_id for name, student_id in rows if name}
+
+
+def init_worker(known_faces_dir: str, detector: str, tolerance: float,
+                scale: float, upsample: int, encode_batch: int = 32, quality_gate: bool = True):
+    """Load the detector and map the gallery once per worker process."""
+    import cv2
+    from face_detectors import create_detector
+    from face_encoder import FaceEncoder
+    from face_gallery import FaceGallery
+    from face_index import create_index
+    from face_quality import QualityGate
+    
+    # One process per core already; nested OpenCV threads would oversubscribe
+    cv2.setNumThreads(1)
+    
+    # load() never writes, so the workers can all map the store at once
+    cache = EncodingCache(Path(known_faces_dir) / "encodings.fgal", encoder_model_id())
+    cache.load()
+    encodings, names, keys = cache.rows()
+    
+    kwargs = {'upsample': upsample} if detector in ("hog", "cnn") else {}
+    _worker.update(
+        detector=create_detector(detector, **kwargs),
+        encoder=FaceEncoder(),
+        encode_batch=encode_batch,
+        quality=QualityGate() if quality_gate else None,
+        gallery=FaceGallery.from_encodings(encodings, names, keys, index=create_index("auto", len(names))),
+        tolerance=tolerance,
+        scale=scale
+    )
+
+
+def scan_segment(args: Tuple[str, int, Optional[int], int]) -> Tuple[List[Tuple[float, str, float]], int, int]:
+    """Worker: recognized faces in a segment.
+    
+    Returns ((seconds, name, confidence) per sighting, faces detected,
+    faces the quality gate kept from the encoder).
+    """
+    path, start, end, stride = args
+    import cv2
+    
+    detector = _worker['detector']
+    encoder = _worker['encoder']
+    quality = _worker['quality']
+    scale = _worker['scale']
+    
+    sightings = []
+    chips = []
+    chip_times = []
+    detected = 0
+    skipped = 0
+    
+    def flush():
+        # One encoder call for the chips of several frames
+        encodings = encoder.encode_chips(chips)
+        matches = _worker['gallery'].best_matches(encodings, _worker['tolerance'])
+        for seconds, (name, distance) in zip(chip_times, matches):
+            if name is not None:
+                sightings.append((seconds, name, (1 - distance) * 100))
+        chips.clear()
+        chip_times.clear()
+    
+    for _, seconds, frame in iter_frames(Path(path), stride, start, end):
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if scale != 1.0:
+            rgb_frame = cv2.resize(rgb_frame, (0, 0), fx=scale, fy=scale)
+        
+        locations = detector.detect(rgb_frame)
+        detected += len(locations)
+        if quality is not None and locations:
+            # Too small, blurry or turned away to ever match: not worth encoding.
+            # Judged at full resolution, where the gate's thresholds are set
+            full_size = [tuple(int(v / scale) for v in box) for box in locations]
+            keep = quality.filter(frame, full_size, bgr=True)
+            skipped += len(locations) - len(keep)
+            locations = [locations[i] for i in keep]
+        if not locations:
+            continue
+        chips.extend(encoder.chips(rgb_frame, locations))
+        chip_times.extend([seconds] * len(locations))
+        if len(chips) >= _worker['encode_batch']:
+            flush()
+    if chips:
+        flush()
+    return sightings, detected, skipped
+
+
+def segments(path: Path, frame_count: int, fps: float, stride: int,
+             segment_seconds: float) -> List[Tuple[str, int, Optional[int], int]]:
+    """Split a video into stride-aligned (path, start, end, stride) jobs."""
+    if frame_count <= 0:
+        # Unknown length (some streams/containers): decode in one piece
+        return [(str(path), 0, None, stride)]
+    length = max(stride, int(segment_seconds * fps) // stride * stride)
+    return [(str(path), start, min(start + length, frame_count), stride)
+            for start in range(0, frame_count, length)]
+
+
+def process_video(executor: ProcessPoolExecutor, student_ids: Dict[str, str], attendance_dir: Path,
+                  video: Path, session_name: str, start: Optional[datetime], stride: int,
+                  segment_seconds: float, file_name: Optional[str] = None) -> dict:
+    """Scan one video and write its attendance CSV; returns a summary dict.
+    
+    file_name replaces session_name in the CSV's file name (not its rows).
+    """
+    frame_count, fps = video_info(video)
+    duration = frame_count / fps if frame_count else 0.0
+    if start is None:
+        # The file is usually written until the recording stops
+        start = datetime.fromtimestamp(video.stat().st_mtime) - timedelta(seconds=duration)
+    
+    began = time.perf_counter()
+    present: Dict[str, list] = {}
+    detected = 0
+    skipped = 0
+    jobs = segments(video, frame_count, fps, stride, segment_seconds)
+    for sightings, faces, rejected in executor.map(scan_segment, jobs):
+        detected += faces
+        skipped += rejected
+        for seconds, name, confidence in sightings:
+            student_id = student_ids.get(name, '')
+            key = student_id or name
+            # Segments come back in order, so the first sighting wins
+            if key not in present:
+                present[key] = [seconds, name, student_id, confidence]
+    elapsed = time.perf_counter() - began
+    
+    session_file = session_file_path(attendance_dir, file_name or session_name, start)
+    with open(session_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(ATTENDANCE_HEADER)
+        for seconds, name, student_id, confidence in sorted(present.values(), key=lambda row: row[0]):
+            writer.writerow(attendance_row(session_name, start + timedelta(seconds=seconds),
+                                           name, student_id, confidence))
+    
+    return {
+        'video': video,
+        'file': session_file,
+        'present': sorted(present.values(), key=lambda row: row[0]),
+        'duration': duration,
+        'seconds': elapsed,
+        'faces': detected,
+        'skipped': skipped
+    }
+
+
+def print_summary(summary: dict):
+    """Human-readable report for one video."""
+    duration = summary['duration']
+    seconds = summary['seconds']
+    speed = f", {duration / seconds:.1f}x real time" if duration and seconds > 0 else ""
+    print(f"{summary['video']}: {len(summary['present'])} student(s) present "
+          f"({duration:.0f}s of video in {seconds:.1f}s{speed})")
+    for offset, name, student_id, confidence in summary['present']:
+        print(f"  {timedelta(seconds=int(offset))}  {name} (ID: {student_id or '-'}) {confidence:.1f}%")
+    if summary['skipped']:
+        print(f"  Quality gate skipped {summary['skipped']} of {summary['faces']} face(s) "
+              f"({summary['skipped'] / summary['faces']:.0%} fewer encodings)")
+    print(f"  -> {summary['file']}")
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Take attendance from recorded video files")
+    parser.add_argument("sources", type=Path, nargs="+", help="video files or directories of videos")
+    parser.add_argument("--session", help="session name (default: the video file name)")
+    parser.add_argument("--start", help="recording start 'YYYY-MM-DD HH:MM:SS' (default: from file time)")
+    parser.add_argument("--stride", type=int, default=15, help="analyze every Nth frame")
+    parser.add_argument("--segment-seconds", type=float, default=60.0,
+                        help="video length handed to a worker at a time")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--known-faces", type=Path, default=Path("known_faces"))
+    parser.add_argument("--attendance-dir", type=Path, default=Path("attendance_records"))
+    parser.add_argument("--students", type=Path, default=Path("students.csv"))
+    parser.add_argument("--tolerance", type=float, default=0.6)
+    parser.add_argument("--detector", choices=["hog", "cnn", "ssd"], default="hog")
+    parser.add_argument("--scale", type=float, default=0.5, help="downscale factor before detection")
+    parser.add_argument("--upsample", type=int, default=1)
+    parser.add_argument("--encode-batch", type=int, default=32, help="faces per encoder call")
+    parser.add_argument("--no-quality-gate", action="store_true",
+                        help="encode every detected face, however small, blurry or turned away")
+    args = parser.parse_args()
+    
+    videos = find_videos(args.sources)
+    if not videos:
+        parser.error("No video files found")
+    start = datetime.strptime(args.start, "%Y-%m-%d %H:%M:%S") if args.start else None
+    
+    # Brings the stored gallery up to date once, before the workers map it
+    args.known_faces.mkdir(exist_ok=True)
+    if not sync_gallery(args.known_faces):
+        parser.error(f"No registered faces in {args.known_faces}")
+    student_ids = load_student_ids(args.students)
+    args.attendance_dir.mkdir(exist_ok=True)
+    
+    init_args = (str(args.known_faces), args.detector, args.tolerance, args.scale,
+                 args.upsample, args.encode_batch, not args.no_quality_gate)
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=init_args) as executor:
+        for video in videos:
+            session_name = args.session or video.stem
+            # One --session over several videos: keep each video's CSV apart
+            file_name = f"{session_name}_{video.stem}" if args.session and len(videos) > 1 else None
+            try:
+                summary = process_video(executor, student_ids, args.attendance_dir, video, session_name,
+                                        start, args.stride, args.segment_seconds, file_name)
+            except Exception as e:
+                print(f"{video}: {e}")
+                continue
+            print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
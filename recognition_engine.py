@@ -0,0 +1,781 @@
+#!/usr/bin/env python3
+"""
+Headless recognition engine
+Owns the gallery, detectors, per-stream trackers and schedulers, the
+student table and the attendance session; process(frame) turns a BGR
+frame into face results. No Tk dependency, so it runs on servers and
+edge boxes as well as under the desktop UI
+"""
+
+import argparse
+import csv
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from attendance_sink import AttendanceWriter, attendance_row, create_sink, pending_session
+from encoding_cache import EncodingCache, encode_image_file, encoder_model_id, list_face_images, unique_photo_path
+from face_detectors import create_detector
+from face_encoder import BatchEncoder, FaceEncoder
+from face_gallery import FaceGallery
+from face_index import create_index
+from face_prototypes import IdentityPrototypes
+from face_quality import QualityGate
+from face_tracking import FaceTracker
+from match_cache import MatchCache
+from pipeline_metrics import METRICS, MetricsServer, Profiling
+from recognition_scheduler import AdaptiveScheduler
+from sqlite_store import SQLiteStore
+from video_pipeline import FramePool, StreamPool
+
+
+class StreamState:
+    """Tracker, scheduler and detector belonging to one video stream."""
+    
+    def __init__(self, detector, detect_interval: int, visual_tracker: Optional[str],
+                 latency_budget_ms: float, vote_frames: int = 1):
+        # Own detector: the scheduler changes its upsample per stream
+        self.detector = detector
+        self.tracker = FaceTracker(detect_interval=detect_interval, visual_tracker=visual_tracker,
+                                   min_votes=vote_frames)
+        self.scheduler = AdaptiveScheduler(
+            target_ms=latency_budget_ms,
+            detect_interval=detect_interval,
+            max_upsample=getattr(detector, 'upsample', 0)
+        )
+
+
+class RecognitionEngine:
+    """Face registration, recognition and attendance without a GUI."""
+    
+    def __init__(self, known_faces_dir: Path = Path("known_faces"),
+                 attendance_dir: Path = Path("attendance_records"),
+                 student_info_file: Path = Path("students.csv"),
+                 tolerance: float = 0.6, gallery_index: str = "auto",
+                 detector_backend: str = "hog", detector_confidence: Optional[float] = None,
+                 detect_interval: int = 5, visual_tracker: Optional[str] = None,
+                 latency_budget_ms: float = 40, encode_batch: int = 32,
+                 encode_wait_ms: float = 5.0, attendance_sink: str = "csv",
+                 store_file: Optional[Path] = None, match_strategy: str = "all",
+                 prototypes_k: int = 3, max_samples: Optional[int] = None, vote_frames: int = 3,
+                 quality_gate: bool = True, match_cache: bool = True, progress: Optional[Callable[[str], None]] = None):
+        # Paths
+        self.known_faces_dir = Path(known_faces_dir)
+        self.known_faces_dir.mkdir(exist_ok=True)
+        self.attendance_dir = Path(attendance_dir)
+        self.attendance_dir.mkdir(exist_ok=True)
+        self.student_info_file = Path(student_info_file)
+        
+        # Optional SQLite store; students.csv and the session CSVs are imported on first use
+        self.store = SQLiteStore(store_file) if store_file else None
+        
+        # Settings
+        self.tolerance = tolerance  # Lower = stricter (0.4-0.7 recommended)
+        self.gallery_index = gallery_index  # auto, brute, ivf, ivfpq
+        self.match_strategy = match_strategy  # all, centroid, medoids (per-identity prototypes)
+        self.prototypes_k = prototypes_k  # medoids per person
+        self.max_samples = max_samples  # cap on samples per person for 'all'; None = every photo
+        self.detector_backend = detector_backend  # hog, cnn, ssd
+        self.detector_confidence = detector_confidence  # None = backend default
+        self.detect_interval = detect_interval  # initial detector stride per stream
+        self.visual_tracker = visual_tracker  # None, 'kcf' or 'csrt' (needs opencv-contrib)
+        self.latency_budget_ms = latency_budget_ms  # recognition work allowed per frame
+        self.vote_frames = vote_frames  # agreeing encodings before a track's identity counts
+        self.attendance_sink = attendance_sink  # csv, jsonl, sqlite
+        
+        # Data
+        self.gallery = FaceGallery()  # every enrolled sample
+        self.matcher = self.gallery  # what probes are matched against
+        # Repeated probes of the same face reuse the last decision; cleared when the matcher changes
+        self.match_cache = MatchCache() if match_cache else None
+        self.encoding_cache: Optional[EncodingCache] = None
+        self.student_info: Dict[str, Dict[str, str]] = {}
+        self.present_students: Dict[str, Dict] = {}
+        
+        # Session
+        self.session_active = False
+        self.session_name = ""
+        self.session_file: Optional[Path] = None
+        self.session_start: Optional[datetime] = None
+        self.attendance_writer: Optional[AttendanceWriter] = None
+        self.session_error: Optional[str] = None  # why the last ended session may be incomplete
+        
+        # Streams share the session, so attendance from any camera is de-duplicated
+        self.streams: Dict[object, StreamState] = {}
+        self._streams_lock = threading.Lock()
+        
+        # process() runs on worker threads while clients read the session
+        self._session_lock = threading.RLock()
+        
+        # Scratch RGB frames for detection/encoding, reused across frames and streams
+        self.frame_pool = FramePool(max_buffers=16)
+        
+        # Startup steps are reported so a UI can show them while it loads
+        progress = progress or (lambda step: None)
+        
+        # Size/blur/exposure/pose checks before the encoder; None encodes every face
+        progress("Loading face models")
+        self.quality = QualityGate() if quality_gate else None
+        # Stricter, separately counted checks for the photo saved at registration
+        self.registration_gate = QualityGate(min_size=80, min_sharpness=30.0, max_yaw=0.2, max_roll=15.0)
+        
+        # Faces from all streams share encoder batches (max size / max wait)
+        self.encoder = BatchEncoder(FaceEncoder(), max_batch=encode_batch, max_wait_ms=encode_wait_ms)
+        self.encoder.start()
+        
+        # Load data
+        progress(f"Loading {self.detector_backend.upper()} detector")
+        self.detector = self.load_detector()
+        progress("Loading known faces")
+        self.load_known_faces()
+        progress("Loading students")
+        self.load_student_info()
+        self.recover_session()
+    
+    # Gallery
+    
+    def load_known_faces(self, force_rebuild=False):
+        """Load face encodings, encoding only images the cache hasn't seen."""
+        cache = EncodingCache(
+            self.known_faces_dir / "encodings.fgal",
+            encoder_model_id(),
+            legacy_file=self.known_faces_dir / "encodings.pkl"
+        )
+        if not force_rebuild and cache.load():
+            # The engine owns known_faces/: drop deleted rows before mapping
+            cache.compact()
+        
+        # Map the stored gallery as-is (zero-copy), then apply what changed on disk
+        self.encoding_cache = cache
+        self.gallery = self.build_gallery(*cache.rows())
+        self.matcher = self.gallery
+        if self.store is not None and not self.store.encoding_count(cache.model_id):
+            self.store.import_encoding_cache(cache)
+        self.refresh_known_faces()
+        self.matcher = self.build_matcher()
+    
+    def refresh_known_faces(self):
+        """Encode new or changed images and update the gallery in place."""
+        cache = self.encoding_cache
+        added, removed = cache.sync(list_face_images(self.known_faces_dir), encode_image_file)
+        if not added and not removed:
+            if not cache.store.exists():
+                cache.save()
+            return
+        self.apply_cache_changes(added, removed)
+    
+    def apply_cache_changes(self, added: List[str], removed: List[str]):
+        """Move added/removed cache entries into the gallery, the matcher and the store."""
+        cache = self.encoding_cache
+        removed_keys = set(removed)
+        changed = {name for name, key in zip(self.gallery.names, self.gallery.keys) if key in removed_keys}
+        for key in removed:
+            self.gallery.remove_key(key)
+        encodings, names, keys = cache.rows(added)
+        self.gallery.add_many(encodings, names, keys)
+        cache.save()
+        
+        if self.matcher is not self.gallery:
+            # Only the people whose photos changed get new prototypes
+            self.matcher.update(self.gallery, changed.union(names))
+        
+        if self.store is not None:
+            # Mirror just the changed rows
+            self.store.delete_encodings(removed)
+            self.store.put_encodings(
+                (key, name, cache.model_id, cache.entries[key]['size'], cache.entries[key]['mtime'], encoding)
+                for key, name, encoding in zip(keys, names, encodings)
+            )
+    
+    def _matches_samples(self) -> bool:
+        return self.match_strategy == "all" and not self.max_samples
+    
+    def build_gallery(self, encodings, names, keys=None):
+        """Create the sample gallery; it gets the search index when probes are matched against it."""
+        index = create_index(self.gallery_index, len(encodings)) if self._matches_samples() else None
+        return FaceGallery.from_encodings(encodings, names, keys, index=index)
+    
+    def build_matcher(self):
+        """The sample gallery itself, or per-identity prototypes built from it."""
+        if self._matches_samples():
+            return self.gallery
+        matcher = IdentityPrototypes(self.match_strategy, self.prototypes_k, self.max_samples,
+                                     index=create_index(self.gallery_index, len(set(self.gallery.names))))
+        matcher.build(self.gallery)
+        return matcher
+    
+    def load_detector(self):
+        """Create the configured face detector, falling back to HOG."""
+        kwargs = {}
+        if self.detector_confidence is not None:
+            kwargs['confidence'] = self.detector_confidence
+        
+        try:
+            return create_detector(self.detector_backend, **kwargs)
+        except Exception as e:
+            print(f"Detector '{self.detector_backend}' unavailable ({e}), using HOG")
+            return create_detector("hog")
+    
+    def warm_up(self, width: int = 640, height: int = 480):
+        """Run the detector and encoder once on a blank frame.
+        
+        Lazy model loading and first-call allocations then happen here
+        instead of on the first camera frame.
+        """
+        blank = np.zeros((height, width, 3), dtype=np.uint8)
+        with METRICS.time('warm_up'):
+            self.detector.detect(blank)
+            box = (height // 4, width // 2 + height // 4, height * 3 // 4, width // 2 - height // 4)
+            self.encoder.encode(blank, [box])
+    
+    def registered_people(self) -> List[str]:
+        """Sorted names with at least one encoding in the gallery."""
+        return sorted(self.photo_counts())
+    
+    def photo_counts(self) -> Counter:
+        """Encodings per registered name, counted in one pass."""
+        return Counter(self.gallery.names)
+    
+    def rate_faces(self, frame, padding: int = 20, encode: bool = False) -> List[Dict]:
+        """Faces in a BGR frame scored for registration, best first.
+        
+        Each dict has location and quality (a FaceQuality); faces that pass
+        the registration gate also have face, the padded RGB crop to save.
+        With encode, the best passing face also gets its encoding, computed
+        from the full frame rather than the crop.
+        """
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        with METRICS.time('detect'):
+            locations = self.detector.detect(rgb_frame)
+        
+        faces = []
+        for location in locations:
+            quality = self.registration_gate.assess(rgb_frame, location)
+            face = {'location': location, 'quality': quality}
+            if quality.ok:
+                top, right, bottom, left = location
+                face['face'] = rgb_frame[max(0, top - padding):bottom + padding,
+                                         max(0, left - padding):right + padding].copy()
+            faces.append(face)
+        faces.sort(key=lambda face: face['quality'].score, reverse=True)
+        
+        if encode and faces and 'face' in faces[0]:
+            with METRICS.time('encode'):
+                faces[0]['encoding'] = self.encoder.encode(rgb_frame, [faces[0]['location']])[0]
+        return faces
+    
+    def register_face(self, rgb_face: np.ndarray, name: str, student_id: str) -> Path:
+        """Save a face photo for name, record the student ID and encode it."""
+        filename = unique_photo_path(self.known_faces_dir, name)
+        cv2.imwrite(str(filename), cv2.cvtColor(rgb_face, cv2.COLOR_RGB2BGR))
+        
+        self.student_info[name] = {'student_id': student_id}
+        self.save_student_info(name)
+        
+        # Encode just the new photo
+        self.refresh_known_faces()
+        return filename
+    
+    def register_encodings(self, shots: List[Dict], name: str, student_id: str) -> List[Path]:
+        """Add burst shots (face crop + encoding from rate_faces) for name.
+        
+        The encodings go straight into the gallery; each crop is saved only
+        so its cache entry stays valid, and is never re-detected or re-encoded.
+        """
+        files = []
+        for shot in shots:
+            filename = unique_photo_path(self.known_faces_dir, name)
+            cv2.imwrite(str(filename), cv2.cvtColor(shot['face'], cv2.COLOR_RGB2BGR))
+            self.encoding_cache.put(filename, shot['encoding'], name)
+            files.append(filename)
+        
+        self.student_info[name] = {'student_id': student_id}
+        self.save_student_info(name)
+        self.apply_cache_changes([path.name for path in files], [])
+        return files
+    
+    # Students
+    
+    def load_student_info(self):
+        """Load student information from the store, or from CSV."""
+        if self.store is not None:
+            if not self.store.students():
+                self.store.import_students_csv(self.student_info_file)
+            # Only new or changed session files, e.g. one whose writer outlived end_session
+            self.store.import_attendance_dir(self.attendance_dir)
+            self.student_info.update(self.store.students())
+            return
+        
+        if not self.student_info_file.exists():
+            return
+        
+        try:
+            with open(self.student_info_file, 'r', encoding='utf-8') as f:
+                reader = csv.DictReader(f)
+                for row in reader:
+                    name = row.get('name', '').strip()
+                    student_id = row.get('student_id', '').strip()
+                    if name:
+                        self.student_info[name] = {'student_id': student_id}
+        except Exception as e:
+            print(f"Error loading student info: {e}")
+    
+    def save_student_info(self, name: Optional[str] = None):
+        """Save student information; with a store, only name's row is written."""
+        if self.store is not None:
+            names = [name] if name else list(self.student_info)
+            self.store.upsert_students(
+                (n, self.student_info[n].get('student_id', '')) for n in names if n in self.student_info
+            )
+            return
+        
+        try:
+            with open(self.student_info_file, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['name', 'student_id'])
+                for name, data in sorted(self.student_info.items()):
+                    writer.writerow([name, data.get('student_id', '')])
+        except Exception as e:
+            print(f"Error saving student info: {e}")
+    
+    # Session Management
+    
+    def start_session(self, session_name: str) -> Path:
+        """Open an attendance session; the file is created by the writer thread."""
+        session_name = session_name.strip()
+        if not session_name:
+            raise ValueError("Session name is empty")
+        
+        with self._session_lock:
+            if self.session_active:
+                raise RuntimeError(f"Session '{self.session_name}' is already running")
+            
+            sink = create_sink(self.attendance_sink, self.attendance_dir, session_name, datetime.now(),
+                               self.store.path if self.store is not None else None)
+            self._open_session(sink)
+            self.present_students.clear()
+            return sink.path
+    
+    def _open_session(self, sink):
+        writer = AttendanceWriter(sink)
+        # Raises if the sink can't be opened, leaving the session inactive
+        writer.start()
+        self.attendance_writer = writer
+        self.session_active = True
+        self.session_name = sink.session_name
+        self.session_start = sink.start
+        self.session_file = sink.path
+    
+    def recover_session(self) -> bool:
+        """Resume a session that was still open when the process died."""
+        sink = pending_session(self.attendance_dir)
+        if sink is None:
+            return False
+        
+        with self._session_lock:
+            self.present_students.clear()
+            for session_name, date_str, time_str, name, student_id, conf_str in sink.read():
+                try:
+                    confidence = float(conf_str.rstrip('%'))
+                except ValueError:
+                    confidence = None
+                self.present_students[student_id or name] = {
+                    'name': name,
+                    'student_id': student_id,
+                    'date': date_str,
+                    'time': time_str,
+                    'confidence': confidence
+                }
+            try:
+                self._open_session(sink)
+            except Exception as e:
+                self.present_students.clear()
+                print(f"Could not resume session '{sink.session_name}': {e}")
+                return False
+        print(f"Resumed session '{sink.session_name}' ({len(self.present_students)} present)")
+        return True
+    
+    def end_session(self) -> int:
+        """Close the session, flushing its rows to disk; returns how many were present."""
+        with self._session_lock:
+            if not self.session_active:
+                return 0
+            
+            count = len(self.present_students)
+            self.session_active = False
+            self.session_name = ""
+            self.session_file = None
+            self.session_start = None
+            writer, self.attendance_writer = self.attendance_writer, None
+        
+        # Blocks until the last rows are fsynced
+        if not writer.close():
+            # The store picks the file up on the next start instead
+            self.session_error = f"Attendance writer did not finish {writer.sink.path}: {writer.error or 'still writing'}"
+            print(self.session_error)
+            return count
+        self.session_error = None
+        if self.store is not None and writer.sink.kind == "csv":
+            # Keep the store's reports complete when rows went to a CSV
+            self.store.import_attendance_csv(writer.sink.path)
+        return count
+    
+    def mark_attendance(self, name, student_id, confidence) -> bool:
+        """Mark student as present; True only the first time in a session."""
+        if name == "Unknown":
+            return False
+        
+        with self._session_lock:
+            if not self.session_active:
+                return False
+            
+            key = student_id or name
+            if key in self.present_students:
+                return False
+            
+            now = datetime.now()
+            date_str = now.strftime("%Y-%m-%d")
+            time_str = now.strftime("%H:%M:%S")
+            
+            self.present_students[key] = {
+                'name': name,
+                'student_id': student_id,
+                'date': date_str,
+                'time': time_str,
+                'confidence': confidence
+            }
+            
+            # Queued; the writer thread batches and fsyncs
+            self.attendance_writer.submit(attendance_row(self.session_name, now, name, student_id, confidence))
+            return True
+    
+    def present(self) -> List[Dict]:
+        """Snapshot of the students marked present, sorted by name."""
+        with self._session_lock:
+            return sorted(self.present_students.values(), key=lambda x: x['name'])
+    
+    # Frame Processing
+    
+    def stream(self, stream_id=0) -> StreamState:
+        """Per-stream state, created on first use."""
+        with self._streams_lock:
+            state = self.streams.get(stream_id)
+            if state is None:
+                state = StreamState(self.load_detector(), self.detect_interval,
+                                    self.visual_tracker, self.latency_budget_ms, self.vote_frames)
+                self.streams[stream_id] = state
+            return state
+    
+    def reset(self):
+        """Forget tracked faces (e.g. when the video source or mode changes)."""
+        with self._streams_lock:
+            states = list(self.streams.values())
+        for state in states:
+            state.tracker.reset()
+    
+    def detect_faces(self, frame) -> List[tuple]:
+        """Face boxes in a full-resolution BGR frame."""
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.frame_pool.acquire(frame.shape))
+        try:
+            return self.detector.detect(rgb_frame)
+        finally:
+            self.frame_pool.release(rgb_frame)
+    
+    def process(self, frame, stream_id=0) -> List[Dict]:
+        """Recognize faces in a BGR frame and mark attendance.
+        
+        Returns one dict per tracked face whose identity the vote has
+        committed, with location, name, student_id, confidence, track_id,
+        stream and marked (True on the frame that first marked this person
+        present, on any stream).
+        """
+        faces = self.recognize_faces(frame, stream_id)
+        for face in faces:
+            face['marked'] = self.mark_attendance(face['name'], face['student_id'], face['confidence'])
+        return faces
+    
+    def recognize_faces(self, frame, stream_id=0):
+        """Track faces in a BGR frame, encoding only tracks that need it."""
+        started = time.perf_counter()
+        timings = {}
+        detected = []
+        scaled = {}
+        state = self.stream(stream_id)
+        tracker = state.tracker
+        scheduler = state.scheduler
+        detector = state.detector
+        
+        # Settings chosen by the scheduler from the previous frames
+        scale = scheduler.scale
+        tracker.detect_interval = scheduler.detect_interval
+        
+        def small_frame():
+            # Downscale and color conversion only on frames that detect or encode,
+            # downscaling first so the conversion touches fewer pixels
+            if 'rgb' not in scaled:
+                image = frame
+                if scale != 1.0:
+                    height, width = frame.shape[:2]
+                    shape = (int(round(height * scale)), int(round(width * scale))) + frame.shape[2:]
+                    with METRICS.time('resize'):
+                        image = scaled['bgr'] = cv2.resize(frame, (0, 0), dst=self.frame_pool.acquire(shape),
+                                                           fx=scale, fy=scale)
+                with METRICS.time('convert'):
+                    scaled['rgb'] = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=self.frame_pool.acquire(image.shape))
+            return scaled['rgb']
+        
+        def detect():
+            image = small_frame()
+            if hasattr(detector, 'upsample'):
+                detector.upsample = scheduler.upsample
+            detect_start = time.perf_counter()
+            boxes = detector.detect(image)
+            timings['detect'] = time.perf_counter() - detect_start
+            METRICS.record('detect', timings['detect'])
+            # Scale back up
+            detected.extend(tuple(int(v / scale) for v in box) for box in boxes)
+            return detected
+        
+        try:
+            tracks = tracker.step(frame, detect)
+            
+            now = time.monotonic()
+            pending = [track for track in tracks if tracker.needs_encoding(track, now)]
+            if pending and self.quality is not None:
+                # Judged on the full-resolution frame the thresholds are set for;
+                # a face that fails is left alone until it moves or a retry interval passes
+                with METRICS.time('quality'):
+                    keep = set(self.quality.filter(frame, [track.box for track in pending], bgr=True))
+                for i, track in enumerate(pending):
+                    if i not in keep:
+                        tracker.set_rejected(track, now)
+                pending = [track for i, track in enumerate(pending) if i in keep]
+            if pending:
+                image = small_frame()
+                locations = [tuple(int(v * scale) for v in track.box) for track in pending]
+                encode_start = time.perf_counter()
+                face_encodings = self.encoder.encode(image, locations)
+                timings['encode'] = time.perf_counter() - encode_start
+                METRICS.record('encode', timings['encode'])
+                
+                # One batched match for every face that needs it
+                with METRICS.time('match'):
+                    if self.match_cache is not None:
+                        matches = self.match_cache.best_matches(self.matcher, face_encodings, self.tolerance)
+                    else:
+                        matches = self.matcher.best_matches(face_encodings, self.tolerance)
+                for track, (match_name, distance) in zip(pending, matches):
+                    confidence = None
+                    student_id = ""
+                    if match_name is not None:
+                        confidence = (1 - distance) * 100
+                        student_id = self.student_info.get(match_name, {}).get('student_id', '')
+                    tracker.set_identity(track, match_name, student_id, confidence, now)
+        finally:
+            # Scratch buffers go back to the pool once detection and encoding are done
+            for buffer in scaled.values():
+                self.frame_pool.release(buffer)
+        
+        faces = []
+        for track in tracks:
+            if not track.has_identity:
+                continue
+            faces.append({
+                'location': track.box,
+                'name': track.name or "Unknown",
+                'student_id': track.student_id,
+                'confidence': track.confidence,
+                'track_id': track.track_id,
+                'stream': stream_id
+            })
+        
+        elapsed = time.perf_counter() - started
+        METRICS.record('process', elapsed)
+        timings['other'] = elapsed - timings.get('detect', 0.0) - timings.get('encode', 0.0)
+        scheduler.record(timings, detected if 'detect' in timings else None)
+        
+        return faces
+    
+    def stats(self, stream_id=0) -> Dict[str, Dict]:
+        """Tracking and scheduling counters for one stream, plus encoder batching.
+        
+        A stream that hasn't processed a frame yet has empty tracking and schedule stats.
+        """
+        with self._streams_lock:
+            state = self.streams.get(stream_id)
+        return {
+            'tracking': state.tracker.stats() if state else {},
+            'schedule': state.scheduler.stats() if state else {},
+            'encoder': self.encoder.stats(),
+            'gallery': self.gallery_stats(),
+            'buffers': self.frame_pool.stats(),
+            'quality': self.quality.stats() if self.quality else {},
+            'match_cache': self.match_cache.stats() if self.match_cache else {},
+            'attendance': self.attendance_writer.stats() if self.attendance_writer else {}
+        }
+    
+    def gallery_stats(self) -> Dict:
+        """Identity, sample and prototype counts of the matcher."""
+        if self.matcher is not self.gallery:
+            return self.matcher.stats()
+        people = len(set(self.gallery.names))
+        return {
+            'strategy': self.match_strategy,
+            'identities': people,
+            'samples': len(self.gallery),
+            'prototypes': len(self.gallery),
+            'per_identity': len(self.gallery) / max(people, 1)
+        }
+    
+    def close(self):
+        """End the session and stop background threads."""
+        self.end_session()
+        self.encoder.stop()
+        if self.store is not None:
+            self.store.close()
+
+
+def open_source(source: str):
+    """cv2.VideoCapture for a camera index, stream URL or video file."""
+    capture = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    if not capture.isOpened():
+        raise RuntimeError(f"Could not open video source: {source}")
+    return capture
+
+
+def run(engine: RecognitionEngine, sources: List[str], session: Optional[str] = None,
+        workers: Optional[int] = None, report_every: float = 5.0):
+    """Recognize frames from every source on one shared worker pool.
+    
+    Runs until all file sources have ended or Ctrl+C; live cameras and
+    stream URLs run until interrupted.
+    """
+    def on_results(stream_id, results):
+        for face in results['faces']:
+            if face['marked']:
+                print(f"{datetime.now():%H:%M:%S} [{stream_id}] present: {face['name']} "
+                      f"(ID: {face['student_id'] or '-'}) {face['confidence']:.1f}%", flush=True)
+    
+    pool = StreamPool(lambda stream_id, frame: engine.process(frame, stream_id), workers, on_results)
+    captures = []
+    for source in sources:
+        # Files end, and are read frame by frame; cameras and stream URLs may just hiccup
+        is_file = not source.isdigit() and "://" not in source
+        captures.append(open_source(source))
+        pool.add_stream(source, captures[-1], max_failures=50 if is_file else 0, block=is_file)
+    
+    if engine.session_active:
+        print(f"Continuing session '{engine.session_name}': {engine.session_file}")
+    elif session:
+        print(f"Session file: {engine.start_session(session)}")
+    
+    start = time.perf_counter()
+    pool.start()
+    try:
+        while pool.alive():
+            time.sleep(report_every)
+            for stream_id, stats in pool.stats().items():
+                print(f"  [{stream_id}] {stats['fps']:.1f} fps, {stats['latency_ms']:.0f} ms, "
+                      f"dropped {stats['dropped']}, errors {stats['errors']}", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
+        for capture in captures:
+            capture.release()
+        count = engine.end_session()
+        engine.close()
+    
+    seconds = time.perf_counter() - start
+    frames = sum(stats['frames'] for stats in pool.stats().values())
+    print(f"Processed {frames} frame(s) from {len(sources)} source(s) in {seconds:.1f}s "
+          f"({frames / max(seconds, 1e-6):.1f} fps)")
+    if count:
+        print(f"{count} student(s) present")
+    quality = engine.quality.stats() if engine.quality else {}
+    if quality.get('assessed'):
+        print(f"Quality gate skipped {quality['skipped']} of {quality['assessed']} face(s) "
+              f"({quality['encodings_saved']:.0%} fewer encodings)")
+    cache = engine.match_cache.stats() if engine.match_cache else {}
+    if cache.get('hits'):
+        print(f"Match cache answered {cache['hit_rate']:.0%} of probes, "
+              f"saving {cache['saved_ms']:.0f} ms of matching")
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Run face recognition without the UI")
+    parser.add_argument("--source", action="append",
+                        help="camera index, RTSP URL or video file (repeat for several cameras)")
+    parser.add_argument("--session", help="record attendance under this session name")
+    parser.add_argument("--workers", type=int, default=None, help="recognition threads (default: CPU count)")
+    parser.add_argument("--known-faces", type=Path, default=Path("known_faces"))
+    parser.add_argument("--attendance-dir", type=Path, default=Path("attendance_records"))
+    parser.add_argument("--students", type=Path, default=Path("students.csv"))
+    parser.add_argument("--tolerance", type=float, default=0.6)
+    parser.add_argument("--detector", choices=["hog", "cnn", "ssd"], default="hog")
+    parser.add_argument("--sink", choices=["csv", "jsonl", "sqlite"], default="csv",
+                        help="where attendance rows are written")
+    parser.add_argument("--store", type=Path, default=None,
+                        help="SQLite store for students, encodings and attendance")
+    parser.add_argument("--match", choices=["all", "centroid", "medoids"], default="all",
+                        help="match against every photo, or per-person prototypes")
+    parser.add_argument("--prototypes", type=int, default=3, help="medoids per person for --match medoids")
+    parser.add_argument("--vote-frames", type=int, default=3,
+                        help="agreeing frames before a face's identity is accepted (1 = no smoothing)")
+    parser.add_argument("--no-quality-gate", action="store_true",
+                        help="encode every face, however small, blurry or turned away")
+    parser.add_argument("--no-match-cache", action="store_true",
+                        help="match every probe against the gallery, even near-repeats of a recent one")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve stage latencies at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-file", type=Path, default=None, help="write stage latencies here on exit")
+    parser.add_argument("--profile", action="store_true", help="sample all threads and write a profile on exit")
+    args = parser.parse_args()
+    
+    engine = RecognitionEngine(
+        known_faces_dir=args.known_faces,
+        attendance_dir=args.attendance_dir,
+        student_info_file=args.students,
+        tolerance=args.tolerance,
+        detector_backend=args.detector,
+        attendance_sink=args.sink,
+        store_file=args.store,
+        match_strategy=args.match,
+        prototypes_k=args.prototypes,
+        vote_frames=args.vote_frames,
+        quality_gate=not args.no_quality_gate,
+        match_cache=not args.no_match_cache
+    )
+    if not len(engine.gallery):
+        parser.error(f"No registered faces in {args.known_faces}")
+    
+    profiling = Profiling()
+    server = None
+    if args.metrics_port:
+        # /profile/start and /profile/stop toggle the same profiler
+        server = MetricsServer(args.metrics_port, profiling=profiling)
+        server.start()
+        print(f"Metrics: http://127.0.0.1:{args.metrics_port}/metrics")
+    if args.profile:
+        profiling.start()
+    
+    run(engine, args.source or ["0"], args.session, args.workers)
+    
+    report = profiling.stop()
+    if report:
+        print(f"Profile: {report}")
+    if server:
+        server.stop()
+    if args.metrics_file:
+        print(f"Metrics: {METRICS.dump(args.metrics_file)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Adaptive scheduler for recognition mode
+Measures per-stage latency and adjusts the detection stride, downscale
+factor and upsample count so the average work per frame stays inside a
+latency budget
+"""
+
+from typing import Dict, List, Optional
+
+
+class AdaptiveScheduler:
+    """Picks scale / detect interval / upsample from measured stage latency.
+    
+    The amortized cost of a frame is detect / interval + encode + other.
+    When it exceeds the budget the scheduler first detects less often, then
+    lowers resolution, then stops upsampling; with headroom it walks back.
+    The face count biases resolution: an empty room gets full resolution so
+    small, distant faces are found; a crowded one gets a smaller frame.
+    """
+    
+    SCALES = [0.25, 0.5, 0.75, 1.0]
+    
+    def __init__(self, target_ms: float = 40.0, detect_interval: int = 5,
+                 min_interval: int = 1, max_interval: int = 15, max_upsample: int = 1,
+                 many_faces: int = 6, min_face_px: int = 40,
+                 adjust_every: int = 10, smoothing: float = 0.2):
+        self.target_ms = target_ms
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_upsample = max_upsample
+        self.many_faces = many_faces
+        self.min_face_px = min_face_px
+        self.adjust_every = adjust_every
+        self.smoothing = smoothing
+        
+        # Current decisions
+        self.scale_level = 0
+        self.detect_interval = detect_interval
+        self.upsample = max_upsample
+        self.reason = "start"
+        
+        # Exponentially smoothed measurements (milliseconds)
+        self.detect_ms: Optional[float] = None
+        self.encode_ms = 0.0
+        self.other_ms = 0.0
+        self.faces = 0.0
+        self.smallest_face: Optional[float] = None
+        self._frames = 0
+        self.adjustments = 0
+    
+    @property
+    def scale(self) -> float:
+        return self.SCALES[self.scale_level]
+    
+    def _smooth(self, old: Optional[float], new: float) -> float:
+        return new if old is None else old + self.smoothing * (new - old)
+    
+    def amortized_ms(self) -> float:
+        """Expected average work per frame with the current decisions."""
+        return self.projected_ms(self.scale_level)
+    
+    def projected_ms(self, scale_level: int) -> float:
+        """Amortized cost if detection ran at another scale level."""
+        # Detection cost grows with pixel count
+        ratio = (self.SCALES[scale_level] / self.scale) ** 2
+        detect = (self.detect_ms or 0.0) * ratio
+        return detect / self.detect_interval + self.encode_ms + self.other_ms
+    
+    def record(self, timings: Dict[str, float], boxes: Optional[List] = None):
+        """Feed one frame's stage timings (seconds) and, on detect frames, its boxes."""
+        if 'detect' in timings:
+            self.detect_ms = self._smooth(self.detect_ms, timings['detect'] * 1000)
+        self.encode_ms = self._smooth(self.encode_ms, timings.get('encode', 0.0) * 1000)
+        self.other_ms = self._smooth(self.other_ms, timings.get('other', 0.0) * 1000)
+        
+        if boxes is not None:
+            self.faces = self._smooth(self.faces, len(boxes))
+            if boxes:
+                smallest = min(min(b[1] - b[3], b[2] - b[0]) for b in boxes)
+                self.smallest_face = self._smooth(self.smallest_face, smallest)
+        
+        self._frames += 1
+        if self._frames % self.adjust_every == 0:
+            self._adjust()
+    
+    def _set(self, reason: str, scale_level: Optional[int] = None,
+             interval: Optional[int] = None, upsample: Optional[int] = None):
+        if scale_level is not None and scale_level != self.scale_level:
+            # Re-seed the estimate for the new pixel count
+            if self.detect_ms is not None:
+                self.detect_ms *= (self.SCALES[scale_level] / self.scale) ** 2
+            self.scale_level = scale_level
+        if interval is not None:
+            self.detect_interval = interval
+        if upsample is not None and upsample != self.upsample:
+            # Each upsample doubles both image sides
+            if self.detect_ms is not None:
+                self.detect_ms *= 4.0 ** (upsample - self.upsample)
+            self.upsample = upsample
+        self.reason = reason
+        self.adjustments += 1
+    
+    def _adjust(self):
+        # 1. Resolution the scene asks for
+        crowded = self.faces >= self.many_faces
+        empty = self.faces < 0.5
+        small_faces = (
+            self.smallest_face is not None
+            and self.smallest_face * self.scale < self.min_face_px
+        )
+        top_level = len(self.SCALES) - 1
+        
+        if empty and self.scale_level < top_level and self.projected_ms(top_level) < self.target_ms:
+            self._set("empty room: full resolution", scale_level=top_level)
+        elif crowded and self.scale_level > 0:
+            self._set("crowded: lower resolution", scale_level=self.scale_level - 1)
+        elif small_faces and not crowded and self.scale_level < top_level:
+            self._set("small faces: higher resolution", scale_level=self.scale_level + 1)
+        
+        # 2. Fit the latency budget
+        cost = self.amortized_ms()
+        if cost > self.target_ms:
+            if self.detect_interval < self.max_interval:
+                self._set("over budget: detect less often", interval=min(self.detect_interval * 2, self.max_interval))
+            elif self.scale_level > 0:
+                self._set("over budget: lower resolution", scale_level=self.scale_level - 1)
+            elif self.upsample > 0:
+                self._set("over budget: no upsampling", upsample=self.upsample - 1)
+        elif cost < 0.5 * self.target_ms:
+            if self.upsample < self.max_upsample and small_faces:
+                self._set("headroom: upsample", upsample=self.upsample + 1)
+            elif self.detect_interval > self.min_interval:
+                self._set("headroom: detect more often", interval=max(self.detect_interval // 2, self.min_interval))
+            elif (self.scale_level < top_level and not crowded
+                  and self.projected_ms(self.scale_level + 1) < 0.8 * self.target_ms):
+                self._set("headroom: higher resolution", scale_level=self.scale_level + 1)
+    
+    def stats(self) -> Dict[str, object]:
+        """Current decisions and the measured budget."""
+        return {
+            'scale': self.scale,
+            'detect_interval': self.detect_interval,
+            'upsample': self.upsample,
+            'detect_ms': self.detect_ms or 0.0,
+            'encode_ms': self.encode_ms,
+            'amortized_ms': self.amortized_ms(),
+            'target_ms': self.target_ms,
+            'faces': self.faces,
+            'adjustments': self.adjustments,
+            'reason': self.reason
+        }
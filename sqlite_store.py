@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+SQLite store for students, encodings and attendance
+One WAL-mode database with indexed tables, incremental upserts, bulk import
+of students.csv / the encoding cache / attendance_records/*.csv, and
+parameterized report queries
+"""
+
+import argparse
+import csv
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from attendance_sink import parse_session_file
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    name TEXT PRIMARY KEY,
+    student_id TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS students_id ON students(student_id);
+
+CREATE TABLE IF NOT EXISTS encodings (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    model TEXT NOT NULL,
+    size INTEGER,
+    mtime INTEGER,
+    encoding BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS encodings_name ON encodings(name);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    start TEXT NOT NULL,
+    UNIQUE (start, name)
+);
+
+CREATE TABLE IF NOT EXISTS attendance (
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    date TEXT,
+    time TEXT,
+    person TEXT NOT NULL,
+    student_id TEXT NOT NULL DEFAULT '',
+    confidence REAL,
+    UNIQUE (session_id, person, student_id)
+);
+CREATE INDEX IF NOT EXISTS attendance_student ON attendance(student_id);
+CREATE INDEX IF NOT EXISTS attendance_person ON attendance(person);
+
+CREATE TABLE IF NOT EXISTS imported_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime INTEGER
+);
+"""
+
+def parse_confidence(value) -> Optional[float]:
+    """'93.4%' -> 93.4; '-' or '' -> None."""
+    try:
+        return float(str(value).rstrip('%'))
+    except ValueError:
+        return None
+
+
+class SQLiteStore:
+    """Students, encodings and attendance in one database file.
+    
+    Safe to share between threads; each call runs in its own transaction.
+    synchronous=FULL makes every committed write durable.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+    
+    def _query(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+    
+    # Students
+    
+    def students(self) -> Dict[str, Dict[str, str]]:
+        """name -> {'student_id': ...}, the shape the engine keeps in memory."""
+        return {name: {'student_id': student_id}
+                for name, student_id in self._query("SELECT name, student_id FROM students")}
+    
+    def upsert_students(self, rows: Iterable[Tuple[str, str]]):
+        """Insert or update (name, student_id) pairs."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO students (name, student_id) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET student_id = excluded.student_id",
+                rows
+            )
+    
+    def delete_student(self, name: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM students WHERE name = ?", (name,))
+    
+    # Encodings
+    
+    def put_encodings(self, rows: Iterable[Tuple[str, str, str, int, int, np.ndarray]]):
+        """Insert or replace (key, name, model, size, mtime, encoding) rows."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO encodings VALUES (?, ?, ?, ?, ?, ?)",
+                ((key, name, model, size, mtime, np.asarray(encoding, dtype=np.float32).tobytes())
+                 for key, name, model, size, mtime, encoding in rows)
+            )
+    
+    def delete_encodings(self, keys: Iterable[str]):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM encodings WHERE key = ?", ((key,) for key in keys))
+    
+    def encodings(self, model: str) -> Tuple[np.ndarray, List[str], List[str]]:
+        """(float32 (N, 128) matrix, names, keys) for one encoder model."""
+        rows = self._query("SELECT key, name, encoding FROM encodings WHERE model = ? ORDER BY key", (model,))
+        matrix = np.frombuffer(b"".join(row[2] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+        return matrix, [row[1] for row in rows], [row[0] for row in rows]
+    
+    def encoding_count(self, model: str) -> int:
+        return self._query("SELECT COUNT(*) FROM encodings WHERE model = ?", (model,))[0][0]
+    
+    # Sessions and attendance
+    
+    def session_id(self, name: str, start: str) -> int:
+        """Id of the session (name, ISO start), created if new."""
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO sessions (name, start) VALUES (?, ?)", (name, start))
+            return self._conn.execute(
+                "SELECT id FROM sessions WHERE start = ? AND name = ?", (start, name)
+            ).fetchone()[0]
+    
+    def add_attendance(self, session_id: int, rows: Iterable[Sequence[str]]):
+        """Append rows in attendance-CSV column order; repeats are ignored."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO attendance VALUES (?, ?, ?, ?, ?, ?)",
+                ((session_id, date, time_str, person, student_id or "", parse_confidence(confidence))
+                 for _, date, time_str, person, student_id, confidence in rows)
+            )
+    
+    def session_rows(self, session_id: int) -> List[List[str]]:
+        """A session's rows in attendance-CSV column order."""
+        rows = self._query(
+            "SELECT s.name, a.date, a.time, a.person, a.student_id, a.confidence "
+            "FROM attendance a JOIN sessions s ON s.id = a.session_id "
+            "WHERE a.session_id = ? ORDER BY a.rowid", (session_id,)
+        )
+        return [[name, date, time_str, person, student_id,
+                 f"{confidence:.1f}%" if confidence else "-"]
+                for name, date, time_str, person, student_id, confidence in rows]
+    
+    # Reports
+    
+    def sessions(self, since: Optional[str] = None, until: Optional[str] = None) -> List[tuple]:
+        """(id, name, start, present) per session, oldest first."""
+        return self._query(
+            "SELECT s.id, s.name, s.start, COUNT(a.session_id) FROM sessions s "
+            "LEFT JOIN attendance a ON a.session_id = s.id "
+            "WHERE s.start >= ? AND s.start < ? GROUP BY s.id ORDER BY s.start",
+            (since or "", until or "9999")
+        )
+    
+    def student_report(self, student: str, since: Optional[str] = None,
+                       until: Optional[str] = None) -> List[tuple]:
+        """(session, start, date, time, confidence) for every session a student attended.
+        
+        student is a student ID or, for people without one, a name.
+        """
+        return self._query(
+            "SELECT s.name, s.start, a.date, a.time, a.confidence "
+            "FROM attendance a JOIN sessions s ON s.id = a.session_id "
+            "WHERE (a.student_id = ? OR (a.student_id = '' AND a.person = ?)) "
+            "AND s.start >= ? AND s.start < ? ORDER BY s.start",
+            (student, student, since or "", until or "9999")
+        )
+    
+    def session_report(self, session_id: int) -> List[tuple]:
+        """(person, student_id, date, time, confidence) for one session."""
+        return self._query(
+            "SELECT person, student_id, date, time, confidence FROM attendance "
+            "WHERE session_id = ? ORDER BY date, time", (session_id,)
+        )
+    
+    # Bulk import
+    
+    def _import_needed(self, path: Path) -> bool:
+        stat = path.stat()
+        row = self._query("SELECT size, mtime FROM imported_files WHERE path = ?", (str(path),))
+        return not row or row[0] != (stat.st_size, stat.st_mtime_ns)
+    
+    def _mark_imported(self, path: Path):
+        stat = path.stat()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO imported_files VALUES (?, ?, ?)",
+                               (str(path), stat.st_size, stat.st_mtime_ns))
+    
+    def import_students_csv(self, path: Path) -> int:
+        """Load students.csv (name, student_id); returns rows read."""
+        if not path.exists():
+            return 0
+        with open(path, 'r', encoding='utf-8') as f:
+            rows = [(row.get('name', '').strip(), row.get('student_id', '').strip())
+                    for row in csv.DictReader(f)]
+        rows = [row for row in rows if row[0]]
+        self.upsert_students(rows)
+        return len(rows)
+    
+    def import_encoding_cache(self, cache) -> int:
+        """Copy every encoding from a loaded EncodingCache."""
+        rows = []
+        for key, entry in cache.entries.items():
+            encoding = cache.encoding(key)
+            if encoding is not None:
+                rows.append((key, entry['name'], cache.model_id, entry['size'], entry['mtime'], encoding))
+        self.put_encodings(rows)
+        return len(rows)
+    
+    def import_attendance_csv(self, path: Path) -> int:
+        """Import one session CSV unless it is unchanged since the last import."""
+        if not self._import_needed(path):
+            return 0
+        parsed = parse_session_file(path)
+        if parsed:
+            start, fallback_name = parsed[0].isoformat(timespec='seconds'), parsed[1]
+        else:
+            start = datetime.fromtimestamp(path.stat().st_mtime).isoformat(timespec='seconds')
+            fallback_name = path.stem
+        
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            rows = [row for row in list(csv.reader(f))[1:] if len(row) == 6]
+        session_id = self.session_id(rows[0][0] if rows else fallback_name, start)
+        self.add_attendance(session_id, rows)
+        self._mark_imported(path)
+        return len(rows)
+    
+    def import_attendance_dir(self, directory: Path) -> int:
+        """Import every new or changed attendance_records/*.csv."""
+        return sum(self.import_attendance_csv(path) for path in sorted(Path(directory).glob("*.csv")))
+
+
+def import_all(store: SQLiteStore, known_faces_dir: Path, students_file: Path,
+               attendance_dir: Path) -> Dict[str, int]:
+    """Bulk-import the file-based data into the store."""
+    from encoding_cache import EncodingCache, encoder_model_id
+    
+    counts = {'students': store.import_students_csv(students_file)}
+    cache = EncodingCache(known_faces_dir / "encodings.fgal", encoder_model_id(),
+                          legacy_file=known_faces_dir / "encodings.pkl")
+    counts['encodings'] = store.import_encoding_cache(cache) if cache.load() else 0
+    counts['attendance'] = store.import_attendance_dir(attendance_dir)
+    return counts
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Import into and report from the SQLite store")
+    parser.add_argument("--db", type=Path, default=Path("face_attendance.db"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    importer = commands.add_parser("import", help="bulk-import students, encodings and attendance CSVs")
+    importer.add_argument("--known-faces", type=Path, default=Path("known_faces"))
+    importer.add_argument("--students", type=Path, default=Path("students.csv"))
+    importer.add_argument("--attendance-dir", type=Path, default=Path("attendance_records"))
+    
+    student = commands.add_parser("student", help="sessions attended by one student")
+    student.add_argument("student", help="student ID (or name)")
+    student.add_argument("--since", help="ISO date, e.g. 2024-09-01")
+    student.add_argument("--until", help="ISO date (exclusive)")
+    
+    session = commands.add_parser("sessions", help="list sessions, or one session's attendance")
+    session.add_argument("session_id", type=int, nargs="?")
+    session.add_argument("--since")
+    session.add_argument("--until")
+    args = parser.parse_args()
+    
+    store = SQLiteStore(args.db)
+    if args.command == "import":
+        counts = import_all(store, args.known_faces, args.students, args.attendance_dir)
+        print(f"Imported {counts['students']} student(s), {counts['encodings']} encoding(s), "
+              f"{counts['attendance']} attendance row(s) into {args.db}")
+    elif args.command == "student":
+        rows = store.student_report(args.student, args.since, args.until)
+        for name, start, date, time_str, confidence in rows:
+            conf_str = f"{confidence:.1f}%" if confidence else "-"
+            print(f"{start}  {name:<30} {date} {time_str}  {conf_str}")
+        total = len(store.sessions(args.since, args.until))
+        print(f"{len(rows)} of {total} session(s) attended")
+    elif args.session_id is None:
+        for session_id, name, start, present in store.sessions(args.since, args.until):
+            print(f"{session_id:>5}  {start}  {name:<30} {present} present")
+    else:
+        for person, student_id, date, time_str, confidence in store.session_report(args.session_id):
+            conf_str = f"{confidence:.1f}%" if confidence else "-"
+            print(f"{date} {time_str}  {person} (ID: {student_id or '-'}) {conf_str}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Shared fixtures; the modules under test live in the repository root."""
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def synthetic_people(rng: np.random.Generator, people: int, samples: int, spread: float = 0.02):
+    """(encodings, names) shaped like face embeddings.
+    
+    Different people are ~1.3 apart and one person's samples ~0.3, on
+    either side of the usual 0.6 tolerance.
+    """
+    centers = rng.normal(scale=0.08, size=(people, 128))
+    encodings = np.repeat(centers, samples, axis=0) + rng.normal(scale=spread, size=(people * samples, 128))
+    names = [f"person{i}" for i in range(people) for _ in range(samples)]
+    return encodings.astype(np.float32), names
+
+
+def write_photo(path: Path, content: bytes = b"photo", mtime_ns: int = 1_000_000_000) -> Path:
+    """A stand-in photo file with a fixed mtime."""
+    path.write_bytes(content)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+
+class FakeEncoder:
+    """Deterministic encodings per file content; counts its calls."""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def __call__(self, image_file: Path):
+        self.calls.append(image_file.name)
+        content = image_file.read_bytes()
+        if content == b"no face":
+            return None
+        seed = int.from_bytes(content.ljust(8, b"\0")[:8], "little")
+        return np.random.default_rng(seed).normal(scale=0.08, size=128)
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
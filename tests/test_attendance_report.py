@@ -0,0 +1,67 @@
+"""Columnar attendance history: incremental refresh, cache and reports."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from attendance_report import AttendanceHistory
+from attendance_sink import attendance_row, create_sink
+
+
+MONDAY = datetime(2024, 5, 6, 9, 0)
+TUESDAY = datetime(2024, 5, 7, 9, 0)
+
+
+def write_session(directory, start, arrivals, kind="csv", name="Lecture"):
+    """arrivals: (person, student_id, minutes after start, confidence)."""
+    sink = create_sink(kind, directory, name, start)
+    sink.open()
+    sink.write([attendance_row(name, start + timedelta(minutes=minutes), person, student_id, confidence)
+                for person, student_id, minutes, confidence in arrivals])
+    sink.close()
+    return sink.path
+
+
+@pytest.fixture
+def records(tmp_path):
+    write_session(tmp_path, MONDAY, [("Alice", "S1", 2, 90.0), ("Bob", "", 15, None)])
+    write_session(tmp_path, TUESDAY, [("Alice", "S1", 12, 80.0)], kind="jsonl")
+    return tmp_path
+
+
+def test_student_report(records):
+    history = AttendanceHistory(records)
+    assert history.refresh() == (2, 0)
+    
+    alice, bob = history.student_report(late_minutes=10)
+    assert alice == {'name': 'Alice', 'student_id': 'S1', 'attended': 2, 'sessions': 2, 'rate': 1.0,
+                     'late': 1, 'mean_arrival_min': 7.0, 'mean_confidence': 85.0}
+    assert (bob['student_id'], bob['rate'], bob['late'], bob['mean_confidence']) == ("", 0.5, 1, None)
+
+
+def test_session_report_and_filters(records):
+    history = AttendanceHistory(records)
+    history.refresh()
+    
+    monday, tuesday = history.session_report(late_minutes=10)
+    assert (monday['present'], monday['late'], monday['median_arrival_min']) == (2, 1, 8.5)
+    assert (tuesday['present'], tuesday['late']) == (1, 1)
+    assert [row['file'] for row in history.session_report(since=TUESDAY)] == [tuesday['file']]
+    assert history.session_report(name="Lab") == []
+
+
+def test_only_changed_files_are_read_again(records):
+    history = AttendanceHistory(records)
+    history.refresh()
+    
+    # A new process starts from the cache
+    history = AttendanceHistory(records)
+    assert history.refresh() == (0, 0)
+    assert history.files_read == 0
+    assert len(history.sessions()) == 2
+    
+    write_session(records, datetime(2024, 5, 8, 9, 0), [("Carol", "S3", 0, 95.0)])
+    for path in records.glob("*.jsonl"):
+        path.unlink()
+    assert history.refresh() == (1, 1)
+    assert [row['name'] for row in history.student_report()] == ["Alice", "Bob", "Carol"]
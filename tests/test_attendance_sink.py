@@ -0,0 +1,87 @@
+"""Attendance sinks, the background writer and crash-marker recovery."""
+
+from datetime import datetime
+
+import pytest
+
+from attendance_sink import (
+    SESSION_MARKER, AttendanceWriter, CSVSink, attendance_row, create_sink, pending_session
+)
+
+
+START = datetime(2024, 5, 1, 9, 30)
+
+
+def rows(count, session="Lecture"):
+    return [attendance_row(session, START, f"person{i}", f"S{i}", 90.0) for i in range(count)]
+
+
+class FailingSink(CSVSink):
+    """A CSV sink whose writes always fail, e.g. on a full disk."""
+    
+    def write(self, rows):
+        raise OSError("No space left on device")
+
+
+@pytest.mark.parametrize("kind", ["csv", "jsonl", "sqlite"])
+def test_rows_written_by_the_writer_read_back(tmp_path, kind):
+    writer = AttendanceWriter(create_sink(kind, tmp_path, "Lecture", START), batch_size=4)
+    writer.start()
+    for row in rows(10):
+        writer.submit(row)
+    assert writer.close()
+    
+    assert create_sink(kind, tmp_path, "Lecture", START).read() == rows(10)
+    assert not (tmp_path / SESSION_MARKER).exists()
+
+
+def test_a_session_left_open_is_found_from_its_marker(tmp_path):
+    writer = AttendanceWriter(create_sink("csv", tmp_path, "Lecture", START))
+    writer.start()
+    for row in rows(3):
+        writer.submit(row)
+    assert writer.flush()
+    
+    # The process "dies" here: the marker still names the open session
+    sink = pending_session(tmp_path)
+    assert (sink.kind, sink.session_name, sink.start, sink.path) == ("csv", "Lecture", START, writer.sink.path)
+    assert sink.read() == rows(3)
+    
+    assert writer.close()
+    assert pending_session(tmp_path) is None
+
+
+def test_torn_last_line_is_cut_before_appending(tmp_path):
+    sink = CSVSink(tmp_path, "Lecture", START)
+    sink.open()
+    sink.write(rows(2))
+    sink.close()
+    with open(sink.path, 'a', encoding='utf-8') as f:
+        f.write("Lecture,2024-05-01,09:3")
+    
+    assert sink.read() == rows(2)
+    sink.open()
+    sink.write(rows(1, session="Again"))
+    sink.close()
+    assert sink.read() == rows(2) + rows(1, session="Again")
+
+
+def test_unopenable_sink_fails_start(tmp_path):
+    (tmp_path / CSVSink(tmp_path, "Lecture", START).path.name).mkdir()
+    writer = AttendanceWriter(CSVSink(tmp_path, "Lecture", START))
+    with pytest.raises(OSError):
+        writer.start()
+    assert not writer.close()
+
+
+def test_rows_that_never_reach_the_sink_fail_close(tmp_path):
+    writer = AttendanceWriter(FailingSink(tmp_path, "Lecture", START))
+    writer.start()
+    for row in rows(3):
+        writer.submit(row)
+    
+    assert not writer.close()
+    assert "3 attendance row(s)" in str(writer.error)
+    assert writer.stats()['errors'] >= 1
+    # The user ended it, so it must not be resumed on the next start
+    assert pending_session(tmp_path) is None
@@ -0,0 +1,59 @@
+"""Workload generation and regression comparison of the pipeline benchmark."""
+
+import importlib.util
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+
+SCRIPT = Path(__file__).resolve().parent.parent / "benchmarks" / "bench_pipeline.py"
+spec = importlib.util.spec_from_file_location("bench_pipeline", SCRIPT)
+bench_pipeline = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench_pipeline)
+
+
+def results(frames_per_s, p95_ms, build_s=1.0):
+    return {
+        'environment': {'commit': "abc1234"},
+        'pipeline': {'frames_per_s': frames_per_s, 'stages': {'detect': {'count': 100, 'p95_ms': p95_ms}}},
+        'matching': [{'label': "ivf@1000", 'index': "ivf", 'build_s': build_s}],
+        'enrollment': {'skipped': "--skip"}
+    }
+
+
+def test_flatten_keys_list_items_by_label():
+    flat = dict(bench_pipeline.flatten(results(30.0, 20.0)['matching']))
+    assert flat == {'ivf@1000.build_s': 1.0}
+
+
+def test_compare_reports_regressions_in_either_direction(capsys):
+    baseline = results(30.0, 20.0)
+    assert bench_pipeline.compare(baseline, results(31.0, 20.5), 0.1) == []
+    assert "no regressions" in capsys.readouterr().out
+    
+    regressions = bench_pipeline.compare(baseline, results(20.0, 30.0, build_s=0.5), 0.1)
+    assert regressions == ["pipeline.frames_per_s", "pipeline.stages.detect.p95_ms"]
+    assert "better" in capsys.readouterr().out
+
+
+def test_composite_frames_are_reproducible(tmp_path):
+    face = np.full((60, 40, 3), 200, dtype=np.uint8)
+    cv2.imwrite(str(tmp_path / "Alice.jpg"), face)
+    first = bench_pipeline.composite_frames([tmp_path / "Alice.jpg"], 3, 160, 120, faces=2)
+    second = bench_pipeline.composite_frames([tmp_path / "Alice.jpg"], 3, 160, 120, faces=2)
+    assert len(first) == 3 and first[0].shape == (120, 160, 3)
+    assert all(np.array_equal(a, b) for a, b in zip(first, second))
+
+
+def test_bench_matching_rows():
+    rows = bench_pipeline.bench_matching([200], ["brute"], faces=2, calls=5, tolerance=0.6)
+    assert [row['label'] for row in rows] == ["brute@200"]
+    assert rows[0]['us_per_face'] > 0
+    assert rows[0]['p50_ms'] <= rows[0]['p99_ms']
+
+
+@pytest.mark.skipif(bench_pipeline.resource is None, reason="no resource module")
+def test_peak_rss_is_reported():
+    assert bench_pipeline.peak_rss_mb() > 0
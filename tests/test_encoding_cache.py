@@ -0,0 +1,185 @@
+"""EncodingCache: incremental sync, persistence, migration and compaction."""
+
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from conftest import FakeEncoder, write_photo
+from encoding_cache import EncodingCache, list_face_images, person_name, unique_photo_path
+
+
+MODEL = "test-model"
+
+
+def open_cache(directory: Path, model: str = MODEL) -> EncodingCache:
+    return EncodingCache(directory / "encodings.fgal", model, legacy_file=directory / "encodings.pkl")
+
+
+def synced(directory: Path, encoder=None, model: str = MODEL) -> EncodingCache:
+    cache = open_cache(directory, model)
+    cache.load()
+    cache.sync(list_face_images(directory), encoder or FakeEncoder())
+    cache.save()
+    return cache
+
+
+@pytest.mark.parametrize("name", ["Alice", "Class2", "Anne-Marie", "Jo Smith", "A__b"])
+def test_unique_photo_paths_map_back_to_the_name(tmp_path, name):
+    for _ in range(4):
+        path = unique_photo_path(tmp_path, name)
+        assert not path.exists()
+        assert person_name(path) == name
+        write_photo(path)
+    assert len(list_face_images(tmp_path)) == 4
+
+
+def test_person_name_keeps_digits_that_are_part_of_the_name():
+    assert person_name(Path("Alice__2.jpg")) == "Alice"
+    assert person_name(Path("Alice2.jpg")) == "Alice2"
+    assert person_name(Path("Alice__x.jpg")) == "Alice__x"
+    assert person_name(Path("__3.jpg")) == "__3"
+
+
+def test_only_new_or_changed_photos_are_encoded(tmp_path):
+    write_photo(tmp_path / "Alice.jpg", b"alice")
+    write_photo(tmp_path / "Bob.jpg", b"bob")
+    encoder = FakeEncoder()
+    cache = synced(tmp_path, encoder)
+    assert sorted(encoder.calls) == ["Alice.jpg", "Bob.jpg"]
+    
+    encoder.calls.clear()
+    assert cache.sync(list_face_images(tmp_path), encoder) == ([], [])
+    assert encoder.calls == []
+    
+    write_photo(tmp_path / "Bob.jpg", b"bob, new haircut", mtime_ns=2_000_000_000)
+    (tmp_path / "Alice.jpg").unlink()
+    added, removed = cache.sync(list_face_images(tmp_path), encoder)
+    assert encoder.calls == ["Bob.jpg"]
+    assert added == ["Bob.jpg"]
+    assert sorted(removed) == ["Alice.jpg", "Bob.jpg"]
+
+
+def test_photos_without_a_face_are_not_retried(tmp_path):
+    write_photo(tmp_path / "Blank.jpg", b"no face")
+    synced(tmp_path)
+    
+    encoder = FakeEncoder()
+    cache = synced(tmp_path, encoder)
+    assert encoder.calls == []
+    assert cache.rows()[1] == []
+
+
+def test_reload_maps_the_store_without_encoding(tmp_path):
+    write_photo(tmp_path / "Alice.jpg", b"alice")
+    write_photo(tmp_path / "Bob.jpg", b"bob")
+    expected = synced(tmp_path).rows()
+    
+    encoder = FakeEncoder()
+    cache = synced(tmp_path, encoder)
+    encodings, names, keys = cache.rows()
+    assert encoder.calls == []
+    assert isinstance(encodings, np.memmap)
+    assert names == expected[1] and keys == expected[2]
+    np.testing.assert_array_equal(encodings, np.asarray(expected[0]))
+
+
+def test_numbered_photos_keep_one_name_through_a_rebuild(tmp_path):
+    cache = synced(tmp_path)
+    for content in [b"a1", b"a2", b"a3"]:
+        path = write_photo(unique_photo_path(tmp_path, "Alice"), content)
+        cache.put(path, FakeEncoder()(path), "Alice")
+    cache.save()
+    
+    for store_file in tmp_path.glob("encodings.fgal*"):
+        store_file.unlink()
+    rebuilt = synced(tmp_path)
+    assert rebuilt.rows()[1] == ["Alice"] * 3
+
+
+def test_changed_model_invalidates_the_store(tmp_path):
+    write_photo(tmp_path / "Alice.jpg", b"alice")
+    synced(tmp_path, model="old-model")
+    
+    cache = open_cache(tmp_path, "new-model")
+    assert cache.load() is False
+    assert cache.entries == {}
+    encoder = FakeEncoder()
+    cache.sync(list_face_images(tmp_path), encoder)
+    assert encoder.calls == ["Alice.jpg"]
+
+
+def test_load_never_writes_the_store(tmp_path):
+    for name in ["Alice", "Bob"]:
+        write_photo(tmp_path / f"{name}.jpg", name.encode())
+    synced(tmp_path)
+    (tmp_path / "Bob.jpg").unlink()
+    synced(tmp_path)
+    files = sorted(tmp_path.glob("encodings.fgal*"))
+    before = [(path.read_bytes(), path.stat().st_mtime_ns) for path in files]
+    
+    reader = open_cache(tmp_path)
+    assert reader.load()
+    assert reader.rows()[1] == ["Alice"]
+    assert sorted(tmp_path.glob("encodings.fgal*")) == files
+    assert [(path.read_bytes(), path.stat().st_mtime_ns) for path in files] == before
+
+
+def test_compact_drops_rows_of_deleted_photos(tmp_path):
+    for name in ["Alice", "Bob", "Carol"]:
+        write_photo(tmp_path / f"{name}.jpg", name.encode())
+    synced(tmp_path)
+    
+    (tmp_path / "Bob.jpg").unlink()
+    cache = synced(tmp_path)
+    # Deleting only rewrites the table; the rows stay until compact()
+    assert cache.store.count == 3
+    cache.compact()
+    assert cache.store.count == 2
+    
+    reloaded = open_cache(tmp_path)
+    assert reloaded.load()
+    encodings, names, _ = reloaded.rows()
+    assert reloaded.store.count == 2
+    assert sorted(names) == ["Alice", "Carol"]
+    assert len(encodings) == 2
+    fake = FakeEncoder()
+    for encoding, name in zip(encodings, names):
+        np.testing.assert_allclose(encoding, fake(tmp_path / f"{name}.jpg"), rtol=1e-6)
+
+
+def test_v1_pickle_is_migrated(tmp_path):
+    alice = write_photo(tmp_path / "Alice.jpg", b"alice")
+    alice2 = write_photo(tmp_path / "Alice__2.jpg", b"alice again")
+    fake = FakeEncoder()
+    with open(tmp_path / "encodings.pkl", 'wb') as f:
+        pickle.dump({'encodings': [fake(alice), fake(alice2)], 'names': ["Alice", "Alice__2"]}, f)
+    
+    encoder = FakeEncoder()
+    cache = open_cache(tmp_path)
+    assert cache.load()
+    assert not cache.store.exists()
+    cache.sync(list_face_images(tmp_path), encoder)
+    cache.save()
+    assert encoder.calls == []
+    assert cache.store.exists()
+    encodings, names, keys = cache.rows()
+    assert names == ["Alice", "Alice"]
+    assert sorted(keys) == ["Alice.jpg", "Alice__2.jpg"]
+
+
+@pytest.mark.parametrize("model, migrated", [(MODEL, True), ("other-model", False)])
+def test_v2_pickle_is_migrated_only_for_the_same_model(tmp_path, model, migrated):
+    alice = write_photo(tmp_path / "Alice.jpg", b"alice")
+    stat = alice.stat()
+    data = {'version': 2, 'model': model, 'entries': {
+        "Alice.jpg": {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'name': "Alice",
+                      'encoding': FakeEncoder()(alice)}
+    }}
+    with open(tmp_path / "encodings.pkl", 'wb') as f:
+        pickle.dump(data, f)
+    
+    cache = open_cache(tmp_path)
+    assert cache.load() is migrated
+    assert len(cache.rows()[1]) == int(migrated)
@@ -0,0 +1,61 @@
+"""Bulk enrollment: names, copies into known_faces/ and the cache entries it leaves."""
+
+from pathlib import Path
+
+import pytest
+
+import enroll
+from conftest import FakeEncoder, write_photo
+from encoding_cache import EncodingCache, list_face_images
+
+
+MODEL = "test-model"
+
+
+def fake_encode_image(args):
+    """enroll.encode_image without dlib; runs in the worker processes."""
+    path = args[0]
+    content = Path(path).read_bytes()
+    if content == b"no face":
+        return path, 'no_face', None, ""
+    if content == b"two faces":
+        return path, 'multiple_faces', None, "2 faces"
+    return path, 'ok', FakeEncoder()(Path(path)).tolist(), ""
+
+
+@pytest.fixture
+def photos(tmp_path, monkeypatch):
+    monkeypatch.setattr(enroll, "encode_image", fake_encode_image)
+    monkeypatch.setattr(enroll, "encoder_model_id", lambda: MODEL)
+    source = tmp_path / "photos"
+    for relative, content in [("alice/1.jpg", b"alice 1"), ("alice/2.jpg", b"alice 2"),
+                              ("bob/Bob.png", b"bob"), ("bob/blank.jpg", b"no face"),
+                              ("group.jpg", b"two faces")]:
+        (source / relative).parent.mkdir(parents=True, exist_ok=True)
+        write_photo(source / relative, content)
+    return source
+
+
+def test_enrollment_name():
+    root = Path("photos")
+    assert enroll.enrollment_name(root / "alice" / "1.jpg", root, "dir") == "alice"
+    assert enroll.enrollment_name(root / "Bob__2.jpg", root, "dir") == "Bob"
+    assert enroll.enrollment_name(root / "alice" / "Carol.jpg", root, "file") == "Carol"
+
+
+def test_enrolled_photos_are_copied_and_cached(tmp_path, photos):
+    known_faces = tmp_path / "known_faces"
+    summary = enroll.enroll(photos, known_faces, workers=2, chunksize=1, name_from="dir")
+    
+    assert summary['ok'] == 3
+    assert [Path(path).name for path, _ in summary['no_face']] == ["blank.jpg"]
+    assert [Path(path).name for path, _ in summary['multiple_faces']] == ["group.jpg"]
+    assert sorted(path.name for path in list_face_images(known_faces)) == ["alice.jpg", "alice__2.jpg", "bob.png"]
+    
+    # The app's next sync finds every copy already encoded, under its person's name
+    cache = EncodingCache(known_faces / "encodings.fgal", MODEL)
+    assert cache.load()
+    encoder = FakeEncoder()
+    assert cache.sync(list_face_images(known_faces), encoder) == ([], [])
+    assert encoder.calls == []
+    assert sorted(cache.rows()[1]) == ["alice", "alice", "bob"]
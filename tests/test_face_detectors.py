@@ -0,0 +1,65 @@
+"""Detector factory, box clipping and the SSD output parsing."""
+
+import numpy as np
+import pytest
+
+import face_detectors
+from face_detectors import FaceDetector, SSDDetector, create_detector
+
+
+class FakeNet:
+    """cv2.dnn net stand-in returning canned SSD detections."""
+    
+    def __init__(self, detections):
+        self.detections = np.array(detections, dtype=np.float32).reshape(1, 1, -1, 7)
+        self.blob = None
+    
+    def setInput(self, blob):
+        self.blob = blob
+    
+    def forward(self):
+        return self.detections
+
+
+def ssd_with(detections, confidence=0.5):
+    cv2 = pytest.importorskip("cv2")
+    detector = SSDDetector.__new__(SSDDetector)
+    FaceDetector.__init__(detector, confidence)
+    detector._cv2 = cv2
+    detector.input_size = 300
+    detector._net = FakeNet(detections)
+    return detector
+
+
+def test_unknown_detector_is_refused():
+    with pytest.raises(ValueError, match="Unknown detector"):
+        create_detector("yolo")
+
+
+def test_ssd_without_weights_says_where_to_put_them(tmp_path):
+    pytest.importorskip("cv2")
+    with pytest.raises(FileNotFoundError, match="models/"):
+        create_detector("ssd", weights=tmp_path / "missing.caffemodel")
+
+
+def test_boxes_are_clipped_to_the_image():
+    assert face_detectors._clip_box(-5, 700, 500, -1, (480, 640, 3)) == (0, 640, 480, 0)
+
+
+def test_ssd_detections_become_clipped_boxes_per_image():
+    detector = ssd_with([
+        # image, class, score, x1, y1, x2, y2 (relative)
+        [0, 1, 0.9, 0.25, 0.5, 0.5, 1.1],
+        [1, 1, 0.8, 0.0, 0.0, 0.5, 0.5],
+        [1, 1, 0.3, 0.5, 0.5, 1.0, 1.0],
+        [0, 1, 0.9, 0.5, 0.5, 0.5, 0.6],
+    ])
+    images = [np.zeros((100, 200, 3), dtype=np.uint8), np.zeros((50, 50, 3), dtype=np.uint8)]
+    boxes = detector.detect_batch(images)
+    assert boxes == [[(50, 100, 100, 50)], [(0, 25, 25, 0)]]
+    assert detector._net.blob.shape == (2, 3, 300, 300)
+
+
+def test_hog_detector_finds_no_faces_in_a_blank_image():
+    pytest.importorskip("dlib")
+    assert create_detector("hog", upsample=0).detect(np.zeros((120, 160, 3), dtype=np.uint8)) == []
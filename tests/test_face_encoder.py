@@ -0,0 +1,98 @@
+"""BatchEncoder batching, scatter and shutdown with a stand-in network."""
+
+import threading
+
+import numpy as np
+import pytest
+
+from face_encoder import BatchEncoder
+
+
+class FakeNetwork:
+    """Encodes a box to a vector filled with its top coordinate; records batch sizes."""
+    
+    def __init__(self):
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+    
+    def chips(self, rgb_image, locations):
+        return [top for top, _, _, _ in locations]
+    
+    def encode_chips(self, chips):
+        self.release.wait()
+        self.batches.append(len(chips))
+        return np.array([np.full(128, float(chip)) for chip in chips]).reshape(-1, 128)
+
+
+def box(top):
+    return (top, top + 10, top + 10, top)
+
+
+@pytest.fixture
+def make_encoder():
+    encoders = []
+    
+    def make(network, **kwargs):
+        encoder = BatchEncoder(network, **kwargs)
+        encoder.start()
+        encoders.append(encoder)
+        return encoder
+    
+    yield make
+    for encoder in encoders:
+        encoder.stop()
+
+
+def test_requests_waiting_together_share_a_batch(make_encoder):
+    network = FakeNetwork()
+    encoder = make_encoder(network, max_batch=8, max_wait_ms=200)
+    image = np.zeros((10, 10, 3), dtype=np.uint8)
+    
+    futures = [encoder.submit(image, [box(i * 10), box(i * 10 + 1)]) for i in range(4)]
+    results = [future.result(timeout=5) for future in futures]
+    
+    # Each caller gets its own rows back, in order
+    for i, encodings in enumerate(results):
+        assert encodings.shape == (2, 128)
+        assert list(encodings[:, 0]) == [i * 10, i * 10 + 1]
+    assert network.batches == [8]
+    assert encoder.stats()['mean_batch'] == 8
+
+
+def test_batches_never_split_a_request(make_encoder):
+    network = FakeNetwork()
+    network.release.clear()
+    encoder = make_encoder(network, max_batch=4, max_wait_ms=0)
+    image = np.zeros((10, 10, 3), dtype=np.uint8)
+    
+    first = encoder.submit(image, [box(0)])
+    rest = [encoder.submit(image, [box(1), box(2), box(3)]) for _ in range(2)]
+    network.release.set()
+    for future in [first] + rest:
+        future.result(timeout=5)
+    assert all(size <= 4 for size in network.batches)
+    assert sum(network.batches) == 7
+
+
+def test_no_faces_resolve_at_once(make_encoder):
+    encoder = make_encoder(FakeNetwork())
+    assert encoder.submit(np.zeros((10, 10, 3)), []).result(timeout=0).shape == (0, 128)
+
+
+def test_errors_reach_every_caller_of_the_batch(make_encoder):
+    class BrokenNetwork(FakeNetwork):
+        def encode_chips(self, chips):
+            raise RuntimeError("out of memory")
+    
+    encoder = make_encoder(BrokenNetwork())
+    with pytest.raises(RuntimeError, match="out of memory"):
+        encoder.encode(np.zeros((10, 10, 3)), [box(0)])
+
+
+def test_stop_fails_requests_still_queued():
+    encoder = BatchEncoder(FakeNetwork())
+    future = encoder.submit(np.zeros((10, 10, 3)), [box(0)])
+    encoder.stop()
+    with pytest.raises(RuntimeError, match="Encoder stopped"):
+        future.result(timeout=0)
@@ -0,0 +1,96 @@
+"""FaceGallery matching against a plain NumPy brute force."""
+
+import numpy as np
+import pytest
+
+from conftest import synthetic_people
+from face_gallery import FaceGallery
+
+
+TOLERANCE = 0.6
+
+
+def brute_force(encodings: np.ndarray, probes: np.ndarray) -> np.ndarray:
+    """Euclidean distances (probes x encodings), computed the slow way."""
+    return np.linalg.norm(probes[:, None, :].astype(np.float64) - encodings[None, :, :], axis=2)
+
+
+def assert_matches_brute_force(gallery: FaceGallery, encodings, names, probes):
+    distances = brute_force(np.asarray(encodings), probes)
+    for (name, distance), row in zip(gallery.best_matches(probes, TOLERANCE), distances):
+        best = int(row.argmin())
+        assert distance == pytest.approx(row[best], abs=1e-4)
+        assert name == (names[best] if row[best] <= TOLERANCE else None)
+
+
+def test_best_matches_agree_with_brute_force(rng):
+    encodings, names = synthetic_people(rng, people=50, samples=3)
+    gallery = FaceGallery.from_encodings(list(encodings), names)
+    # Half the probes are noisy re-takes of enrolled faces, half are strangers
+    probes = np.concatenate([
+        encodings[rng.choice(len(encodings), 20)] + rng.normal(scale=0.02, size=(20, 128)),
+        rng.normal(scale=0.08, size=(20, 128))
+    ]).astype(np.float32)
+    
+    assert_matches_brute_force(gallery, encodings, names, probes)
+    matched = [name for name, _ in gallery.best_matches(probes, TOLERANCE)]
+    assert all(name is not None for name in matched[:20])
+    assert all(name is None for name in matched[20:])
+
+
+def test_k_nearest_are_sorted_and_exact(rng):
+    encodings, names = synthetic_people(rng, people=20, samples=4)
+    gallery = FaceGallery.from_encodings(encodings, names)
+    probes = encodings[:5] + rng.normal(scale=0.01, size=(5, 128)).astype(np.float32)
+    
+    indices, distances = gallery.match(probes, k=4)
+    expected = brute_force(encodings, probes)
+    assert indices.shape == distances.shape == (5, 4)
+    assert np.all(np.diff(distances, axis=1) >= 0)
+    np.testing.assert_allclose(distances, np.sort(expected, axis=1)[:, :4], atol=1e-4)
+
+
+def test_adopted_matrix_is_copied_only_when_the_gallery_grows(rng):
+    encodings, names = synthetic_people(rng, people=4, samples=2)
+    original = encodings.copy()
+    gallery = FaceGallery.from_encodings(encodings, names)
+    assert np.shares_memory(gallery.encodings, encodings)
+    
+    gallery.add(np.ones(128, dtype=np.float32), "new")
+    assert not np.shares_memory(gallery.encodings, encodings)
+    np.testing.assert_array_equal(encodings, original)
+    assert len(gallery) == len(names) + 1
+
+
+def test_removed_rows_are_never_matched(rng):
+    encodings, names = synthetic_people(rng, people=10, samples=3)
+    keys = [f"{name}_{i}.jpg" for i, name in enumerate(names)]
+    gallery = FaceGallery.from_encodings(list(encodings), names, keys)
+    
+    gallery.remove_name("person3")
+    gallery.remove_key(keys[0])
+    kept = [i for i, (name, key) in enumerate(zip(names, keys)) if name != "person3" and key != keys[0]]
+    assert sorted(gallery.keys) == sorted(keys[i] for i in kept)
+    
+    probes = encodings + rng.normal(scale=0.01, size=encodings.shape).astype(np.float32)
+    assert_matches_brute_force(gallery, encodings[kept], [names[i] for i in kept], probes)
+    assert "person3" not in {name for name, _ in gallery.best_matches(probes, TOLERANCE)}
+
+
+def test_version_changes_with_the_contents(rng):
+    encodings, names = synthetic_people(rng, people=3, samples=1)
+    gallery = FaceGallery()
+    versions = [gallery.version]
+    gallery.add_many(list(encodings), names, ["a", "b", "c"])
+    versions.append(gallery.version)
+    gallery.remove_key("b")
+    versions.append(gallery.version)
+    gallery.remove_key("missing")
+    versions.append(gallery.version)
+    assert versions[0] < versions[1] < versions[2] == versions[3]
+
+
+def test_empty_gallery_matches_nobody():
+    gallery = FaceGallery()
+    probes = np.zeros((2, 128), dtype=np.float32)
+    assert gallery.best_matches(probes, TOLERANCE) == [(None, 1.0), (None, 1.0)]
@@ -0,0 +1,97 @@
+"""Nearest-neighbour indexes, alone and behind FaceGallery, against brute force."""
+
+import numpy as np
+import pytest
+
+from conftest import synthetic_people
+from face_gallery import FaceGallery
+from face_index import BruteForceIndex, IVFIndex, ProductQuantizer, create_index
+
+
+TOLERANCE = 0.6
+
+
+def noisy_probes(rng, encodings, count, scale=0.02):
+    picks = rng.choice(len(encodings), count, replace=False)
+    return (encodings[picks] + rng.normal(scale=scale, size=(count, 128))).astype(np.float32)
+
+
+def test_brute_force_index_is_exact(rng):
+    vectors = rng.normal(size=(300, 128)).astype(np.float32)
+    ids = np.arange(1000, 1300)
+    index = BruteForceIndex()
+    index.add(ids, vectors)
+    probes = rng.normal(size=(10, 128)).astype(np.float32)
+    
+    found, sq_distances = index.search(probes, k=5)
+    expected = ((probes[:, None, :] - vectors[None]) ** 2).sum(axis=2)
+    order = expected.argsort(axis=1)[:, :5]
+    np.testing.assert_array_equal(found, ids[order])
+    np.testing.assert_allclose(sq_distances, np.take_along_axis(expected, order, axis=1), rtol=1e-4)
+
+
+def test_searches_pad_missing_neighbours():
+    index = BruteForceIndex()
+    index.add([7], np.zeros((1, 128)))
+    found, sq_distances = index.search(np.zeros((1, 128)), k=3)
+    assert found.tolist() == [[7, -1, -1]]
+    assert np.isinf(sq_distances[0, 1:]).all()
+
+
+def test_ivf_probing_every_cell_matches_brute_force(rng):
+    encodings, names = synthetic_people(rng, people=200, samples=3)
+    brute = FaceGallery.from_encodings(encodings, names)
+    ivf = FaceGallery.from_encodings(encodings, names, index=IVFIndex(nlist=16, nprobe=16))
+    probes = np.concatenate([noisy_probes(rng, encodings, 50),
+                             rng.normal(scale=0.08, size=(10, 128)).astype(np.float32)])
+    
+    for (name, distance), (expected_name, expected_distance) in zip(
+            ivf.best_matches(probes, TOLERANCE), brute.best_matches(probes, TOLERANCE)):
+        assert name == expected_name
+        assert distance == pytest.approx(expected_distance, abs=1e-4)
+
+
+@pytest.mark.parametrize("kind", ["ivf", "ivfpq"])
+def test_approximate_indexes_keep_recall(rng, kind):
+    encodings, names = synthetic_people(rng, people=2000, samples=2)
+    index = create_index(kind, len(names))
+    assert not index.exact
+    gallery = FaceGallery.from_encodings(encodings, names, index=index)
+    brute = FaceGallery.from_encodings(encodings, names)
+    probes = noisy_probes(rng, encodings, 200)
+    
+    found = [name for name, _ in gallery.best_matches(probes, TOLERANCE)]
+    expected = [name for name, _ in brute.best_matches(probes, TOLERANCE)]
+    recall = np.mean([a == b for a, b in zip(found, expected)])
+    assert recall >= 0.95
+
+
+def test_gallery_removals_reach_the_index(rng):
+    encodings, names = synthetic_people(rng, people=100, samples=2)
+    keys = [f"{i}.jpg" for i in range(len(names))]
+    gallery = FaceGallery.from_encodings(list(encodings), names, keys, index=IVFIndex(nlist=8, nprobe=8))
+    
+    gallery.remove_name("person5")
+    gallery.add_many(list(encodings[:2] + 0.001), ["late0", "late1"], ["late0.jpg", "late1.jpg"])
+    assert len(gallery.index) == len(gallery)
+    
+    matches = gallery.best_matches(encodings[10:12], TOLERANCE)
+    assert all(name != "person5" for name, _ in matches)
+    assert [name for name, _ in matches] == [None, None]
+    # Rows moved into freed slots are found under their own names
+    assert [name for name, _ in gallery.best_matches(encodings[-2:], TOLERANCE)] == names[-2:]
+
+
+def test_exact_index_is_not_used_by_the_gallery(rng):
+    encodings, names = synthetic_people(rng, people=5, samples=1)
+    gallery = FaceGallery.from_encodings(encodings, names, index=BruteForceIndex())
+    assert gallery.index is None
+
+
+def test_create_index_by_name():
+    assert isinstance(create_index("auto", 100), BruteForceIndex)
+    assert isinstance(create_index("auto", 50000), IVFIndex)
+    assert create_index("ivf", 50000).pq is None
+    assert isinstance(create_index("ivfpq", 50000).pq, ProductQuantizer)
+    with pytest.raises(ValueError):
+        create_index("hnsw")
@@ -0,0 +1,62 @@
+"""Identity prototypes: selection strategies and per-person rebuilds."""
+
+import numpy as np
+import pytest
+
+from conftest import synthetic_people
+from face_gallery import FaceGallery
+from face_prototypes import STRATEGIES, IdentityPrototypes, medoids, spread_subset
+
+
+TOLERANCE = 0.6
+
+
+def test_spread_subset_starts_at_the_medoid_and_covers_the_set():
+    samples = np.array([[0.0], [0.1], [0.2], [5.0], [-5.0]])
+    chosen = spread_subset(samples, 3)
+    assert chosen[0] == 1
+    assert set(chosen[1:]) == {3, 4}
+
+
+def test_medoids_pick_one_sample_per_cluster(rng):
+    samples = np.concatenate([rng.normal(loc=0.0, scale=0.1, size=(10, 2)),
+                              rng.normal(loc=5.0, scale=0.1, size=(10, 2))])
+    chosen = medoids(samples, 2)
+    assert sorted(chosen // 10) == [0, 1]
+    assert list(medoids(samples[:2], 3)) == [0, 1]
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_prototypes_match_like_the_full_gallery(rng, strategy):
+    encodings, names = synthetic_people(rng, people=20, samples=6)
+    source = FaceGallery.from_encodings(list(encodings), names)
+    prototypes = IdentityPrototypes(strategy, k=2, max_samples=4)
+    prototypes.build(source)
+    
+    per_identity = {'all': 4, 'centroid': 1, 'medoids': 2}[strategy]
+    assert len(prototypes) == 20 * per_identity
+    assert prototypes.stats()['samples'] == 120
+    
+    probes = encodings[::6] + rng.normal(scale=0.02, size=(20, 128)).astype(np.float32)
+    assert [name for name, _ in prototypes.best_matches(probes, TOLERANCE)] == names[::6]
+
+
+def test_update_rebuilds_only_the_given_people(rng):
+    encodings, names = synthetic_people(rng, people=3, samples=4)
+    source = FaceGallery.from_encodings(list(encodings), names)
+    prototypes = IdentityPrototypes("centroid")
+    prototypes.build(source)
+    version = prototypes.version
+    
+    source.add(encodings[0] + 0.01, "person0")
+    source.remove_name("person2")
+    prototypes.update(source, ["person0", "person2"])
+    
+    assert prototypes.version != version
+    assert prototypes.samples == {'person0': 5, 'person1': 4}
+    assert sorted(prototypes.gallery.names) == ["person0", "person1"]
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        IdentityPrototypes("kmeans")
@@ -0,0 +1,76 @@
+"""QualityGate: each check rejects for its own reason, in full-resolution pixels."""
+
+import cv2
+import numpy as np
+import pytest
+
+from face_quality import QualityGate
+
+
+def face_image(rng, size=200, brightness=120, contrast=40, blur=0):
+    """A textured square 'face' in the middle of a larger RGB frame."""
+    frame = np.full((400, 400, 3), 30, dtype=np.uint8)
+    blocks = rng.normal(brightness, contrast, size=(8, 8)).clip(0, 255).astype(np.uint8)
+    texture = cv2.resize(blocks, (size, size), interpolation=cv2.INTER_NEAREST)
+    if blur:
+        texture = cv2.GaussianBlur(texture, (0, 0), blur)
+    frame[100:100 + size, 100:100 + size] = texture[..., None]
+    return frame, (100, 100 + size, 100 + size, 100)
+
+
+@pytest.fixture
+def gate():
+    return QualityGate(pose=False)
+
+
+def test_a_clear_face_passes(gate, rng):
+    frame, box = face_image(rng)
+    quality = gate.assess(frame, box)
+    assert quality.ok
+    assert quality.score > 0
+
+
+@pytest.mark.parametrize("kwargs, reason", [
+    ({'size': 24}, 'small'),
+    ({'brightness': 15, 'contrast': 5}, 'dark'),
+    ({'brightness': 240, 'contrast': 5}, 'bright'),
+    ({'contrast': 3}, 'flat'),
+    ({'blur': 6}, 'blurry'),
+])
+def test_each_check_rejects_for_its_reason(gate, rng, kwargs, reason):
+    frame, box = face_image(rng, **kwargs)
+    assert gate.assess(frame, box).reason == reason
+    assert gate.stats()['reasons'][reason] == 1
+
+
+def test_sizes_are_judged_at_full_resolution(gate, rng):
+    frame, box = face_image(rng, size=120)
+    assert gate.assess(frame, box).ok
+    # The same face measured on a quarter-size detection frame would look 'small'
+    small = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
+    assert gate.assess(small, tuple(v // 4 for v in box)).reason == 'small'
+
+
+def test_bgr_frames_measure_like_rgb(gate, rng):
+    frame, box = face_image(rng)
+    frame[..., 0] //= 2
+    rgb = gate.measure(frame, box)
+    bgr = gate.measure(frame[..., ::-1].copy(), box, bgr=True)
+    assert bgr.brightness == pytest.approx(rgb.brightness)
+    assert bgr.sharpness == pytest.approx(rgb.sharpness)
+
+
+def test_best_prefers_the_bigger_sharper_face(gate, rng):
+    frame, box = face_image(rng, size=90)
+    big = (50, 390, 390, 50)
+    best, qualities = gate.best(frame, [box, big, (0, 10, 10, 0)])
+    assert qualities[2].reason == 'small'
+    assert best in (0, 1) and qualities[best].score == max(q.score for q in qualities if q.ok)
+
+
+def test_stats_count_skipped_faces(gate, rng):
+    frame, box = face_image(rng)
+    assert gate.filter(frame, [box, (0, 10, 10, 0), box]) == [0, 2]
+    stats = gate.stats()
+    assert (stats['assessed'], stats['skipped']) == (3, 1)
+    assert stats['encodings_saved'] == pytest.approx(1 / 3)
@@ -0,0 +1,82 @@
+"""Burst registration: shot selection and the background rating thread."""
+
+from types import SimpleNamespace
+
+import numpy as np
+
+from face_registration import BurstRegistration, select_shots
+
+
+def shot(encoding, score):
+    return {'encoding': np.asarray(encoding, dtype=np.float64),
+            'quality': SimpleNamespace(score=score, reason="ok")}
+
+
+def positions(shots, chosen):
+    return [next(i for i, shot in enumerate(shots) if shot is pick) for pick in chosen]
+
+
+def at(x):
+    encoding = np.zeros(128)
+    encoding[0] = x
+    return encoding
+
+
+def test_best_shot_first_then_diverse_ones():
+    shots = [shot(at(0.0), 0.9), shot(at(0.01), 0.95), shot(at(0.3), 0.5), shot(at(0.05), 0.8)]
+    chosen = select_shots(shots, keep=2, diversity=0.15)
+    # The near-duplicate of the best shot loses to a worse but different one
+    assert positions(shots, chosen) == [1, 2]
+
+
+def test_someone_else_in_the_burst_is_dropped():
+    shots = [shot(at(0.0), 0.5), shot(at(0.1), 0.5), shot(at(0.05), 0.5), shot(at(2.0), 1.0)]
+    chosen = select_shots(shots, keep=4, tolerance=0.6)
+    assert sorted(positions(shots, chosen)) == [0, 1, 2]
+    assert select_shots([], keep=3) == []
+
+
+class FakeEngine:
+    """rate_faces from the frame's first pixel: 0 = no face, 1 = too blurry."""
+    
+    tolerance = 0.6
+    
+    def rate_faces(self, frame, encode=False):
+        value = int(frame[0, 0, 0])
+        if value == 0:
+            return []
+        if value == 1:
+            return [{'quality': SimpleNamespace(score=0.1, reason="blurry")}]
+        face = shot(at(value / 1000), value / 255)
+        face['face'] = frame
+        return [face]
+
+
+def frame(value):
+    return np.full((4, 4, 3), value, dtype=np.uint8)
+
+
+def test_burst_rates_every_frame_and_keeps_the_best():
+    burst = BurstRegistration(FakeEngine(), frames=5, keep=2)
+    burst.start()
+    values = [0, 1, 200, 100, 250]
+    assert all(burst.submit(frame(value)) for value in values)
+    assert not burst.submit(frame(250))
+    
+    chosen = burst.finish()
+    assert burst.done
+    assert burst.rejected == ["blurry"]
+    assert [int(shot['face'][0, 0, 0]) for shot in chosen] == [250, 100]
+
+
+def test_finish_before_the_burst_is_full():
+    burst = BurstRegistration(FakeEngine(), frames=15)
+    burst.start()
+    burst.submit(frame(200))
+    submitted = frame(100)
+    burst.submit(submitted)
+    # Frames are copied, so the camera may reuse its buffer
+    submitted[:] = 0
+    
+    assert len(burst.finish()) == 2
+    assert not burst.submit(frame(200))
@@ -0,0 +1,119 @@
+"""FaceTracker: association, the encode-once policy and identity votes."""
+
+from face_tracking import FaceTracker, IdentityVotes, box_iou
+
+
+FACE = (100, 200, 200, 100)
+
+
+def moved(box, dx=0, dy=0):
+    top, right, bottom, left = box
+    return top + dy, right + dx, bottom + dy, left + dx
+
+
+def test_box_iou():
+    assert box_iou(FACE, FACE) == 1.0
+    assert box_iou(FACE, moved(FACE, dx=200)) == 0.0
+    assert box_iou(FACE, moved(FACE, dx=50)) == 50 * 100 / (2 * 100 * 100 - 50 * 100)
+
+
+def test_detector_runs_every_n_frames_and_tracks_keep_their_id():
+    tracker = FaceTracker(detect_interval=3)
+    calls = []
+    
+    def detect():
+        calls.append(tracker.frame_index)
+        return [moved(FACE, dx=5 * len(calls))]
+    
+    ids = {track.track_id for _ in range(9) for track in tracker.step(None, detect)}
+    assert calls == [0, 3, 6]
+    assert len(ids) == 1
+
+
+def test_fast_mover_is_matched_by_centroid():
+    tracker = FaceTracker(detect_interval=1)
+    first = tracker.step(None, lambda: [FACE])[0]
+    # Too little overlap for IoU, but the centre moved less than half a face
+    second = tracker.step(None, lambda: [moved(FACE, dx=35, dy=35)])
+    assert [track.track_id for track in second] == [first.track_id]
+
+
+def test_lost_tracks_expire_after_max_misses():
+    tracker = FaceTracker(detect_interval=1, max_misses=2)
+    tracker.step(None, lambda: [FACE])
+    assert len(tracker.step(None, lambda: [])) == 1
+    assert len(tracker.step(None, lambda: [])) == 1
+    assert tracker.step(None, lambda: []) == []
+
+
+def test_a_track_is_encoded_once_until_it_drifts_or_goes_stale():
+    tracker = FaceTracker(detect_interval=1, reencode_after=10.0)
+    track = tracker.step(None, lambda: [FACE])[0]
+    assert tracker.needs_encoding(track, now=0.0)
+    tracker.set_identity(track, "Alice", "S1", 90.0, now=0.0)
+    
+    tracker.step(None, lambda: [moved(FACE, dx=5)])
+    assert not tracker.needs_encoding(track, now=5.0)
+    assert tracker.needs_encoding(track, now=11.0)
+    tracker.step(None, lambda: [moved(FACE, dx=45)])
+    assert tracker.needs_encoding(track, now=5.0)
+
+
+def test_unknown_faces_are_retried_sooner():
+    tracker = FaceTracker(detect_interval=1, unknown_retry=1.0)
+    track = tracker.step(None, lambda: [FACE])[0]
+    tracker.set_identity(track, None, "", None, now=0.0)
+    assert track.has_identity and track.name is None
+    assert not tracker.needs_encoding(track, now=0.5)
+    assert tracker.needs_encoding(track, now=1.5)
+
+
+def test_stats_count_the_encodings_tracking_saved():
+    tracker = FaceTracker(detect_interval=1)
+    for _ in range(10):
+        for track in tracker.step(None, lambda: [FACE]):
+            if tracker.needs_encoding(track, now=0.0):
+                tracker.set_identity(track, "Alice", "S1", 90.0, now=0.0)
+    stats = tracker.stats()
+    assert (stats['faces_seen'], stats['encodings']) == (10, 1)
+    assert stats['encodings_saved'] == 0.9
+
+
+def test_votes_commit_after_min_votes_and_resist_one_noisy_frame():
+    votes = IdentityVotes(min_votes=2)
+    assert not votes.add("Alice", "S1", 90.0)
+    assert not votes.committed
+    assert votes.add("Alice", "S1", 92.0)
+    assert (votes.name, votes.student_id, votes.confidence) == ("Alice", "S1", 91.0)
+    
+    assert not votes.add("Bob", "S2", 95.0)
+    assert votes.name == "Alice" and not votes.settled
+    assert not votes.add("Alice", "S1", 90.0)
+    assert votes.settled
+
+
+def test_a_track_keeps_encoding_until_its_vote_settles():
+    tracker = FaceTracker(detect_interval=1, min_votes=2)
+    track = tracker.step(None, lambda: [FACE])[0]
+    tracker.set_identity(track, "Alice", "S1", 90.0, now=0.0)
+    assert not track.has_identity
+    assert tracker.needs_encoding(track, now=0.0)
+    assert tracker.set_identity(track, "Alice", "S1", 90.0, now=0.0)
+    assert not tracker.needs_encoding(track, now=0.0)
+
+
+def test_a_rejected_face_waits_until_it_moves_or_the_retry_passes():
+    tracker = FaceTracker(detect_interval=1, rejected_retry=1.0)
+    track = tracker.step(None, lambda: [FACE])[0]
+    tracker.set_rejected(track, now=0.0)
+    
+    for frame in range(10):
+        tracker.step(None, lambda: [moved(FACE, dx=frame % 2)])
+        assert not tracker.needs_encoding(track, now=0.03 * frame)
+    assert tracker.needs_encoding(track, now=1.5)
+    tracker.step(None, lambda: [moved(FACE, dx=40)])
+    assert tracker.needs_encoding(track, now=0.5)
+    assert tracker.stats()['rejections'] == 1
+    
+    tracker.set_identity(track, "Alice", "S1", 90.0, now=0.5)
+    assert track.rejected_box is None
@@ -0,0 +1,59 @@
+"""GalleryStore: appends commit atomically and stale files are refused."""
+
+import json
+
+import numpy as np
+
+from gallery_store import GalleryStore
+
+
+def rows(rng, count):
+    return rng.normal(size=(count, 128)).astype(np.float32)
+
+
+def table(keys, start=0):
+    return {key: [start + i, key.split(".")[0], 1, 1] for i, key in enumerate(keys)}
+
+
+def test_write_append_and_read_back(tmp_path, rng):
+    store = GalleryStore(tmp_path / "g.fgal", "model")
+    first, second = rows(rng, 2), rows(rng, 3)
+    store.write(first, table(["a.jpg", "b.jpg"]))
+    store.append(second, {**table(["a.jpg", "b.jpg"]), **table(["c.jpg", "d.jpg", "e.jpg"], start=2)})
+    
+    matrix, entries = GalleryStore(tmp_path / "g.fgal", "model").read()
+    assert isinstance(matrix, np.memmap)
+    np.testing.assert_array_equal(matrix, np.concatenate([first, second]))
+    assert sorted(entries['entries']) == ["a.jpg", "b.jpg", "c.jpg", "d.jpg", "e.jpg"]
+
+
+def test_rows_of_an_uncommitted_append_are_ignored(tmp_path, rng):
+    store = GalleryStore(tmp_path / "g.fgal", "model")
+    store.write(rows(rng, 2), table(["a.jpg", "b.jpg"]))
+    # A crash after the table was written but before the count was bumped
+    store.write_table({**table(["a.jpg", "b.jpg"]), **table(["c.jpg"], start=2)})
+    
+    matrix, entries = GalleryStore(tmp_path / "g.fgal", "model").read()
+    assert len(matrix) == 2
+    assert sorted(entries['entries']) == ["a.jpg", "b.jpg"]
+
+
+def test_copy_on_write_mapping_leaves_the_file_alone(tmp_path, rng):
+    data = rows(rng, 2)
+    GalleryStore(tmp_path / "g.fgal", "model").write(data, table(["a.jpg", "b.jpg"]))
+    matrix, _ = GalleryStore(tmp_path / "g.fgal", "model").read()
+    matrix[0] = 0.0
+    
+    reread, _ = GalleryStore(tmp_path / "g.fgal", "model").read()
+    np.testing.assert_array_equal(reread, data)
+
+
+def test_other_model_or_generation_is_refused(tmp_path, rng):
+    store = GalleryStore(tmp_path / "g.fgal", "model")
+    store.write(rows(rng, 1), table(["a.jpg"]))
+    assert GalleryStore(tmp_path / "g.fgal", "other model").read() is None
+    
+    saved = json.loads(store.table_path.read_text())
+    saved['generation'] += 1
+    store.table_path.write_text(json.dumps(saved))
+    assert GalleryStore(tmp_path / "g.fgal", "model").read() is None
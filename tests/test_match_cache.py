@@ -0,0 +1,120 @@
+"""MatchCache answers near-repeat probes exactly as the matcher would."""
+
+import numpy as np
+
+from conftest import synthetic_people
+from face_gallery import FaceGallery
+from match_cache import MatchCache
+
+
+TOLERANCE = 0.6
+
+
+class CountingMatcher:
+    """Wraps a gallery and counts the probes it had to match."""
+    
+    def __init__(self, gallery):
+        self.gallery = gallery
+        self.probes = 0
+    
+    @property
+    def version(self):
+        return self.gallery.version
+    
+    def best_matches(self, probes, tolerance):
+        self.probes += len(probes)
+        return self.gallery.best_matches(probes, tolerance)
+
+
+def test_repeated_probes_are_answered_from_the_cache(rng):
+    encodings, names = synthetic_people(rng, people=20, samples=2)
+    matcher = CountingMatcher(FaceGallery.from_encodings(encodings, names))
+    cache = MatchCache()
+    faces = encodings[[0, 10, 20]]
+    
+    first = cache.best_matches(matcher, faces, TOLERANCE)
+    for _ in range(10):
+        jittered = faces + rng.normal(scale=0.001, size=faces.shape).astype(np.float32)
+        assert [m[0] for m in cache.best_matches(matcher, jittered, TOLERANCE)] == [m[0] for m in first]
+    assert matcher.probes == 3
+    assert cache.stats()['hits'] == 30
+
+
+def test_cached_names_agree_with_the_gallery(rng):
+    encodings, names = synthetic_people(rng, people=30, samples=3)
+    gallery = FaceGallery.from_encodings(encodings, names)
+    cache = MatchCache()
+    probes = np.concatenate([
+        encodings[rng.choice(len(encodings), 200)] + rng.normal(scale=0.03, size=(200, 128)),
+        rng.normal(scale=0.08, size=(50, 128))
+    ]).astype(np.float32)
+    
+    cached = cache.best_matches(gallery, probes, TOLERANCE)
+    cached += cache.best_matches(gallery, probes, TOLERANCE)
+    exact = gallery.best_matches(probes, TOLERANCE) * 2
+    assert [name for name, _ in cached] == [name for name, _ in exact]
+    assert cache.stats()['hits'] >= len(probes)
+
+
+def test_decisions_near_the_tolerance_are_not_cached(rng):
+    gallery = FaceGallery.from_encodings(np.zeros((1, 128), dtype=np.float32), ["edge"])
+    probe = np.zeros((1, 128), dtype=np.float32)
+    probe[0, 0] = TOLERANCE - 0.01
+    cache = MatchCache()
+    cache.best_matches(gallery, probe, TOLERANCE)
+    cache.best_matches(gallery, probe, TOLERANCE)
+    assert cache.stats()['hits'] == 0
+
+
+def test_gallery_changes_drop_the_cache(rng):
+    encodings, names = synthetic_people(rng, people=5, samples=1)
+    gallery = FaceGallery.from_encodings(list(encodings), names, [f"{n}.jpg" for n in names])
+    cache = MatchCache()
+    assert cache.best_matches(gallery, encodings[:1], TOLERANCE)[0][0] == "person0"
+    
+    gallery.remove_key("person0.jpg")
+    assert cache.best_matches(gallery, encodings[:1], TOLERANCE)[0][0] is None
+    assert cache.stats()['invalidations'] == 1
+    
+    # Same contents but another matcher object, or another tolerance, start over too
+    other = FaceGallery.from_encodings(encodings, names)
+    assert cache.best_matches(other, encodings[:1], TOLERANCE)[0][0] == "person0"
+    cache.best_matches(other, encodings[:1], 0.5)
+    assert cache.stats()['invalidations'] == 3
+
+
+def test_entries_expire_and_are_evicted(rng, monkeypatch):
+    encodings, names = synthetic_people(rng, people=8, samples=1)
+    matcher = CountingMatcher(FaceGallery.from_encodings(encodings, names))
+    cache = MatchCache(ttl=5.0, max_entries=4)
+    
+    now = [100.0]
+    monkeypatch.setattr("match_cache.time.monotonic", lambda: now[0])
+    cache.best_matches(matcher, encodings, TOLERANCE)
+    assert cache.stats()['entries'] <= 4
+    
+    now[0] += 10.0
+    matcher.probes = 0
+    cache.best_matches(matcher, encodings[-1:], TOLERANCE)
+    assert matcher.probes == 1
+
+
+def test_matches_against_a_gallery_that_changed_meanwhile_are_not_kept(rng):
+    encodings, names = synthetic_people(rng, people=3, samples=1)
+    gallery = FaceGallery.from_encodings(encodings[:2], names[:2])
+    
+    cache = MatchCache()
+    
+    class RegisteringMatcher(CountingMatcher):
+        """The third person registers, and another stream looks up, while this probe is matched."""
+        
+        def best_matches(self, probes, tolerance):
+            matches = super().best_matches(probes, tolerance)
+            if len(self.gallery.names) == 2:
+                self.gallery.add(encodings[2], names[2])
+                cache.best_matches(self, encodings[:1], tolerance)
+            return matches
+    
+    matcher = RegisteringMatcher(gallery)
+    assert cache.best_matches(matcher, encodings[2:], TOLERANCE)[0][0] is None
+    assert cache.best_matches(matcher, encodings[2:], TOLERANCE)[0][0] == "person2"
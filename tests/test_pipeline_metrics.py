@@ -0,0 +1,78 @@
+"""Latency histograms, the metrics registry and the HTTP endpoint."""
+
+import json
+import time
+import urllib.request
+
+import pytest
+
+from pipeline_metrics import LatencyHistogram, MetricsServer, PipelineMetrics, Profiling
+
+
+def test_percentiles_are_within_one_bucket():
+    histogram = LatencyHistogram()
+    for ms in range(1, 101):
+        histogram.record(ms / 1000)
+    
+    p50, p95, p99 = histogram.percentiles()
+    # Upper bucket edges, at most ~5% above the true value
+    assert 0.050 <= p50 <= 0.050 * 1.05
+    assert 0.095 <= p95 <= 0.095 * 1.05
+    assert 0.099 <= p99 <= 0.099 * 1.05
+    
+    summary = histogram.summary()
+    assert summary['count'] == 100
+    assert summary['mean_ms'] == pytest.approx(50.5)
+    assert summary['max_ms'] == pytest.approx(100.0)
+
+
+def test_out_of_range_durations_land_in_the_end_buckets():
+    histogram = LatencyHistogram()
+    histogram.record(0.0)
+    histogram.record(1e6)
+    assert histogram.count == 2
+    assert histogram.percentiles((0.5,)) == [LatencyHistogram.MIN_SECONDS]
+    assert LatencyHistogram().percentiles() == [0.0, 0.0, 0.0]
+
+
+def test_snapshot_is_in_pipeline_order(tmp_path):
+    metrics = PipelineMetrics()
+    metrics.record("zzz", 0.001)
+    metrics.record("encode", 0.002)
+    with metrics.time("capture"):
+        pass
+    metrics.record("custom", 0.001)
+    
+    assert list(metrics.snapshot()) == ["capture", "encode", "custom", "zzz"]
+    data = json.loads(metrics.dump(tmp_path / "metrics.json").read_text(encoding='utf-8'))
+    assert data['stages']['encode']['count'] == 1
+    
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+
+def test_profiler_writes_a_report(tmp_path):
+    profiling = Profiling(tmp_path)
+    assert profiling.toggle() is None
+    assert profiling.active
+    time.sleep(0.05)
+    path = profiling.toggle()
+    assert not profiling.active
+    assert "samples every" in path.read_text(encoding='utf-8')
+
+
+def test_metrics_endpoint(tmp_path):
+    metrics = PipelineMetrics()
+    metrics.record("detect", 0.01)
+    server = MetricsServer(0, metrics, Profiling(tmp_path))
+    server.start()
+    try:
+        url = f"http://127.0.0.1:{server.server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            assert json.load(response)['stages']['detect']['count'] == 1
+        with urllib.request.urlopen(f"{url}/profile/start") as response:
+            assert json.load(response) == {'profiling': True}
+        with urllib.request.urlopen(f"{url}/profile/stop") as response:
+            assert json.load(response)['report'].startswith(str(tmp_path))
+    finally:
+        server.stop()
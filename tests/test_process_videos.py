@@ -0,0 +1,97 @@
+"""process_videos: segmenting, frame sampling and the parent's gallery sync."""
+
+import csv
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import process_videos
+from conftest import FakeEncoder, write_photo
+from encoding_cache import EncodingCache
+
+
+MODEL = "test-model"
+
+
+@pytest.fixture
+def fake_encoder(monkeypatch):
+    encoder = FakeEncoder()
+    monkeypatch.setattr(process_videos, "encoder_model_id", lambda: MODEL)
+    monkeypatch.setattr(process_videos, "encode_image_file", encoder)
+    return encoder
+
+
+def write_clip(path, frames=20, fps=10):
+    cv2 = pytest.importorskip("cv2")
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (32, 24))
+    for i in range(frames):
+        writer.write(np.full((24, 32, 3), i * 10, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+class FakeExecutor:
+    """Answers every segment with the same canned sightings."""
+    
+    def __init__(self, sightings):
+        self.sightings = sightings
+    
+    def map(self, fn, jobs):
+        return [(self.sightings, len(self.sightings), 0) for _ in jobs]
+
+
+def test_segments_are_stride_aligned_and_cover_the_video():
+    jobs = process_videos.segments("v.mp4", frame_count=1000, fps=30.0, stride=7, segment_seconds=2.0)
+    assert jobs[0][1] == 0 and jobs[-1][2] == 1000
+    for (_, start, end, stride), (_, next_start, _, _) in zip(jobs, jobs[1:]):
+        assert end == next_start
+        assert start % stride == 0
+    assert process_videos.segments("v.mp4", 0, 30.0, 7, 2.0) == [("v.mp4", 0, None, 7)]
+
+
+def test_iter_frames_decodes_every_stride_th_frame(tmp_path):
+    path = write_clip(tmp_path / "clip.avi")
+    frames = list(process_videos.iter_frames(path, stride=3, start=6, end=15))
+    assert [index for index, _, _ in frames] == [6, 9, 12]
+    assert [seconds for _, seconds, _ in frames] == pytest.approx([0.6, 0.9, 1.2])
+    assert [int(frame.mean()) for _, _, frame in frames] == pytest.approx([60, 90, 120], abs=3)
+
+
+def test_sync_gallery_leaves_no_rows_for_the_workers_to_compact(tmp_path, fake_encoder):
+    for name in ["Alice", "Bob", "Carol"]:
+        write_photo(tmp_path / f"{name}.jpg", name.encode())
+    assert process_videos.sync_gallery(tmp_path) == 3
+    
+    (tmp_path / "Bob.jpg").unlink()
+    write_photo(tmp_path / "Carol.jpg", b"carol, new photo", mtime_ns=2_000_000_000)
+    assert process_videos.sync_gallery(tmp_path) == 2
+    
+    # What a worker sees: nothing left that load() would have to drop
+    cache = EncodingCache(tmp_path / "encodings.fgal", MODEL)
+    assert cache.load()
+    assert cache.store.count == 2
+    assert sorted(cache.rows()[1]) == ["Alice", "Carol"]
+
+
+def test_first_sighting_per_student_is_written_once(tmp_path):
+    video = write_clip(tmp_path / "clip.avi")
+    executor = FakeExecutor([(3.0, "Alice", 90.0), (1.0, "Bob", 80.0), (5.0, "Alice", 95.0)])
+    start = datetime(2024, 5, 1, 9, 0)
+    summary = process_videos.process_video(executor, {"Alice": "S1"}, tmp_path, video, "Lecture",
+                                           start, stride=5, segment_seconds=1.0, file_name="Lecture_clip")
+    
+    assert summary['file'].name == "20240501_0900_Lecture_clip.csv"
+    with open(summary['file'], newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))[1:]
+    # Both segments report the same sightings; only the earliest per person counts
+    assert [(row[0], row[2], row[3], row[4]) for row in rows] == [
+        ("Lecture", "09:00:01", "Bob", ""), ("Lecture", "09:00:03", "Alice", "S1")
+    ]
+
+
+def test_load_student_ids(tmp_path):
+    students = tmp_path / "students.csv"
+    students.write_text("name,student_id\nAlice,S1\n,S2\nBob,\n", encoding='utf-8')
+    assert process_videos.load_student_ids(students) == {"Alice": "S1", "Bob": ""}
+    assert process_videos.load_student_ids(tmp_path / "missing.csv") == {}
@@ -0,0 +1,129 @@
+"""RecognitionEngine without a camera or dlib: recognition, sessions and stats."""
+
+import csv
+
+import numpy as np
+import pytest
+
+# Skipped where importing the engine still needs face_recognition (dlib)
+recognition_engine = pytest.importorskip("recognition_engine")
+
+
+ALICE = np.random.default_rng(1).normal(scale=0.08, size=128)
+
+
+class FakeDetector:
+    """One face in the middle of every frame."""
+    
+    upsample = 0
+    
+    def detect(self, rgb_image):
+        height, width = rgb_image.shape[:2]
+        return [(height // 4, 3 * width // 4, 3 * height // 4, width // 4)]
+    
+    def detect_batch(self, rgb_images):
+        return [self.detect(image) for image in rgb_images]
+
+
+class FakeFaceEncoder:
+    """Every face encodes to ALICE."""
+    
+    def __init__(self, *args, **kwargs):
+        pass
+    
+    def chips(self, rgb_image, locations):
+        return [None] * len(locations)
+    
+    def encode_chips(self, chips):
+        return np.tile(ALICE, (len(chips), 1))
+    
+    def encode(self, rgb_image, locations):
+        return self.encode_chips(self.chips(rgb_image, locations))
+
+
+@pytest.fixture
+def make_engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(recognition_engine, "encoder_model_id", lambda: "test-model")
+    monkeypatch.setattr(recognition_engine, "create_detector", lambda *args, **kwargs: FakeDetector())
+    monkeypatch.setattr(recognition_engine, "FaceEncoder", FakeFaceEncoder, raising=False)
+    (tmp_path / "students.csv").write_text("name,student_id\nAlice,S1\n", encoding='utf-8')
+    engines = []
+    
+    def make(**kwargs):
+        engine = recognition_engine.RecognitionEngine(
+            tmp_path / "known_faces", tmp_path / "attendance_records", tmp_path / "students.csv",
+            quality_gate=False, **kwargs
+        )
+        engines.append(engine)
+        return engine
+    
+    yield make
+    for engine in engines:
+        engine.close()
+
+
+def frame():
+    return np.full((240, 320, 3), 128, dtype=np.uint8)
+
+
+def test_a_recognized_student_is_marked_present_once(make_engine):
+    engine = make_engine(vote_frames=1)
+    engine.gallery.add(ALICE, "Alice")
+    path = engine.start_session("Math 101")
+    
+    marked = []
+    for _ in range(5):
+        for face in engine.process(frame()):
+            assert (face['name'], face['student_id']) == ("Alice", "S1")
+            marked.append(face['marked'])
+    assert marked == [True, False, False, False, False]
+    assert engine.end_session() == 1
+    
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    assert [row[0] for row in rows[1:]] == ["Math 101"]
+    assert [row[3:5] for row in rows[1:]] == [["Alice", "S1"]]
+
+
+def test_unknown_faces_are_not_marked(make_engine):
+    engine = make_engine(vote_frames=1)
+    engine.start_session("Math 101")
+    faces = engine.process(frame())
+    assert [(face['name'], face['marked']) for face in faces] == [("Unknown", False)]
+    assert engine.end_session() == 0
+
+
+def test_stats_of_a_stream_that_never_ran_are_empty(make_engine):
+    engine = make_engine()
+    stats = engine.stats("camera-2")
+    assert stats['tracking'] == {} and stats['schedule'] == {}
+    assert "camera-2" not in engine.streams
+    
+    engine.process(frame(), "camera-2")
+    assert engine.stats("camera-2")['tracking']['frames'] == 1
+
+
+def test_burst_shots_are_registered_without_encoding_again(make_engine, monkeypatch):
+    engine = make_engine(vote_frames=1)
+    shots = [{'face': np.full((100, 80, 3), 128, dtype=np.uint8), 'encoding': ALICE + 0.01 * i}
+             for i in range(2)]
+    monkeypatch.setattr(recognition_engine, "encode_image_file",
+                        lambda path: pytest.fail("registered photo was encoded again"), raising=False)
+    
+    files = engine.register_encodings(shots, "Bob", "S2")
+    assert [path.name for path in files] == ["Bob.jpg", "Bob__2.jpg"]
+    assert engine.photo_counts()["Bob"] == 2
+    assert engine.student_info["Bob"] == {'student_id': "S2"}
+    
+    # The cache entries stay valid, so a refresh finds nothing to do
+    engine.refresh_known_faces()
+    assert engine.photo_counts()["Bob"] == 2
+
+
+def test_startup_steps_are_reported_and_models_warmed_up(make_engine):
+    steps = []
+    engine = make_engine(progress=steps.append)
+    assert steps == ["Loading face models", "Loading HOG detector", "Loading known faces", "Loading students"]
+    
+    engine.warm_up(320, 240)
+    assert "warm_up" in recognition_engine.METRICS.snapshot()
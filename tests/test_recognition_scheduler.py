@@ -0,0 +1,68 @@
+"""AdaptiveScheduler: walks detection stride, resolution and upsampling to the budget."""
+
+from recognition_scheduler import AdaptiveScheduler
+
+
+FACE = (0, 400, 400, 0)  # big enough to need no upscaling at any scale
+
+
+def feed(scheduler, frames, detect_ms, faces=1, encode_ms=0.0, box=FACE):
+    for frame in range(frames):
+        timings = {'encode': encode_ms / 1000}
+        boxes = None
+        if frame % scheduler.detect_interval == 0:
+            # Detection cost follows the pixel count
+            timings['detect'] = detect_ms * scheduler.scale ** 2 * 4 ** scheduler.upsample / 1000
+            boxes = [box] * faces
+        scheduler.record(timings, boxes)
+
+
+def test_over_budget_detects_less_often_first():
+    scheduler = AdaptiveScheduler(target_ms=40, detect_interval=1, max_upsample=0)
+    scheduler.scale_level = 1
+    feed(scheduler, 10, detect_ms=400)
+    assert scheduler.detect_interval == 2
+    assert scheduler.reason == "over budget: detect less often"
+    
+    feed(scheduler, 200, detect_ms=400)
+    assert scheduler.amortized_ms() <= 40
+    assert scheduler.detect_interval > 2
+
+
+def test_at_the_longest_stride_resolution_and_upsampling_go_next():
+    scheduler = AdaptiveScheduler(target_ms=10, detect_interval=15, max_interval=15, max_upsample=1)
+    scheduler.scale_level = 3
+    feed(scheduler, 60, detect_ms=2000)
+    assert scheduler.scale_level < 3
+    feed(scheduler, 300, detect_ms=2000)
+    assert scheduler.scale_level == 0
+    assert scheduler.upsample == 0
+
+
+def test_headroom_walks_back_to_frequent_detection():
+    scheduler = AdaptiveScheduler(target_ms=40, detect_interval=8, max_upsample=0)
+    scheduler.scale_level = 1
+    feed(scheduler, 100, detect_ms=4)
+    assert scheduler.detect_interval == 1
+    assert scheduler.reason.startswith("headroom")
+
+
+def test_crowded_rooms_get_a_smaller_frame():
+    scheduler = AdaptiveScheduler(target_ms=1000, detect_interval=1, max_upsample=0)
+    scheduler.scale_level = 2
+    feed(scheduler, 10, detect_ms=1, faces=10)
+    assert scheduler.scale_level == 1
+    assert scheduler.reason == "crowded: lower resolution"
+
+
+def test_small_faces_raise_the_resolution():
+    scheduler = AdaptiveScheduler(target_ms=1000, detect_interval=2, max_upsample=0)
+    feed(scheduler, 10, detect_ms=1, box=(100, 200, 200, 100))
+    # 100px faces are 25px at a quarter of the resolution
+    assert scheduler.scale_level == 1
+
+
+def test_empty_rooms_get_full_resolution():
+    scheduler = AdaptiveScheduler(target_ms=1000, detect_interval=1, max_upsample=0)
+    feed(scheduler, 10, detect_ms=1, faces=0)
+    assert scheduler.scale == 1.0
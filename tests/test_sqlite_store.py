@@ -0,0 +1,104 @@
+"""SQLite store: upserts, encodings, attendance import and reports."""
+
+from datetime import datetime
+
+import numpy as np
+
+from attendance_sink import CSVSink, attendance_row
+from conftest import FakeEncoder, write_photo
+from encoding_cache import EncodingCache
+from sqlite_store import SQLiteStore, parse_confidence
+
+
+START = datetime(2024, 5, 1, 9, 30)
+
+
+def write_session(directory, name, start, people):
+    sink = CSVSink(directory, name, start)
+    sink.open()
+    sink.write([attendance_row(name, start, person, student_id, 90.0) for person, student_id in people])
+    sink.close()
+    return sink.path
+
+
+def test_parse_confidence():
+    assert parse_confidence("93.4%") == 93.4
+    assert parse_confidence("-") is None
+    assert parse_confidence("") is None
+
+
+def test_students_are_upserted(tmp_path):
+    store = SQLiteStore(tmp_path / "db.sqlite")
+    store.upsert_students([("Alice", "S1"), ("Bob", "")])
+    store.upsert_students([("Bob", "S2")])
+    assert store.students() == {'Alice': {'student_id': 'S1'}, 'Bob': {'student_id': 'S2'}}
+    
+    store.delete_student("Alice")
+    assert list(store.students()) == ["Bob"]
+    store.close()
+
+
+def test_encodings_roundtrip_per_model(tmp_path, rng):
+    store = SQLiteStore(tmp_path / "db.sqlite")
+    vectors = rng.normal(size=(2, 128)).astype(np.float32)
+    store.put_encodings([("a.jpg", "Alice", "m1", 10, 1, vectors[0]),
+                         ("b.jpg", "Bob", "m1", 10, 1, vectors[1]),
+                         ("c.jpg", "Carol", "m2", 10, 1, vectors[0])])
+    
+    matrix, names, keys = store.encodings("m1")
+    assert np.array_equal(matrix, vectors)
+    assert (names, keys) == (["Alice", "Bob"], ["a.jpg", "b.jpg"])
+    assert store.encoding_count("m2") == 1
+    
+    store.delete_encodings(["a.jpg"])
+    assert store.encoding_count("m1") == 1
+    store.close()
+
+
+def test_import_encoding_cache(tmp_path):
+    known_faces = tmp_path / "known_faces"
+    known_faces.mkdir()
+    photos = [write_photo(known_faces / "Alice.jpg", b"alice"), write_photo(known_faces / "Bob.jpg", b"bob")]
+    cache = EncodingCache(known_faces / "encodings.fgal", "model")
+    cache.sync(photos, FakeEncoder())
+    
+    store = SQLiteStore(tmp_path / "db.sqlite")
+    assert store.import_encoding_cache(cache) == 2
+    _, names, _ = store.encodings("model")
+    assert names == ["Alice", "Bob"]
+    store.close()
+
+
+def test_attendance_import_is_incremental_and_reported(tmp_path):
+    records = tmp_path / "attendance_records"
+    records.mkdir()
+    write_session(records, "Lecture", START, [("Alice", "S1"), ("Bob", "")])
+    write_session(records, "Lab", datetime(2024, 5, 2, 14, 0), [("Alice", "S1")])
+    
+    store = SQLiteStore(tmp_path / "db.sqlite")
+    assert store.import_attendance_dir(records) == 3
+    # Unchanged files are skipped
+    assert store.import_attendance_dir(records) == 0
+    
+    sessions = store.sessions()
+    assert [(name, present) for _, name, _, present in sessions] == [("Lecture", 2), ("Lab", 1)]
+    assert [row[0] for row in store.student_report("S1")] == ["Lecture", "Lab"]
+    # People without a student ID are looked up by name
+    assert [row[0] for row in store.student_report("Bob")] == ["Lecture"]
+    assert [row[0] for row in store.student_report("S1", since="2024-05-02")] == ["Lab"]
+    
+    lecture_id = sessions[0][0]
+    assert store.session_rows(lecture_id)[0] == ["Lecture", "2024-05-01", "09:30:00", "Alice", "S1", "90.0%"]
+    store.close()
+
+
+def test_repeated_rows_are_ignored(tmp_path):
+    store = SQLiteStore(tmp_path / "db.sqlite")
+    session_id = store.session_id("Lecture", START.isoformat())
+    assert store.session_id("Lecture", START.isoformat()) == session_id
+    
+    row = attendance_row("Lecture", START, "Alice", "S1", 90.0)
+    store.add_attendance(session_id, [row])
+    store.add_attendance(session_id, [row])
+    assert len(store.session_report(session_id)) == 1
+    store.close()
@@ -0,0 +1,152 @@
+"""Capture/recognition threads, the shared stream pool and frame buffer reuse."""
+
+import threading
+import time
+
+import numpy as np
+
+from video_pipeline import CaptureThread, FramePool, FrameSlot, RecognitionWorker, StreamPool
+
+
+class FakeCapture:
+    """cv2.VideoCapture stand-in: frames numbered 1..count (mod 256), then failed reads."""
+    
+    def __init__(self, count, delay=0.0):
+        self.count = count
+        self.delay = delay
+        self.index = 0
+    
+    def read(self, image=None):
+        time.sleep(self.delay)
+        if self.index >= self.count:
+            return False, None
+        self.index += 1
+        frame = np.empty((4, 4), dtype=np.uint8) if image is None else image
+        frame[:] = self.index % 256
+        return True, frame
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_frame_slot_keeps_only_the_newest_item():
+    slot = FrameSlot()
+    assert slot.put(1) is None
+    assert slot.put(2) == 1
+    assert slot.depth() == 1
+    assert slot.take() == 2
+    assert slot.take(timeout=0.01) is None
+    assert (slot.put_count, slot.dropped) == (2, 1)
+
+
+def test_capture_thread_publishes_the_newest_frame():
+    capture = CaptureThread(FakeCapture(5), max_failures=3)
+    capture.start()
+    capture.join(5.0)
+    frame_id, frame = capture.latest()
+    assert (frame_id, int(frame[0, 0])) == (5, 5)
+    assert capture.stats()['frames'] == 5
+
+
+def test_recognition_worker_processes_the_newest_submitted_frame():
+    seen = []
+    started = threading.Event()
+    release = threading.Event()
+    
+    def process(frame, mode):
+        started.set()
+        release.wait(5.0)
+        seen.append(frame)
+        return [mode]
+    
+    worker = RecognitionWorker(process)
+    worker.start()
+    worker.submit(1, "first", "recognize")
+    started.wait(5.0)
+    # The worker is busy: of these, only the last one is still waiting
+    for frame_id, frame in enumerate(["second", "third", "fourth"], 2):
+        worker.submit(frame_id, frame, "recognize")
+    release.set()
+    wait_for(lambda: worker.stats()['frames'] == 2)
+    worker.stop()
+    
+    assert seen == ["first", "fourth"]
+    assert worker.latest_results()['frame_id'] == 4
+    assert worker.stats()['dropped'] == 2
+
+
+def test_stream_pool_processes_every_frame_of_a_file_source():
+    seen = {"a": [], "b": []}
+    
+    def process(stream_id, frame):
+        time.sleep(0.002)
+        seen[stream_id].append(int(frame[0, 0]))
+        return []
+    
+    pool = StreamPool(process, workers=2)
+    pool.add_stream("a", FakeCapture(40), max_failures=3, block=True)
+    pool.add_stream("b", FakeCapture(40), max_failures=3, block=True)
+    pool.start()
+    wait_for(lambda: not pool.alive())
+    stats = pool.stats()
+    pool.stop()
+    
+    assert seen == {"a": list(range(1, 41)), "b": list(range(1, 41))}
+    assert stats["a"]['dropped'] == stats["b"]['dropped'] == 0
+
+
+def test_stream_pool_drops_stale_frames_of_a_live_source():
+    seen = []
+    
+    def process(stream_id, frame):
+        time.sleep(0.02)
+        seen.append(int(frame[0, 0]))
+        return []
+    
+    pool = StreamPool(process, workers=1)
+    pool.add_stream("camera", FakeCapture(100, delay=0.001), max_failures=3)
+    pool.start()
+    wait_for(lambda: not pool.alive())
+    stats = pool.stats()["camera"]
+    pool.stop()
+    
+    assert seen == sorted(seen) and len(seen) < 100
+    assert stats['frames'] + stats['dropped'] == seen[-1]
+
+
+def test_frame_pool_reuses_a_buffer_only_after_every_holder_released_it():
+    pool = FramePool()
+    frame = pool.acquire((4, 4))
+    pool.retain(frame)
+    pool.release(frame)
+    assert pool.acquire((4, 4)) is not frame
+    
+    pool.release(frame)
+    assert pool.acquire((4, 4)) is frame
+    assert pool.stats()['allocations'] == 2
+    # Arrays the pool never handed out are ignored
+    pool.release(np.empty((4, 4), dtype=np.uint8))
+    assert pool.stats()['in_use'] == 2
+
+
+def test_frames_handed_out_by_a_pooled_capture_are_never_overwritten():
+    pool = FramePool()
+    capture = CaptureThread(FakeCapture(2000), max_failures=3, pool=pool)
+    capture.start()
+    corrupted = 0
+    while capture.is_alive():
+        frame_id, frame = capture.latest()
+        if frame is None:
+            continue
+        value = int(frame[0, 0])
+        time.sleep(0.0005)
+        corrupted += int((frame != value).any())
+        capture.release(frame)
+    capture.join(5.0)
+    
+    assert corrupted == 0
+    assert pool.stats()['allocations'] < 20
@@ -0,0 +1,491 @@
+"""
+Background video pipeline for the attendance system
+Keeps camera capture and face recognition off the Tk main thread, and
+shares one pool of recognition workers between several video streams
+"""
+
+import collections
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from pipeline_metrics import METRICS
+
+
+class FrameSlot:
+    """Single-slot mailbox that only ever holds the newest item."""
+    
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self.put_count = 0
+        self.dropped = 0
+    
+    def put(self, item):
+        """Store an item, replacing (and counting) any stale one; returns the stale item."""
+        with self._cond:
+            stale, self._item = self._item, item
+            if stale is not None:
+                self.dropped += 1
+            self.put_count += 1
+            self._cond.notify()
+            return stale
+    
+    def take(self, timeout: Optional[float] = None):
+        """Remove and return the item, waiting up to timeout seconds."""
+        with self._cond:
+            if self._item is None:
+                self._cond.wait(timeout)
+            item, self._item = self._item, None
+            return item
+    
+    def clear(self):
+        """Discard the pending item without counting it as dropped; returns it."""
+        with self._cond:
+            item, self._item = self._item, None
+            return item
+    
+    def depth(self) -> int:
+        """Number of items waiting (0 or 1)."""
+        with self._cond:
+            return 0 if self._item is None else 1
+
+
+class FramePool:
+    """Frame buffers with explicit owners, reused once the last one lets go.
+    
+    acquire() hands out a buffer with one holder; each further reader
+    (another thread) calls retain() and every holder calls release() when
+    done. Only then does the buffer go back on the free list, so a frame
+    still being read is never handed out and overwritten. release() of an
+    array the pool did not hand out is a no-op.
+    """
+    
+    def __init__(self, max_buffers: int = 8):
+        self.max_buffers = max_buffers  # free buffers kept for reuse
+        self._lock = threading.Lock()
+        self._free: List[np.ndarray] = []
+        # id(buffer) -> [buffer, holders]; the buffer itself keeps its id from being reused
+        self._held: Dict[int, list] = {}
+        
+        # Counters
+        self.allocations = 0
+        self.reuses = 0
+    
+    def acquire(self, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """A free buffer of shape/dtype, allocating (and counting) only if none is."""
+        shape = tuple(shape)
+        with self._lock:
+            for i in range(len(self._free) - 1, -1, -1):
+                buffer = self._free[i]
+                if buffer.shape == shape and buffer.dtype == dtype:
+                    del self._free[i]
+                    self.reuses += 1
+                    break
+            else:
+                # Free buffers of another size are stale (e.g. the resolution changed)
+                self._free = [b for b in self._free if b.shape == shape and b.dtype == dtype]
+                buffer = np.empty(shape, dtype=dtype)
+                self.allocations += 1
+            self._held[id(buffer)] = [buffer, 1]
+            return buffer
+    
+    def retain(self, buffer: Optional[np.ndarray]):
+        """Add a holder to a buffer acquired from this pool."""
+        with self._lock:
+            held = self._held.get(id(buffer))
+            if held is not None and held[0] is buffer:
+                held[1] += 1
+    
+    def release(self, buffer: Optional[np.ndarray]):
+        """Drop a holder; the last one returns the buffer to the free list."""
+        with self._lock:
+            held = self._held.get(id(buffer))
+            if held is None or held[0] is not buffer:
+                return
+            held[1] -= 1
+            if held[1] > 0:
+                return
+            del self._held[id(buffer)]
+            if len(self._free) < self.max_buffers:
+                self._free.append(buffer)
+    
+    def stats(self) -> Dict[str, int]:
+        """Buffer counts; allocations stop growing once the pool is warm."""
+        with self._lock:
+            return {
+                'buffers': len(self._free) + len(self._held),
+                'in_use': len(self._held),
+                'allocations': self.allocations,
+                'reuses': self.reuses
+            }
+
+
+class CaptureThread(threading.Thread):
+    """Reads frames from a capture device as fast as it delivers them.
+    
+    on_frame() is called after every new frame. With max_failures set the
+    thread ends after that many consecutive failed reads (end of a file).
+    With block set (video files) the next frame is only read once latest()
+    has taken the current one, so none are dropped and results do not
+    depend on how fast the machine is; live cameras keep only the newest.
+    With a pool, frames are decoded into reused buffers instead of new ones;
+    each frame latest() returns must then be given back with release().
+    """
+    
+    def __init__(self, capture, name: str = "capture",
+                 on_frame: Optional[Callable[[], None]] = None, max_failures: int = 0,
+                 pool: Optional[FramePool] = None, block: bool = False):
+        super().__init__(name=name, daemon=True)
+        self.capture = capture
+        self.on_frame = on_frame
+        self.max_failures = max_failures
+        self.pool = pool
+        self.block = block
+        self._lock = threading.Lock()
+        self._consumed = threading.Condition(self._lock)
+        self._stop_event = threading.Event()
+        self._frame = None
+        self._frame_id = 0
+        self._consumed_id = 0
+        
+        # Counters
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.read_failures = 0
+    
+    def run(self):
+        failures = 0
+        shape = None
+        while not self._stop_event.is_set():
+            if self.block:
+                with self._consumed:
+                    while self._frame_id > self._consumed_id and not self._stop_event.is_set():
+                        self._consumed.wait(0.1)
+            
+            start = time.perf_counter()
+            if self.pool is not None and shape is not None:
+                buffer = self.pool.acquire(shape)
+                ret, frame = self.capture.read(buffer)
+                if not ret or frame is not buffer:
+                    self.pool.release(buffer)
+            else:
+                ret, frame = self.capture.read()
+            if not ret:
+                self.read_failures += 1
+                failures += 1
+                if self.max_failures and failures >= self.max_failures:
+                    break
+                time.sleep(0.01)
+                continue
+            failures = 0
+            shape = frame.shape
+            METRICS.record('capture', time.perf_counter() - start)
+            
+            with self._lock:
+                # The display never saw the previous frame
+                if self._frame_id > self._consumed_id:
+                    self.frames_dropped += 1
+                # This thread's hold moves from the previous frame to the new one
+                self.release(self._frame)
+                self._frame = frame
+                self._frame_id += 1
+                self.frames_read += 1
+            if self.on_frame is not None:
+                self.on_frame()
+    
+    def latest(self):
+        """Return (frame_id, frame) for the newest frame, or (0, None).
+        
+        The caller holds the frame until it calls release(frame).
+        """
+        with self._lock:
+            self._consumed_id = self._frame_id
+            self._consumed.notify()
+            if self.pool is not None:
+                self.pool.retain(self._frame)
+            return self._frame_id, self._frame
+    
+    def release(self, frame):
+        """Give back a frame from latest() (a no-op without a pool)."""
+        if self.pool is not None:
+            self.pool.release(frame)
+    
+    def stop(self, timeout: float = 1.0):
+        """Ask the thread to exit and wait for it."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+    
+    def stats(self) -> Dict[str, int]:
+        """Counters for the capture stage."""
+        with self._lock:
+            pending = 1 if self._frame_id > self._consumed_id else 0
+        return {
+            'frames': self.frames_read,
+            'dropped': self.frames_dropped,
+            'failures': self.read_failures,
+            'queue': pending,
+            'allocations': self.pool.allocations if self.pool is not None else self.frames_read
+        }
+
+
+class RecognitionWorker(threading.Thread):
+    """Runs face processing on the newest submitted frame only.
+    
+    process_fn(frame, mode) is called on the worker thread and must not touch
+    Tk widgets. Its return value is published with the frame id and mode so
+    the UI thread can overlay the most recent results. With a pool, submit()
+    takes a hold on the frame that the worker releases once it is done with
+    it (or drops it unprocessed).
+    """
+    
+    def __init__(self, process_fn: Callable[[Any, str], list], name: str = "recognition",
+                 pool: Optional[FramePool] = None):
+        super().__init__(name=name, daemon=True)
+        self.process_fn = process_fn
+        self.pool = pool
+        self._slot = FrameSlot()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._results: Optional[Dict] = None
+        
+        # Counters
+        self.frames_processed = 0
+        self.errors = 0
+        self.busy_time = 0.0
+        self.last_latency = 0.0
+    
+    def submit(self, frame_id: int, frame, mode: str):
+        """Queue a frame, dropping whichever frame is still waiting."""
+        if self.pool is not None:
+            self.pool.retain(frame)
+        self._release(self._slot.put((frame_id, frame, mode)))
+    
+    def _release(self, item):
+        if item is not None and self.pool is not None:
+            self.pool.release(item[1])
+    
+    def run(self):
+        while not self._stop_event.is_set():
+            item = self._slot.take(timeout=0.1)
+            if item is None:
+                continue
+            
+            frame_id, frame, mode = item
+            start = time.perf_counter()
+            try:
+                faces = self.process_fn(frame, mode)
+            except Exception as e:
+                self.errors += 1
+                print(f"Recognition error: {e}")
+                continue
+            finally:
+                self._release(item)
+            latency = time.perf_counter() - start
+            
+            with self._lock:
+                self._results = {
+                    'frame_id': frame_id,
+                    'mode': mode,
+                    'faces': faces,
+                    'latency': latency
+                }
+                self.frames_processed += 1
+                self.busy_time += latency
+                self.last_latency = latency
+    
+    def latest_results(self) -> Optional[Dict]:
+        """Return the most recent results dict, or None."""
+        with self._lock:
+            return self._results
+    
+    def clear(self):
+        """Forget pending frames and published results (e.g. on mode change)."""
+        self._release(self._slot.clear())
+        with self._lock:
+            self._results = None
+    
+    def stop(self, timeout: float = 1.0):
+        """Ask the thread to exit and wait for it."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+    
+    def stats(self) -> Dict[str, float]:
+        """Counters for the recognition stage."""
+        with self._lock:
+            processed = self.frames_processed
+            latency = self.last_latency
+        return {
+            'frames': processed,
+            'dropped': self._slot.dropped,
+            'errors': self.errors,
+            'queue': self._slot.depth(),
+            'latency_ms': latency * 1000
+        }
+
+
+class _Stream:
+    """Per-stream bookkeeping inside a StreamPool."""
+    
+    def __init__(self, capture_thread: CaptureThread):
+        self.capture_thread = capture_thread
+        self.last_frame_id = 0
+        self.busy = False
+        self.results: Optional[Dict] = None
+        
+        # Counters
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.errors = 0
+        self.last_latency = 0.0
+        self.done_times = collections.deque(maxlen=30)
+
+
+class StreamPool:
+    """Recognition workers shared by several capture threads.
+    
+    Workers take streams round-robin, always the newest frame of the next
+    stream that has one, so a fast camera cannot starve a slow one.
+    process_fn(stream_id, frame) runs on a worker thread; frames of one
+    stream are never processed concurrently, so per-stream state needs no
+    lock. on_results(stream_id, results) is called after each frame.
+    """
+    
+    def __init__(self, process_fn: Callable[[Hashable, Any], list], workers: Optional[int] = None,
+                 on_results: Optional[Callable[[Hashable, Dict], None]] = None):
+        self.process_fn = process_fn
+        self.on_results = on_results
+        self.workers = workers or os.cpu_count() or 1
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._streams: Dict[Hashable, _Stream] = {}
+        self._order = []
+        self._next = 0
+        self._threads = []
+    
+    def add_stream(self, stream_id: Hashable, capture, max_failures: int = 0,
+                   block: bool = False) -> CaptureThread:
+        """Start reading a capture object (cv2.VideoCapture) as stream_id.
+        
+        block=True for video files: every frame is processed instead of the newest.
+        """
+        capture_thread = CaptureThread(
+            capture, name=f"capture-{stream_id}", on_frame=self._wake, max_failures=max_failures,
+            pool=FramePool(), block=block
+        )
+        with self._cond:
+            self._streams[stream_id] = _Stream(capture_thread)
+            self._order.append(stream_id)
+        capture_thread.start()
+        return capture_thread
+    
+    def start(self):
+        """Start the worker threads."""
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"recognition-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def _wake(self):
+        with self._cond:
+            self._cond.notify()
+    
+    def _next_job(self):
+        """Round-robin pick of (stream_id, stream, frame_id, frame); caller holds _cond."""
+        for offset in range(len(self._order)):
+            position = (self._next + offset) % len(self._order)
+            stream_id = self._order[position]
+            stream = self._streams[stream_id]
+            if stream.busy:
+                continue
+            frame_id, frame = stream.capture_thread.latest()
+            if frame is None or frame_id == stream.last_frame_id:
+                stream.capture_thread.release(frame)
+                continue
+            self._next = position + 1
+            stream.frames_dropped += frame_id - stream.last_frame_id - 1
+            stream.last_frame_id = frame_id
+            stream.busy = True
+            return stream_id, stream, frame_id, frame
+        return None
+    
+    def _work(self):
+        while not self._stop_event.is_set():
+            with self._cond:
+                job = self._next_job()
+                if job is None:
+                    self._cond.wait(0.1)
+                    continue
+            
+            stream_id, stream, frame_id, frame = job
+            start = time.perf_counter()
+            try:
+                faces = self.process_fn(stream_id, frame)
+            except Exception as e:
+                faces = None
+                print(f"Recognition error on stream {stream_id}: {e}")
+            finally:
+                stream.capture_thread.release(frame)
+            latency = time.perf_counter() - start
+            
+            with self._cond:
+                stream.busy = False
+                if faces is None:
+                    stream.errors += 1
+                    continue
+                stream.results = {'frame_id': frame_id, 'faces': faces, 'latency': latency}
+                stream.frames_processed += 1
+                stream.last_latency = latency
+                stream.done_times.append(time.perf_counter())
+                results = stream.results
+                # Another frame of this stream may have arrived meanwhile
+                self._cond.notify()
+            
+            if self.on_results is not None:
+                self.on_results(stream_id, results)
+    
+    def latest_results(self, stream_id: Hashable) -> Optional[Dict]:
+        """Most recent results dict for one stream, or None."""
+        with self._cond:
+            return self._streams[stream_id].results
+    
+    def alive(self) -> bool:
+        """True while at least one capture thread is still reading or a frame is being processed."""
+        with self._cond:
+            return any(stream.capture_thread.is_alive() or stream.busy for stream in self._streams.values())
+    
+    def stop(self, timeout: float = 1.0):
+        """Stop capture and workers and wait for them."""
+        self._stop_event.set()
+        with self._cond:
+            streams = list(self._streams.values())
+            self._cond.notify_all()
+        for stream in streams:
+            stream.capture_thread.stop(timeout)
+        for thread in self._threads:
+            thread.join(timeout)
+    
+    def stats(self) -> Dict[Hashable, Dict[str, float]]:
+        """Per-stream capture and recognition counters."""
+        now = time.perf_counter()
+        with self._cond:
+            stats = {}
+            for stream_id, stream in self._streams.items():
+                # Rate over the last few frames; a stalled stream reads 0
+                times = stream.done_times
+                span = times[-1] - times[0] if len(times) > 1 else 0.0
+                stalled = not times or now - times[-1] > 2.0
+                stats[stream_id] = {
+                    'fps': 0.0 if stalled or span <= 0 else (len(times) - 1) / span,
+                    'frames': stream.frames_processed,
+                    'dropped': stream.frames_dropped,
+                    'errors': stream.errors,
+                    'latency_ms': stream.last_latency * 1000,
+                    'capture': stream.capture_thread.stats()
+                }
+        return stats